@@ -0,0 +1,161 @@
+"""Benchmark element-animal end to end on a synthetic colony in scratch schemas.
+
+Declares element-animal in schemas named `<prefix>subject`, `<prefix>surgery`,
+etc., loads a synthetic colony (see `synthetic.py`), then times insert
+throughput per table, typical restriction and join queries, NWB subject export
+and a deletion cascade. The schemas are dropped afterwards unless `--keep` is
+given. Results are printed and, with `--output`, written as JSON together with
+the package versions, so runs can be compared over time.
+
+Example:
+    python benchmarks/bench_colony.py --subjects 100000 --output colony.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+
+import datajoint as dj
+import synthetic
+
+from element_animal import genotyping, injection, subject, surgery
+from element_animal.export import subjects_to_nwb
+from element_animal.version import __version__
+
+
+def _time(function, repeat: int) -> dict:
+    """Median and minimum wall time of `function` over `repeat` calls."""
+    seconds, rows = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = function()
+        seconds.append(time.perf_counter() - start)
+    return {
+        "rows": rows,
+        "median_seconds": statistics.median(seconds),
+        "min_seconds": min(seconds),
+    }
+
+
+def _queries(colony: dict) -> dict:
+    """Representative queries, each returning the number of rows fetched."""
+    line = colony["subject.Line"]["line"].iloc[0]
+    implanted = colony["surgery.Implantation"]["subject"].iloc[0]
+    return {
+        "subject by primary key": lambda: len(
+            (subject.Subject & {"subject": implanted}).fetch()
+        ),
+        "subjects of a line": lambda: len(
+            (subject.Subject * subject.Subject.Line & {"line": line}).fetch()
+        ),
+        "live subjects with latest cage": lambda: len(
+            (
+                (subject.Subject - subject.SubjectDeath).aggr(
+                    genotyping.SubjectCaging, latest="MAX(caging_datetime)"
+                )
+            ).fetch()
+        ),
+        "litters with parents": lambda: len(
+            (
+                genotyping.Litter
+                * genotyping.BreedingPair.Father
+                * genotyping.BreedingPair.Mother
+            ).fetch()
+        ),
+        "implantations with coordinates": lambda: len(
+            (surgery.Implantation * surgery.Implantation.Coordinate).fetch()
+        ),
+        "injections by virus": lambda: len(
+            injection.VirusName.aggr(injection.Injection, n="COUNT(*)").fetch()
+        ),
+        "subjects per line": lambda: len(
+            subject.Line.aggr(subject.Subject.Line, n="COUNT(*)").fetch()
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subjects", type=int, default=10000)
+    parser.add_argument("--prefix", default="bench_colony_")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--nwb-limit", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Keep the schemas.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = {
+        "metadata": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "subjects": args.subjects,
+            "seed": args.seed,
+            "batch_size": args.batch_size,
+            "element_animal": __version__,
+            "datajoint": dj.__version__,
+            "python": platform.python_version(),
+        }
+    }
+
+    start = time.perf_counter()
+    colony = synthetic.synthetic_colony(args.subjects, seed=args.seed)
+    results["generate_seconds"] = time.perf_counter() - start
+
+    synthetic.activate(args.prefix)
+    try:
+        results["insert"] = synthetic.load_colony(colony, batch_size=args.batch_size)
+        for name, timing in results["insert"].items():
+            print(
+                f"insert {name:<36} {timing['rows']:>9} rows "
+                f"{timing['seconds']:>8.2f} s"
+            )
+
+        results["queries"] = {
+            label: _time(query, args.repeat)
+            for label, query in _queries(colony).items()
+        }
+        for label, timing in results["queries"].items():
+            print(
+                f"query  {label:<36} {timing['rows']:>9} rows "
+                f"{timing['median_seconds']:>8.3f} s"
+            )
+
+        keys = subject.Subject.fetch("KEY", order_by="subject", limit=args.nwb_limit)
+        results["nwb_export"] = _time(
+            lambda: sum(1 for _ in subjects_to_nwb(keys)), args.repeat
+        )
+        print(
+            f"export subjects_to_nwb {'':<21} {len(keys):>9} subjects "
+            f"{results['nwb_export']['median_seconds']:>4.2f} s"
+        )
+
+        # the most recent generation has no offspring, so its subjects cascade
+        # to their litters, caging, implantations and injections only
+        newest = colony["subject.Subject"]["subject_birth_date"].max()
+        youngest = subject.Subject & {"subject_birth_date": newest.date()}
+        n_deleted = len(youngest)
+        start = time.perf_counter()
+        youngest.delete(safemode=False)
+        results["delete_cascade"] = {
+            "subjects": n_deleted,
+            "seconds": time.perf_counter() - start,
+        }
+        print(
+            f"delete cascade {'':<29} {n_deleted:>9} subjects "
+            f"{results['delete_cascade']['seconds']:>4.2f} s"
+        )
+    finally:
+        if not args.keep:
+            synthetic.drop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
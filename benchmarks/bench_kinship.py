@@ -0,0 +1,94 @@
+"""Benchmark kinship computation on synthetic pedigrees.
+
+Synthetic colonies consist of closed breeding lines. Each generation of a line
+is bred from random pairs of the previous generation, so kinship accumulates
+the way it does in a real colony. Candidate breeding pairs are drawn within the
+lines of the most recent generation. No database is needed.
+
+Example:
+    python benchmarks/bench_kinship.py --sizes 10000 100000 1000000 --pairs 1000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from element_animal.kinship import Kinship
+from element_animal.pedigree import Pedigree
+
+
+def synthetic_pedigree(
+    n_subjects: int, *, line_size: int = 20, n_lines: int = 50, seed: int = 0
+) -> Pedigree:
+    """Pedigree of `n_lines` closed lines, `line_size` animals per generation.
+
+    Subjects are numbered in birth order, so every parent precedes its pups. In
+    each generation of a line, the first half are males and the rest females.
+    """
+    rng = np.random.default_rng(seed)
+    generation_size = line_size * n_lines
+    father = np.full(n_subjects, -1, dtype=np.int64)
+    mother = np.full(n_subjects, -1, dtype=np.int64)
+    pups = np.arange(generation_size, n_subjects)
+    line_start = (pups // generation_size - 1) * generation_size + (
+        pups % generation_size
+    ) // line_size * line_size
+    father[pups] = line_start + rng.integers(0, line_size // 2, len(pups))
+    mother[pups] = line_start + rng.integers(line_size // 2, line_size, len(pups))
+    subjects = np.char.add("S", np.arange(n_subjects).astype(str)).astype(object)
+    return Pedigree(subjects, father, mother)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10**4, 10**5, 10**6]
+    )
+    parser.add_argument("--pairs", type=int, default=1000)
+    parser.add_argument("--line-size", type=int, default=20)
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(
+        f"{'subjects':>10} {'lines':>6} {'build s':>9} {'first s':>9} "
+        f"{'memo s':>9} {'pairs/s':>11} {'memo size':>10}"
+    )
+    for n_subjects in args.sizes:
+        n_lines = max(1, n_subjects // (args.line_size * args.generations))
+        start = time.perf_counter()
+        pedigree = synthetic_pedigree(
+            n_subjects, line_size=args.line_size, n_lines=n_lines, seed=args.seed
+        )
+        pedigree.ids(pedigree.subjects[:1])  # build the subject lookup
+        build = time.perf_counter() - start
+
+        # candidate pairs of a male and a female of one line, latest generation
+        generation_size = args.line_size * n_lines
+        last_generation = (n_subjects // generation_size - 1) * generation_size
+        line_start = last_generation + args.line_size * rng.integers(
+            0, n_lines, args.pairs
+        )
+        half = args.line_size // 2
+        males = pedigree.subjects[line_start + rng.integers(0, half, args.pairs)]
+        females = pedigree.subjects[
+            line_start + rng.integers(half, args.line_size, args.pairs)
+        ]
+
+        kinship = Kinship(pedigree)
+        start = time.perf_counter()
+        kinship.kinship(males, females)
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        kinship.kinship(males, females)
+        memo = time.perf_counter() - start
+        print(
+            f"{n_subjects:>10} {n_lines:>6} {build:>9.3f} {first:>9.3f} "
+            f"{memo:>9.4f} {args.pairs / first:>11.0f} {len(kinship):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
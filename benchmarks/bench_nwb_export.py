@@ -0,0 +1,73 @@
+"""Benchmark NWB subject export throughput against a populated `subject` schema.
+
+Reports subjects exported per second for the serial `subject_to_nwb` loop, the
+batched `subjects_to_nwb` generator and `subjects_to_nwb_parallel` at each
+requested worker count.
+
+Example:
+    python benchmarks/bench_nwb_export.py --subject-schema my_subject \\
+        --linking-module workflow.pipeline --workers 1 2 4 8 --limit 2000
+"""
+
+import argparse
+import time
+
+from element_animal import subject
+from element_animal.export import (
+    SubjectExportError,
+    subject_to_nwb,
+    subjects_to_nwb,
+    subjects_to_nwb_parallel,
+)
+
+
+def _report(label: str, n_subjects: int, elapsed: float, n_failed: int = 0):
+    print(
+        f"{label:<28} {n_subjects:>8} subjects {elapsed:>9.2f} s "
+        f"{n_subjects / elapsed:>10.1f} subjects/s {n_failed:>6} failed"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subject-schema", required=True)
+    parser.add_argument("--linking-module", required=True)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+
+    subject.activate(
+        args.subject_schema,
+        create_schema=False,
+        create_tables=False,
+        linking_module=args.linking_module,
+    )
+    keys = subject.Subject.fetch("KEY", order_by="subject", limit=args.limit)
+
+    if not args.skip_serial:
+        start = time.perf_counter()
+        for key in keys:
+            subject_to_nwb(key)
+        _report("subject_to_nwb (serial)", len(keys), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    n_exported = sum(1 for _ in subjects_to_nwb(keys))
+    _report("subjects_to_nwb (batched)", n_exported, time.perf_counter() - start)
+
+    for n_workers in args.workers:
+        start = time.perf_counter()
+        results = subjects_to_nwb_parallel(
+            keys, processes=n_workers, chunksize=args.chunksize
+        )
+        _report(
+            f"parallel, {n_workers} workers",
+            len(results),
+            time.perf_counter() - start,
+            sum(isinstance(r, SubjectExportError) for r in results),
+        )
+
+
+if __name__ == "__main__":
+    main()
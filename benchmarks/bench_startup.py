@@ -0,0 +1,171 @@
+"""Benchmark startup cost of element-animal modules: import, activation, first query.
+
+Every measurement runs in a fresh interpreter, so module caches of previous
+measurements do not hide import or activation costs. Imports are always
+measured; activation and first-query latency are measured when schema names are
+given, against the database of the DataJoint configuration.
+
+The `pynwb (deferred)` row is the import time of pynwb alone, which
+`element_animal.export.nwb` no longer pays at import time; it is paid on the
+first NWB export instead.
+
+Example:
+    python benchmarks/bench_startup.py --repeat 5
+    python benchmarks/bench_startup.py --linking-module workflow.pipeline \\
+        --subject-schema my_subject --surgery-schema my_surgery \\
+        --injection-schema my_injection --genotyping-schema my_genotyping \\
+        --json startup.json
+"""
+
+import argparse
+import importlib
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# module to the table read by the first-query measurement
+TABLES = {
+    "subject": "Subject",
+    "surgery": "Implantation",
+    "injection": "Injection",
+    "genotyping": "GenotypeTest",
+}
+# module to the modules whose schema names its activate function takes
+UPSTREAM = {
+    "subject": [],
+    "surgery": ["subject"],
+    "injection": ["surgery"],
+    "genotyping": ["subject"],
+}
+SCENARIOS = {
+    "datajoint": ["datajoint"],
+    "pynwb (deferred)": ["pynwb"],
+    "subject": ["subject"],
+    "surgery": ["surgery"],
+    "injection": ["injection"],
+    "genotyping": ["genotyping"],
+    "export.nwb": ["export.nwb"],
+    "all modules": ["subject", "surgery", "injection", "genotyping", "export.nwb"],
+}
+
+
+def _activate(module_name: str, schemas: dict, linking_module: str):
+    """Activate a module after the modules it depends on."""
+    for upstream in UPSTREAM[module_name]:
+        _activate(upstream, schemas, linking_module)
+    module = importlib.import_module(f"element_animal.{module_name}")
+    module.activate(
+        schemas[module_name],
+        *(schemas[upstream] for upstream in UPSTREAM[module_name]),
+        create_schema=False,
+        create_tables=False,
+        linking_module=linking_module,
+    )
+
+
+def probe(spec: dict) -> dict:
+    """Measure one startup sequence in the current, fresh interpreter."""
+    result = {}
+    start = time.perf_counter()
+    for name in spec["modules"]:
+        importlib.import_module(
+            name if name in ("datajoint", "pynwb") else f"element_animal.{name}"
+        )
+    result["import"] = time.perf_counter() - start
+    result["pynwb_loaded"] = "pynwb" in sys.modules
+
+    tables = [name for name in spec["modules"] if name in TABLES]
+    if spec["schemas"] and tables:
+        from element_animal.activation import activation_timings
+
+        start = time.perf_counter()
+        for name in tables:
+            _activate(name, spec["schemas"], spec["linking_module"])
+        result["activation"] = time.perf_counter() - start
+        result["activations_skipped"] = int(activation_timings()["skipped"].sum())
+
+        start = time.perf_counter()
+        for name in tables:
+            module = sys.modules[f"element_animal.{name}"]
+            getattr(module, TABLES[name]).fetch(limit=1)
+        result["first_query"] = time.perf_counter() - start
+    return result
+
+
+def _run_probe(spec: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--probe", json.dumps(spec)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def _required_schemas(modules: list) -> set:
+    required = set()
+    for name in modules:
+        if name in UPSTREAM:
+            required |= {name} | _required_schemas(UPSTREAM[name])
+    return required
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--linking-module")
+    for name in TABLES:
+        parser.add_argument(f"--{name}-schema")
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(json.loads(args.probe))))
+        return
+
+    schemas = {
+        name: getattr(args, f"{name}_schema")
+        for name in TABLES
+        if getattr(args, f"{name}_schema")
+    }
+    print(
+        f"{'scenario':<18} {'import s':>9} {'activate s':>11} {'1st query s':>12} "
+        f"{'skipped':>8} {'pynwb':>6}"
+    )
+    results = {}
+    for label, modules in SCENARIOS.items():
+        can_activate = args.linking_module and _required_schemas(modules) <= set(
+            schemas
+        )
+        spec = {
+            "modules": modules,
+            "schemas": schemas if can_activate else None,
+            "linking_module": args.linking_module,
+        }
+        runs = [_run_probe(spec) for _ in range(args.repeat)]
+        summary = {
+            key: statistics.median(run[key] for run in runs)
+            for key in ("import", "activation", "first_query")
+            if key in runs[0]
+        }
+        summary["activations_skipped"] = runs[0].get("activations_skipped", 0)
+        summary["pynwb_loaded"] = runs[0]["pynwb_loaded"]
+        results[label] = summary
+        print(
+            f"{label:<18} {summary['import']:>9.3f} "
+            f"{summary.get('activation', float('nan')):>11.3f} "
+            f"{summary.get('first_query', float('nan')):>12.3f} "
+            f"{summary['activations_skipped']:>8} "
+            f"{'yes' if summary['pynwb_loaded'] else 'no':>6}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"repeat": args.repeat, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
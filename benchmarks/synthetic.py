@@ -0,0 +1,368 @@
+"""Synthetic colonies for benchmarking element-animal against a scratch database.
+
+`synthetic_colony` generates the rows of a colony of closed breeding lines with
+NumPy, without a database. `activate` declares element-animal in scratch
+schemas, with the minimal stand-ins for the upstream lab tables defined here,
+and `load_colony` inserts a generated colony into them.
+
+Example:
+    >>> import synthetic
+    >>> synthetic.activate("bench_")
+    >>> colony = synthetic.synthetic_colony(10000)
+    >>> synthetic.load_colony(colony)
+"""
+
+import sys
+import time
+
+import datajoint as dj
+import numpy as np
+import pandas as pd
+
+from element_animal import genotyping, injection, subject, surgery
+from element_animal.utils import insert_in_batches
+
+lab_schema = dj.Schema()
+
+
+@lab_schema
+class Lab(dj.Lookup):
+    definition = """
+    lab             : varchar(24)
+    ---
+    lab_name=''     : varchar(255)
+    """
+
+
+@lab_schema
+class Source(dj.Lookup):
+    definition = """
+    source          : varchar(32)
+    ---
+    source_name=''  : varchar(255)
+    """
+
+
+@lab_schema
+class Protocol(dj.Lookup):
+    definition = """
+    protocol                : varchar(36)
+    ---
+    protocol_description='' : varchar(255)
+    """
+
+
+@lab_schema
+class User(dj.Lookup):
+    definition = """
+    user            : varchar(32)
+    """
+
+
+@lab_schema
+class Device(dj.Lookup):
+    definition = """
+    device          : varchar(32)
+    """
+
+
+MODULES = {
+    "lab": sys.modules[__name__],
+    "subject": subject,
+    "genotyping": genotyping,
+    "surgery": surgery,
+    "injection": injection,
+}
+
+BRAIN_REGIONS = [
+    ("CA1", "Field CA1"),
+    ("DG", "Dentate gyrus"),
+    ("MOp", "Primary motor area"),
+    ("SSp", "Primary somatosensory area"),
+    ("VISp", "Primary visual area"),
+    ("ACA", "Anterior cingulate area"),
+    ("STR", "Striatum"),
+    ("VTA", "Ventral tegmental area"),
+]
+
+VIRUSES = [
+    ("AAV1.CAG.Flex.ArchT.GFP", "AAV1"),
+    ("AAV5.hSyn.ChR2.eYFP", "AAV5"),
+    ("AAV9.Syn.GCaMP6f", "AAV9"),
+    ("AAVrg.CAG.tdTomato", "AAVrg"),
+]
+
+
+def activate(prefix: str):
+    """Declare element-animal and the lab stand-ins in schemas named `prefix*`."""
+    lab_schema.activate(f"{prefix}lab")
+    linking_module = MODULES["lab"]
+    subject.activate(f"{prefix}subject", linking_module=linking_module)
+    genotyping.activate(
+        f"{prefix}genotyping", f"{prefix}subject", linking_module=linking_module
+    )
+    surgery.activate(
+        f"{prefix}surgery", f"{prefix}subject", linking_module=linking_module
+    )
+    injection.activate(
+        f"{prefix}injection", f"{prefix}surgery", linking_module=linking_module
+    )
+
+
+def drop():
+    """Drop the schemas declared by `activate`, downstream first."""
+    for schema in (
+        injection.schema,
+        surgery.schema,
+        genotyping.schema,
+        subject.schema,
+        lab_schema,
+    ):
+        schema.drop(force=True)
+
+
+def table(name: str):
+    """Table class from a dotted name such as "genotyping.BreedingPair.Father"."""
+    module_name, *class_names = name.split(".")
+    obj = MODULES[module_name]
+    for class_name in class_names:
+        obj = getattr(obj, class_name)
+    return obj
+
+
+def synthetic_colony(
+    n_subjects: int,
+    *,
+    line_size: int = 20,
+    generations: int = 10,
+    cagings_per_subject: int = 3,
+    implant_fraction: float = 0.3,
+    n_users: int = 10,
+    seed: int = 0,
+) -> dict:
+    """Rows of a synthetic colony, keyed by table name in insertion order.
+
+    The colony consists of closed lines of `line_size` animals per generation,
+    half male and half female. Each generation after the founders is born to
+    the breeding pairs of the previous generation of its line, one litter per
+    pair. Each subject has `cagings_per_subject` caging events; a fraction of
+    the subjects carries an implantation with coordinates, and opto and fiber
+    implantations come with a virus injection. Subjects of all but the two most
+    recent generations are dead.
+
+    Args:
+        n_subjects (int): Number of subjects, at least one generation.
+        line_size (int, optional): Animals per line and generation, even.
+        generations (int, optional): Generations per line; sets the number of
+            lines for `n_subjects`.
+        cagings_per_subject (int, optional): Caging events per subject.
+        implant_fraction (float, optional): Fraction of implanted subjects.
+        n_users (int, optional): Number of users and surgeons.
+        seed (int, optional): Random seed.
+
+    Returns:
+        dict: Table name (see `table`) to a DataFrame of its rows. The
+            `subject.Subject` frame holds the part-table columns as well, for
+            `Subject.insert_bulk`.
+    """
+    rng = np.random.default_rng(seed)
+    n_lines = max(1, n_subjects // (line_size * generations))
+    generation_size = line_size * n_lines
+    half = line_size // 2
+    day = np.timedelta64(1, "D")
+    founded = np.datetime64("2015-01-01")
+
+    index = np.arange(n_subjects)
+    generation = index // generation_size
+    line_id = index % generation_size // line_size
+    position = index % line_size
+    subject_ids = np.char.add("S", np.char.zfill(index.astype(str), 7)).astype(object)
+    line_names = np.char.add("L", np.char.zfill(np.arange(n_lines).astype(str), 4))
+    users = [f"user{i:02d}" for i in range(n_users)]
+    birth_date = founded + generation * 90 * day
+
+    colony = {
+        "lab.Lab": pd.DataFrame({"lab": ["lab0"], "lab_name": ["Synthetic lab"]}),
+        "lab.Source": pd.DataFrame({"source": ["inhouse"]}),
+        "lab.Protocol": pd.DataFrame({"protocol": ["IACUC-0001"]}),
+        "lab.User": pd.DataFrame({"user": users}),
+        "lab.Device": pd.DataFrame({"device": ["pump0", "pump1"]}),
+        "subject.Species": pd.DataFrame({"species": ["Mus musculus"]}),
+        "subject.Strain": pd.DataFrame(
+            {"strain": ["C57BL6J"], "strain_standard_name": ["C57BL/6J"]}
+        ),
+        "subject.Line": pd.DataFrame({"line": line_names, "is_active": True}),
+    }
+    colony["subject.Subject"] = pd.DataFrame(
+        {
+            "subject": subject_ids,
+            "sex": np.where(position < half, "M", "F"),
+            "subject_birth_date": birth_date,
+            "species": "Mus musculus",
+            "strain": "C57BL6J",
+            "line": line_names[line_id],
+            "source": "inhouse",
+            "lab": "lab0",
+            "protocol": "IACUC-0001",
+            "user": rng.choice(users, n_subjects),
+        }
+    )
+
+    # breeding pairs of every line and generation that has offspring
+    pair_index = np.arange(generation.max() * n_lines * half)
+    pair_generation = pair_index // (n_lines * half)
+    pair_line = pair_index % (n_lines * half) // half
+    pair_number = pair_index % half
+    father = pair_generation * generation_size + pair_line * line_size + pair_number
+    pair_names = np.char.add(
+        np.char.add("G", pair_generation.astype(str)),
+        np.char.add("P", pair_number.astype(str)),
+    )
+    pairs = pd.DataFrame(
+        {
+            "line": line_names[pair_line],
+            "breeding_pair": pair_names,
+            "bp_start_date": birth_date[father] + 60 * day,
+            "father": subject_ids[father],
+            "mother": subject_ids[father + half],
+        }
+    )
+
+    pups = index[generation > 0]
+    pup_pair = (
+        (generation[pups] - 1) * n_lines * half
+        + line_id[pups] * half
+        + rng.integers(0, half, len(pups))
+    )
+    litters = pairs.iloc[pup_pair][["line", "breeding_pair"]].assign(
+        litter_birth_date=birth_date[pups]
+    )
+    litters["subject"] = subject_ids[pups]
+    bred = np.unique(pup_pair)
+    colony["genotyping.BreedingPair"] = pairs.iloc[bred].drop(
+        columns=["father", "mother"]
+    )
+    colony["genotyping.BreedingPair.Father"] = pairs.iloc[bred][
+        ["line", "breeding_pair", "father"]
+    ]
+    colony["genotyping.BreedingPair.Mother"] = pairs.iloc[bred][
+        ["line", "breeding_pair", "mother"]
+    ]
+    colony["genotyping.Litter"] = (
+        litters.groupby(["line", "breeding_pair", "litter_birth_date"])
+        .size()
+        .rename("num_of_pups")
+        .reset_index()
+    )
+    colony["genotyping.SubjectLitter"] = litters
+
+    # caging events, from weaning onwards
+    n_cages = max(1, n_subjects // 4)
+    caged = np.repeat(index, cagings_per_subject)
+    step = np.tile(np.arange(cagings_per_subject), n_subjects)
+    colony["genotyping.Cage"] = pd.DataFrame(
+        {"cage": [f"C{i:06d}" for i in range(n_cages)]}
+    )
+    colony["genotyping.SubjectCaging"] = pd.DataFrame(
+        {
+            "subject": subject_ids[caged],
+            "caging_datetime": birth_date[caged].astype("datetime64[s]")
+            + (21 + 30 * step) * day
+            + rng.integers(8 * 3600, 18 * 3600, len(caged)) * np.timedelta64(1, "s"),
+            "cage": colony["genotyping.Cage"]["cage"].to_numpy()[
+                rng.integers(0, n_cages, len(caged))
+            ],
+            "user": rng.choice(users, len(caged)),
+        }
+    )
+
+    dead = index[generation < generation.max() - 1]
+    colony["subject.SubjectDeath"] = pd.DataFrame(
+        {
+            "subject": subject_ids[dead],
+            "death_date": birth_date[dead] + rng.integers(180, 720, len(dead)) * day,
+        }
+    )
+
+    # implantations with coordinates, and injections for opto and fiber
+    colony["surgery.BrainRegion"] = pd.DataFrame(
+        BRAIN_REGIONS, columns=["region_acronym", "region_name"]
+    )
+    implanted = rng.choice(index, int(n_subjects * implant_fraction), replace=False)
+    implant_type = rng.choice(["ephys", "fiber", "opto"], len(implanted))
+    implantations = pd.DataFrame(
+        {
+            "subject": subject_ids[implanted],
+            "implant_date": birth_date[implanted].astype("datetime64[s]")
+            + 90 * day
+            + rng.integers(8 * 3600, 18 * 3600, len(implanted))
+            * np.timedelta64(1, "s"),
+            "implant_type": implant_type,
+            "target_region": rng.choice(
+                [acronym for acronym, _ in BRAIN_REGIONS], len(implanted)
+            ),
+            "target_hemisphere": rng.choice(["left", "right"], len(implanted)),
+        }
+    )
+    colony["surgery.Implantation"] = implantations.assign(
+        surgeon=rng.choice(users, len(implanted))
+    )
+    colony["surgery.Implantation.Coordinate"] = implantations.assign(
+        ap=rng.uniform(-4.0, 3.0, len(implanted)),
+        ap_ref="bregma",
+        ml=rng.uniform(-3.0, 3.0, len(implanted)),
+        ml_ref="bregma",
+        dv=rng.uniform(-6.0, 0.0, len(implanted)),
+        dv_ref="dura",
+        theta=rng.uniform(0.0, 30.0, len(implanted)),
+        phi=rng.uniform(0.0, 360.0, len(implanted)),
+        beta=0.0,
+    )
+
+    colony["injection.VirusName"] = pd.DataFrame(
+        VIRUSES, columns=["virus_name", "virus_serotype"]
+    )
+    colony["injection.InjectionProtocol"] = pd.DataFrame(
+        {
+            "protocol_id": [1, 2],
+            "device": ["pump0", "pump1"],
+            "volume_per_pulse": [4.6, 9.2],
+            "injection_rate": [1.0, 2.0],
+            "interpulse_delay": [10.0, 5.0],
+        }
+    )
+    injected = implantations[implant_type != "ephys"]
+    colony["injection.Injection"] = injected.assign(
+        virus_name=rng.choice([name for name, _ in VIRUSES], len(injected)),
+        protocol_id=rng.integers(1, 3, len(injected)),
+        titer="1.2e13",
+        total_volume=rng.uniform(100.0, 500.0, len(injected)),
+    )
+    return colony
+
+
+def load_colony(colony: dict, *, batch_size: int = 10000) -> dict:
+    """Insert a colony from `synthetic_colony`, timing each table.
+
+    Returns:
+        dict: Table name to {"rows", "seconds", "rows_per_second"}.
+    """
+    timings = {}
+    for name, rows in colony.items():
+        start = time.perf_counter()
+        if name == "subject.Subject":
+            subject.Subject.insert_bulk(rows, batch_size=batch_size)
+        else:
+            target = table(name)
+            insert_in_batches(
+                target(),
+                rows[[c for c in target.heading.names if c in rows]],
+                batch_size=batch_size,
+            )
+        seconds = time.perf_counter() - start
+        timings[name] = {
+            "rows": len(rows),
+            "seconds": seconds,
+            "rows_per_second": len(rows) / seconds if seconds else None,
+        }
+    return timings
@@ -0,0 +1,152 @@
+"""Registry of schema activations shared by the element-animal modules.
+
+Activating a module also activates the modules it depends on, e.g.
+`injection.activate` activates `surgery` and `subject`, so a pipeline that
+activates several modules would otherwise repeat the activation, and its catalog
+queries, of shared schemas. Each schema is activated at most once per
+(connection, schema name); later calls return immediately, with a warning if
+they ask for tables to be created, or link other objects, than the first.
+
+The time spent in each activation step is recorded:
+
+    >>> from element_animal import activation
+    >>> activation.activation_timings()
+       module     schema_name            step   seconds  skipped
+    0  subject    lab_subject  linking_module  0.000012    False
+    1  subject    lab_subject        activate  0.081533    False
+    ...
+"""
+
+import importlib
+import inspect
+import time
+import warnings
+from contextlib import contextmanager
+
+import datajoint as dj
+import pandas as pd
+
+_registry = {}
+_timings = []
+
+
+def _connection_key(connection) -> tuple:
+    """Hashable identity of a connection, consistent with `Connection.__eq__`."""
+    info = connection.conn_info
+    return info["host"], info.get("port"), info["user"]
+
+
+def _is_table(obj) -> bool:
+    """Whether `obj` is a table class that schema definitions can refer to."""
+    return inspect.isclass(obj) and issubclass(obj, dj.Table)
+
+
+@contextmanager
+def activation_step(module: str, schema_name: str, step: str, skipped=False):
+    """Record the duration of an activation step."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings.append(
+            {
+                "module": module,
+                "schema_name": schema_name,
+                "step": step,
+                "seconds": time.perf_counter() - start,
+                "skipped": skipped,
+            }
+        )
+
+
+def resolve_linking_module(module: str, schema_name: str, linking_module):
+    """Import `linking_module` if given by name and check that it is a module."""
+    with activation_step(module, schema_name, "linking_module"):
+        if isinstance(linking_module, str):
+            linking_module = importlib.import_module(linking_module)
+        assert inspect.ismodule(
+            linking_module
+        ), "The argument 'linking_module' must be a module's name or a module"
+    return linking_module
+
+
+def activate_schema(
+    module: str,
+    schema: dj.Schema,
+    schema_name: str,
+    *,
+    create_schema: bool,
+    create_tables: bool,
+    add_objects: dict,
+):
+    """Activate `schema` unless it is already active under `schema_name`.
+
+    Args:
+        module (str): Name of the element-animal module, for the timings.
+        schema (dj.Schema): Schema object of the module.
+        schema_name (str): Database schema name. None asserts that the schema
+            was already activated, e.g. by a previous call.
+        create_schema (bool): Passed to `schema.activate`.
+        create_tables (bool): Passed to `schema.activate`.
+        add_objects (dict): Passed to `schema.activate`.
+
+    Warns:
+        UserWarning: If the schema was already activated under `schema_name`
+            without creating tables and `create_tables` is set, or with other
+            tables under the same names in `add_objects`. DataJoint does not
+            activate a schema twice, so such a call has no effect.
+    """
+    connection = schema.connection or dj.conn()
+    requested = schema_name is not None
+    if schema_name is None and schema.database is not None:
+        schema_name = schema.database
+    key = (_connection_key(connection), schema_name)
+    registered = _registry.get(key)
+    if registered is not None and registered[0] is schema:
+        _, registered_tables, registered_objects = registered
+        if requested and create_tables and not registered_tables:
+            warnings.warn(
+                f"Schema `{schema_name}` of `{module}` is already activated with "
+                "create_tables=False; its missing tables are not created"
+            )
+        relinked = sorted(
+            name
+            for name in (add_objects or {}).keys() & (registered_objects or {}).keys()
+            if add_objects[name] is not registered_objects[name]
+            and (_is_table(add_objects[name]) or _is_table(registered_objects[name]))
+        )
+        if requested and relinked:
+            warnings.warn(
+                f"Schema `{schema_name}` of `{module}` is already activated with "
+                f"other linked tables for {relinked}; the first ones are kept"
+            )
+        with activation_step(module, schema_name, "activate", skipped=True):
+            return
+    with activation_step(module, schema_name, "activate"):
+        schema.activate(
+            schema_name,
+            connection=connection,
+            create_schema=create_schema,
+            create_tables=create_tables,
+            add_objects=add_objects,
+        )
+    _registry[key] = schema, create_tables, add_objects
+
+
+def activation_timings() -> pd.DataFrame:
+    """Recorded activation steps, in the order they ran.
+
+    Returns:
+        pd.DataFrame: One row per step with columns `module`, `schema_name`,
+            `step`, `seconds` and `skipped`; skipped steps are activations
+            answered by the registry.
+    """
+    return pd.DataFrame(
+        _timings, columns=["module", "schema_name", "step", "seconds", "skipped"]
+    )
+
+
+def reset_activation_registry():
+    """Forget recorded activations and timings, e.g. after reconnecting."""
+    _registry.clear()
+    _timings.clear()
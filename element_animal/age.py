@@ -0,0 +1,146 @@
+"""Subject ages computed in the database.
+
+Each function returns a query whose `age_days` attribute is computed with SQL
+date arithmetic, in days since `subject_birth_date` (so `age_days` 60 is P60).
+The queries can be restricted, joined and aggregated like any other, and only
+the rows and attributes fetched in the end leave the database:
+
+    >>> from element_animal import age, subject
+    >>> adults = age.restrict_age(age.age_at_implantation(), 60, 90)
+    >>> subject.Subject & adults  # subjects implanted between P60 and P90
+    >>> age.lifespan_summary(by=("line",)).fetch(format="frame")
+"""
+
+import datajoint as dj
+import pandas as pd
+
+from . import injection, subject, surgery
+
+
+def _sql_date(value) -> str:
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+def _restricted(query, restriction):
+    return query if restriction is None else query & restriction
+
+
+def age_at_implantation(restriction=None):
+    """Age of the subject at each implantation.
+
+    Args:
+        restriction (optional): Restriction on `surgery.Implantation`.
+
+    Returns:
+        QueryExpression: Implantation primary key and `age_days`.
+    """
+    implantations = _restricted(surgery.Implantation, restriction) * subject.Subject
+    return implantations.proj(age_days="DATEDIFF(implant_date, subject_birth_date)")
+
+
+def age_at_injection(restriction=None):
+    """Age of the subject at each virus injection.
+
+    Args:
+        restriction (optional): Restriction on `injection.Injection`.
+
+    Returns:
+        QueryExpression: Injection primary key and `age_days`.
+    """
+    injections = _restricted(injection.Injection, restriction) * subject.Subject
+    return injections.proj(age_days="DATEDIFF(implant_date, subject_birth_date)")
+
+
+def age_at_death(restriction=None):
+    """Age of each deceased subject at death, its lifespan.
+
+    Args:
+        restriction (optional): Restriction on `subject.SubjectDeath`.
+
+    Returns:
+        QueryExpression: `subject` and `age_days`.
+    """
+    deaths = _restricted(subject.SubjectDeath, restriction) * subject.Subject
+    return deaths.proj(age_days="DATEDIFF(death_date, subject_birth_date)")
+
+
+def current_age(restriction=None):
+    """Age today of each living subject.
+
+    Args:
+        restriction (optional): Restriction on `subject.Subject`.
+
+    Returns:
+        QueryExpression: `subject` and `age_days`.
+    """
+    living = _restricted(subject.Subject, restriction) - subject.SubjectDeath
+    return living.proj(age_days="DATEDIFF(CURDATE(), subject_birth_date)")
+
+
+def age_on(date, restriction=None):
+    """Age on `date` of each subject alive on that date.
+
+    Args:
+        date (str | date | datetime): Day of reference.
+        restriction (optional): Restriction on `subject.Subject`.
+
+    Returns:
+        QueryExpression: `subject` and `age_days`, for subjects born on or
+            before `date` and not deceased before it.
+    """
+    day = _sql_date(date)
+    subjects = _restricted(subject.Subject, restriction).join(
+        subject.SubjectDeath, left=True
+    )
+    alive = (
+        subjects
+        & f"subject_birth_date <= '{day}'"
+        & f"death_date IS NULL OR death_date >= '{day}'"
+    )
+    return alive.proj(age_days=f"DATEDIFF('{day}', subject_birth_date)")
+
+
+def restrict_age(query, min_days: int = None, max_days: int = None):
+    """Restrict an age query to an inclusive range of `age_days`.
+
+    Args:
+        query (QueryExpression): Result of one of the age functions.
+        min_days (int, optional): Youngest age kept, e.g. 60 for P60.
+        max_days (int, optional): Oldest age kept.
+
+    Returns:
+        QueryExpression: `query` restricted in the database.
+    """
+    if min_days is not None:
+        query &= f"age_days >= {int(min_days)}"
+    if max_days is not None:
+        query &= f"age_days <= {int(max_days)}"
+    return query
+
+
+def lifespan_summary(by=("line",), restriction=None):
+    """Lifespan statistics of deceased subjects, one row per group.
+
+    Args:
+        by (tuple, optional): Grouping attributes among `line`, `strain` and
+            `sex`. Defaults to line; subjects without a line form the group
+            with a null line.
+        restriction (optional): Restriction on `subject.SubjectDeath`.
+
+    Returns:
+        QueryExpression: `n_subjects` and `mean_days`, `std_days`, `min_days`
+            and `max_days` of the age at death per group; fetch it as usual.
+    """
+    lifespans = (
+        (age_at_death(restriction) * subject.Subject.proj("sex"))
+        .join(subject.Subject.Line, left=True)
+        .join(subject.Subject.Strain, left=True)
+    )
+    return dj.U(*by).aggr(
+        lifespans,
+        n_subjects="COUNT(*)",
+        mean_days="AVG(age_days)",
+        std_days="STDDEV_SAMP(age_days)",
+        min_days="MIN(age_days)",
+        max_days="MAX(age_days)",
+    )
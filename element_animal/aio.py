@@ -0,0 +1,209 @@
+"""Asyncio access to the common element-animal read paths.
+
+`AsyncReader` runs the blocking DataJoint fetches of a web service in a thread
+pool, each on a connection of a bounded pool, so that hundreds of concurrent
+requests share a handful of database connections:
+
+    >>> from element_animal.aio import AsyncReader
+    >>> async with AsyncReader(pool_size=4) as reader:
+    ...     record = await reader.subject("M001")
+    ...     implants = await reader.implantations("M001")
+
+Identical requests in flight at the same time share one database round trip
+and the same result objects, which callers should not modify. At most
+`max_pending` distinct requests run or wait for a connection; beyond that,
+requests fail at once with `ReaderOverloaded` so that callers can shed load.
+"""
+
+import asyncio
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import datajoint as dj
+
+from . import genotyping, injection, subject, surgery
+
+
+class ReaderOverloaded(Exception):
+    """More requests are pending than the reader accepts."""
+
+
+class _Session:
+    """A pooled connection with the tables bound to it."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._tables = {}
+
+    def __call__(self, table):
+        """`table` as a table bound to this session's connection."""
+        name = table.full_table_name
+        if name not in self._tables:
+            self._tables[name] = dj.FreeTable(self.connection, name)
+        return self._tables[name]
+
+
+def _connect():
+    """A new connection with the credentials of `dj.config`."""
+    return dj.Connection(
+        dj.config["database.host"],
+        dj.config["database.user"],
+        dj.config["database.password"],
+        port=dj.config["database.port"],
+        use_tls=dj.config.get("database.use_tls"),
+    )
+
+
+def _without_subject(rows: list) -> list:
+    return [{k: v for k, v in row.items() if k != "subject"} for row in rows]
+
+
+# -------- read paths, run in the worker threads
+
+
+def _subject(table, subject_id: str):
+    key = {"subject": subject_id}
+    query = table(subject.Subject) & key
+    for part in (
+        subject.Subject.Species,
+        subject.Subject.Line,
+        subject.Subject.Strain,
+        subject.Subject.Source,
+    ):
+        query = query.join(table(part), left=True)
+    rows = query.fetch(as_dict=True)
+    if not rows:
+        return None
+    record = rows[0]
+    for name, part in (
+        ("protocols", subject.Subject.Protocol),
+        ("users", subject.Subject.User),
+        ("labs", subject.Subject.Lab),
+    ):
+        record[name] = _without_subject(
+            (table(part) & key).fetch(as_dict=True, order_by="KEY")
+        )
+    return record
+
+
+def _implantations(table, subject_id: str) -> list:
+    query = (table(surgery.Implantation) & {"subject": subject_id}).join(
+        table(surgery.Implantation.Coordinate), left=True
+    )
+    return query.fetch(as_dict=True, order_by="KEY")
+
+
+def _injections(table, subject_id: str) -> list:
+    query = table(injection.Injection) & {"subject": subject_id}
+    return query.fetch(as_dict=True, order_by="KEY")
+
+
+def _genotype_tests(table, subject_id: str) -> list:
+    query = table(genotyping.GenotypeTest) & {"subject": subject_id}
+    return query.fetch(as_dict=True, order_by=["genotype_test_id", "sequence"])
+
+
+def _caging_history(table, subject_id: str) -> list:
+    query = table(genotyping.SubjectCaging) & {"subject": subject_id}
+    return query.fetch(as_dict=True, order_by="caging_datetime")
+
+
+class AsyncReader:
+    """Asyncio facade over element-animal reads on a bounded connection pool.
+
+    Args:
+        pool_size (int, optional): Connections, and worker threads, to use.
+            Defaults to 4.
+        max_pending (int, optional): Distinct requests accepted at a time,
+            running or waiting for a connection. Defaults to 256.
+        connect (callable, optional): Returns a new `dj.Connection`. Defaults
+            to connecting with the credentials of `dj.config`.
+
+    Connections are opened when first needed. Tables are resolved by name on
+    each pooled connection, so the schemas must be activated beforehand.
+    """
+
+    def __init__(self, pool_size: int = 4, *, max_pending: int = 256, connect=None):
+        self.pool_size = pool_size
+        self.max_pending = max_pending
+        self._connect = connect or _connect
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="element-animal-aio"
+        )
+        self._sessions = queue.Queue()
+        self._inflight = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def pending(self) -> int:
+        """Distinct requests running or waiting for a connection."""
+        return len(self._inflight)
+
+    def _run(self, read, *args):
+        """Run `read` on a pooled session; called in a worker thread."""
+        try:
+            session = self._sessions.get_nowait()
+        except queue.Empty:  # fewer connections than threads are open
+            session = _Session(self._connect())
+        try:
+            return read(session, *args)
+        finally:
+            self._sessions.put(session)
+
+    async def _request(self, read, *args):
+        """Result of `read(*args)`, shared with identical requests in flight."""
+        key = (read.__name__, args)
+        future = self._inflight.get(key)
+        if future is None:
+            if len(self._inflight) >= self.max_pending:
+                raise ReaderOverloaded(
+                    f"{len(self._inflight)} requests pending; limit is "
+                    f"{self.max_pending}"
+                )
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, self._run, read, *args)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # a cancelled caller must not cancel the query shared with others
+        return await asyncio.shield(future)
+
+    async def subject(self, subject_id: str):
+        """Subject record with all its parts.
+
+        Returns:
+            dict: `subject.Subject` attributes with `species`, `line`, `strain`
+                and `source` (None if unset), and `protocols`, `users` and
+                `labs` as lists of part rows; None if there is no such subject.
+        """
+        return await self._request(_subject, subject_id)
+
+    async def implantations(self, subject_id: str) -> list:
+        """Implantations of a subject with their coordinates, oldest first."""
+        return await self._request(_implantations, subject_id)
+
+    async def injections(self, subject_id: str) -> list:
+        """Virus injections of a subject."""
+        return await self._request(_injections, subject_id)
+
+    async def genotype_tests(self, subject_id: str) -> list:
+        """Genotype tests of a subject, by test identifier."""
+        return await self._request(_genotype_tests, subject_id)
+
+    async def caging_history(self, subject_id: str) -> list:
+        """Caging events of a subject, oldest first."""
+        return await self._request(_caging_history, subject_id)
+
+    async def close(self):
+        """Wait for running requests, then close the pooled connections."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._executor.shutdown)
+        while True:
+            try:
+                self._sessions.get_nowait().connection.close()
+            except queue.Empty:
+                return
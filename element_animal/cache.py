@@ -0,0 +1,209 @@
+"""Opt-in in-process cache for small, rarely changing Lookup tables.
+
+Each cached table is loaded with a single query the first time it is needed.
+Subsequent lookups by primary key are served from memory. Tables are reloaded
+after `ttl` seconds, evicted least-recently-used beyond `maxsize` tables, and
+dropped explicitly with `invalidate` after inserts.
+
+Example:
+    >>> from element_animal import cache, subject
+    >>> lookup_cache = cache.enable_lookup_cache(ttl=3600)
+    >>> lookup_cache.get(subject.Species, "Mus musculus")
+    {'species': 'Mus musculus'}
+    >>> lookup_cache.stats()
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from . import injection, subject, surgery
+
+DEFAULT_TABLES = (
+    subject.Species,
+    subject.Strain,
+    subject.Allele,
+    subject.Line,
+    surgery.Hemisphere,
+    surgery.CoordinateReference,
+    surgery.ImplantationType,
+    injection.VirusSerotype,
+)
+
+_default_cache = None
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counts of one cached table.
+
+    Attributes:
+        hits (int): Lookups served from memory.
+        misses (int): Lookups that loaded the table with one database query.
+        evictions (int): Times the table was dropped by TTL, LRU or invalidation.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def round_trips_saved(self) -> int:
+        """Database queries avoided compared to an uncached lookup."""
+        return self.hits
+
+
+class _CachedTable:
+    """Rows of one table keyed by primary-key tuple."""
+
+    def __init__(self, table):
+        self.primary_key = tuple(table.primary_key)
+        self.rows = {
+            tuple(row[k] for k in self.primary_key): row
+            for row in table.fetch(as_dict=True)
+        }
+        self.loaded_at = time.monotonic()
+
+
+class LookupCache:
+    """Read-through cache of Lookup table contents.
+
+    Args:
+        tables (iterable, optional): Tables that may be cached. Defaults to
+            `DEFAULT_TABLES`. Other tables are rejected to keep the cache limited
+            to small, slowly changing tables.
+        ttl (float, optional): Seconds after which a loaded table is reloaded.
+            Defaults to None, never expire.
+        maxsize (int, optional): Maximum number of tables held in memory,
+            evicting the least recently used. Defaults to None, unbounded.
+    """
+
+    def __init__(self, tables=None, *, ttl: float = None, maxsize: int = None):
+        self.tables = {self._table_class(table) for table in tables or DEFAULT_TABLES}
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._cached = OrderedDict()
+        self._stats = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _table_class(table) -> type:
+        return table if isinstance(table, type) else type(table)
+
+    def _get_cached(self, table) -> _CachedTable:
+        table_class = self._table_class(table)
+        if table_class not in self.tables:
+            raise KeyError(f"{table_class.__name__} is not a cacheable table")
+        with self._lock:
+            stats = self._stats.setdefault(table_class, CacheStats())
+            cached = self._cached.get(table_class)
+            if (
+                cached is not None
+                and self.ttl is not None
+                and time.monotonic() - cached.loaded_at > self.ttl
+            ):
+                self._evict(table_class)
+                cached = None
+            if cached is None:
+                stats.misses += 1
+                cached = self._cached[table_class] = _CachedTable(table_class)
+                while self.maxsize is not None and len(self._cached) > self.maxsize:
+                    self._evict(next(iter(self._cached)))
+            else:
+                stats.hits += 1
+                self._cached.move_to_end(table_class)
+            return cached
+
+    def _evict(self, table_class: type):
+        del self._cached[table_class]
+        self._stats.setdefault(table_class, CacheStats()).evictions += 1
+
+    def get(self, table, key, default=None):
+        """Fetch one row of `table` by primary key without querying the database.
+
+        Args:
+            table (dj.Table): Cached table.
+            key (dict | tuple | scalar): Primary key as a dict, a tuple of
+                primary-key values in heading order, or a single value for
+                tables with a one-attribute primary key.
+            default (optional): Returned when the key is not in the table.
+
+        Returns:
+            dict: The row, or `default`.
+        """
+        cached = self._get_cached(table)
+        if isinstance(key, dict):
+            key = tuple(key[k] for k in cached.primary_key)
+        elif not isinstance(key, tuple):
+            key = (key,)
+        return cached.rows.get(key, default)
+
+    def contains(self, table, key) -> bool:
+        """True if `key` is a primary key of `table`."""
+        return self.get(table, key) is not None
+
+    def primary_keys(self, table) -> set:
+        """Set of primary-key tuples of `table`, in heading order."""
+        return set(self._get_cached(table).rows)
+
+    def fetch(self, table) -> list:
+        """All rows of `table` as a list of dicts."""
+        return list(self._get_cached(table).rows.values())
+
+    def invalidate(self, table=None):
+        """Drop `table`, or every table when None, so it is reloaded on next use."""
+        with self._lock:
+            table_classes = (
+                [self._table_class(table)] if table is not None else list(self._cached)
+            )
+            for table_class in table_classes:
+                if table_class in self._cached:
+                    self._evict(table_class)
+
+    def insert(self, table, rows, **kwargs):
+        """Insert `rows` into `table` and invalidate its cached contents.
+
+        Args:
+            table (dj.Table): Cached table.
+            rows (iterable): Rows passed to `table.insert`.
+            **kwargs: Keyword arguments passed to `table.insert`.
+        """
+        table.insert(rows, **kwargs)
+        self.invalidate(table)
+
+    def stats(self) -> dict:
+        """Hit/miss statistics keyed by full table name."""
+        with self._lock:
+            return {
+                table.full_table_name: CacheStats(**vars(stats))
+                for table, stats in self._stats.items()
+            }
+
+
+def enable_lookup_cache(tables=None, *, ttl: float = None, maxsize: int = None):
+    """Create the package-wide Lookup cache used by element-animal helpers.
+
+    Args:
+        tables (iterable, optional): Tables that may be cached. Defaults to
+            `DEFAULT_TABLES`.
+        ttl (float, optional): Seconds after which a loaded table is reloaded.
+        maxsize (int, optional): Maximum number of tables held in memory.
+
+    Returns:
+        LookupCache: The enabled cache.
+    """
+    global _default_cache
+    _default_cache = LookupCache(tables, ttl=ttl, maxsize=maxsize)
+    return _default_cache
+
+
+def disable_lookup_cache():
+    """Disable the package-wide Lookup cache."""
+    global _default_cache
+    _default_cache = None
+
+
+def get_lookup_cache():
+    """The package-wide Lookup cache, or None when caching is disabled."""
+    return _default_cache
@@ -0,0 +1,249 @@
+"""Cage occupancy derived from `genotyping.SubjectCaging` events.
+
+Each caging event starts a residency interval that ends at the subject's next
+caging event or at its death (`subject.SubjectDeath`, taken as the start of the
+death date). For every cage, the timeline is cut at all interval boundaries into
+segments of constant occupancy, so point-in-time and range queries are binary
+searches:
+
+    >>> from element_animal.caging import CageOccupancy
+    >>> occupancy = CageOccupancy.load()
+    >>> occupancy.occupants("C-104", "2024-03-01 09:00")
+    ['M0012', 'M0013']
+    >>> occupancy.occupancy_counts(pd.date_range("2024-01-01", periods=90))
+"""
+
+import numpy as np
+import pandas as pd
+
+from . import genotyping, subject
+
+_CAGE_SHIFT = np.int64(34)  # seconds since the first event fit in 34 bits
+
+
+class CageOccupancy:
+    """Interval index of cage residency.
+
+    Args:
+        caging (pd.DataFrame): Caging events with columns `subject`, `cage` and
+            `caging_datetime`.
+        deaths (pd.DataFrame, optional): Columns `subject` and `death_date`.
+
+    Attributes:
+        intervals (pd.DataFrame): Residency intervals with columns `subject`,
+            `cage`, `start` and `end`; `end` is NaT while the subject stays.
+    """
+
+    def __init__(self, caging: pd.DataFrame, deaths: pd.DataFrame = None):
+        caging = caging.sort_values(["subject", "caging_datetime"], kind="stable")
+        start = pd.to_datetime(caging["caging_datetime"]).to_numpy("datetime64[s]")
+        subjects = caging["subject"].to_numpy(dtype=object)
+        is_last = np.append(subjects[1:] != subjects[:-1], True)
+        end = np.append(start[1:], np.datetime64("NaT", "s"))
+        if deaths is not None and len(deaths):
+            death_of = pd.Series(
+                pd.to_datetime(deaths["death_date"]).to_numpy("datetime64[s]"),
+                index=deaths["subject"],
+            )
+            death = death_of.reindex(subjects).to_numpy("datetime64[s]")
+            end = np.where(is_last, death, end)
+            end = np.where(end < start, start, end)
+        else:
+            end = np.where(is_last, np.datetime64("NaT", "s"), end)
+        self.intervals = pd.DataFrame(
+            {
+                "subject": subjects,
+                "cage": caging["cage"].to_numpy(dtype=object),
+                "start": start,
+                "end": end,
+            }
+        )
+        self._build()
+
+    @classmethod
+    def load(cls, restriction=None):
+        """Load caging and death records with two queries.
+
+        Args:
+            restriction (optional): Restriction on `genotyping.SubjectCaging`,
+                e.g. a set of subjects or cages. Defaults to all events.
+
+        Returns:
+            CageOccupancy: Occupancy index.
+        """
+        caging = genotyping.SubjectCaging()
+        if restriction is not None:
+            caging &= restriction
+        return cls(
+            pd.DataFrame(
+                caging.fetch("subject", "cage", "caging_datetime", as_dict=True),
+                columns=["subject", "cage", "caging_datetime"],
+            ),
+            pd.DataFrame(
+                (subject.SubjectDeath & caging).fetch(
+                    "subject", "death_date", as_dict=True
+                ),
+                columns=["subject", "death_date"],
+            ),
+        )
+
+    def _key(self, cage_ids: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """Sort keys ordering (cage, time) lexicographically."""
+        seconds = (times - self._origin).astype(np.int64)
+        return (cage_ids.astype(np.int64) << _CAGE_SHIFT) + np.clip(
+            seconds, -1, self._open_end
+        )
+
+    def _build(self):
+        """Cut each cage's timeline into segments of constant occupancy."""
+        intervals = self.intervals
+        self._cage_index = pd.Index(pd.unique(intervals["cage"]))
+        self._subject_index = pd.Index(pd.unique(intervals["subject"]))
+        cage_ids = self._cage_index.get_indexer(intervals["cage"])
+        subject_ids = self._subject_index.get_indexer(intervals["subject"])
+        start = intervals["start"].to_numpy("datetime64[s]")
+        end = intervals["end"].to_numpy("datetime64[s]")
+
+        self._origin = start.min() if len(start) else np.datetime64(0, "s")
+        self._open_end = np.int64((1 << int(_CAGE_SHIFT)) - 1)
+        start_keys = self._key(cage_ids, start)
+        end_keys = np.where(
+            np.isnat(end),
+            (cage_ids.astype(np.int64) << _CAGE_SHIFT) + self._open_end,
+            self._key(cage_ids, end),
+        )
+
+        # segment boundaries, sorted by cage then time
+        self._bounds = np.unique(np.concatenate([start_keys, end_keys]))
+        first = np.searchsorted(self._bounds, start_keys)
+        stop = np.searchsorted(self._bounds, end_keys)
+
+        # occupants of each segment in compressed sparse row form
+        counts = stop - first
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        segments = np.repeat(first, counts) + offsets
+        order = np.argsort(segments, kind="stable")
+        self._occupant_idx = np.repeat(subject_ids, counts)[order]
+        self._occupant_ptr = np.zeros(len(self._bounds) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(segments, minlength=len(self._bounds)),
+            out=self._occupant_ptr[1:],
+        )
+
+    def _segments(self, cage_ids: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """Segment containing each (cage, time), -1 where the cage is empty."""
+        keys = self._key(cage_ids, times)
+        segments = np.searchsorted(self._bounds, keys, side="right") - 1
+        in_cage = (segments >= 0) & (
+            (self._bounds[np.maximum(segments, 0)] >> _CAGE_SHIFT) == cage_ids
+        )
+        return np.where(in_cage & (cage_ids >= 0), segments, -1)
+
+    def _occupants_of(self, segment: int) -> list:
+        if segment < 0:
+            return []
+        ids = self._occupant_idx[
+            self._occupant_ptr[segment] : self._occupant_ptr[segment + 1]
+        ]
+        return sorted(self._subject_index[ids])
+
+    def occupants(self, cage, at) -> list:
+        """Subjects housed in `cage` at time `at`.
+
+        Args:
+            cage (str): Cage identifier.
+            at (datetime | str): Point in time.
+
+        Returns:
+            list: Subject identifiers, sorted.
+        """
+        cage_ids = self._cage_index.get_indexer([cage])
+        times = np.array([pd.Timestamp(at).to_datetime64()], dtype="datetime64[s]")
+        return self._occupants_of(self._segments(cage_ids, times)[0])
+
+    def occupants_between(self, cage, start, end) -> list:
+        """Subjects housed in `cage` at any time in [start, end).
+
+        Args:
+            cage (str): Cage identifier.
+            start (datetime | str): Start of the time range.
+            end (datetime | str): End of the time range, exclusive.
+
+        Returns:
+            list: Subject identifiers, sorted.
+        """
+        cage_ids = self._cage_index.get_indexer([cage])
+        times = np.array(
+            [pd.Timestamp(start).to_datetime64(), pd.Timestamp(end).to_datetime64()],
+            dtype="datetime64[s]",
+        )
+        if cage_ids[0] < 0 or times[1] <= times[0]:
+            return []
+        keys = self._key(np.repeat(cage_ids, 2), times)
+        first = max(
+            np.searchsorted(self._bounds, keys[0], side="right") - 1,
+            np.searchsorted(self._bounds, cage_ids[0] << _CAGE_SHIFT),
+        )
+        stop = np.searchsorted(self._bounds, keys[1])
+        ids = self._occupant_idx[self._occupant_ptr[first] : self._occupant_ptr[stop]]
+        return sorted(self._subject_index[np.unique(ids)])
+
+    def _grid(self, timestamps, cages):
+        cages = self._cage_index if cages is None else pd.Index(cages)
+        times = pd.DatetimeIndex(pd.to_datetime(timestamps))
+        cage_ids = np.repeat(self._cage_index.get_indexer(cages), len(times))
+        segments = self._segments(
+            cage_ids, np.tile(times.to_numpy("datetime64[s]"), len(cages))
+        )
+        return cages, times, segments
+
+    def occupancy_counts(self, timestamps, cages=None) -> pd.DataFrame:
+        """Number of subjects in each cage at each timestamp, in one vectorized call.
+
+        Args:
+            timestamps (array-like): Points in time.
+            cages (array-like, optional): Cage identifiers. Defaults to all cages.
+
+        Returns:
+            pd.DataFrame: Occupant counts indexed by cage with timestamps as
+                columns.
+        """
+        cages, times, segments = self._grid(timestamps, cages)
+        counts = np.where(
+            segments >= 0,
+            self._occupant_ptr[segments + 1] - self._occupant_ptr[segments],
+            0,
+        )
+        return pd.DataFrame(
+            counts.reshape(len(cages), len(times)), index=cages, columns=times
+        )
+
+    def occupancy(self, timestamps, cages=None) -> pd.DataFrame:
+        """Occupants of each cage at each timestamp, in one vectorized call.
+
+        Args:
+            timestamps (array-like): Points in time.
+            cages (array-like, optional): Cage identifiers. Defaults to all cages.
+
+        Returns:
+            pd.DataFrame: One row per (cage, timestamp, subject) with columns
+                `cage`, `timestamp` and `subject`.
+        """
+        cages, times, segments = self._grid(timestamps, cages)
+        query_idx = np.flatnonzero(segments >= 0)
+        starts = self._occupant_ptr[segments[query_idx]]
+        counts = self._occupant_ptr[segments[query_idx] + 1] - starts
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        occupant_ids = self._occupant_idx[np.repeat(starts, counts) + offsets]
+        query_idx = np.repeat(query_idx, counts)
+        return pd.DataFrame(
+            {
+                "cage": np.asarray(cages, dtype=object)[query_idx // len(times)],
+                "timestamp": times[query_idx % len(times)],
+                "subject": self._subject_index[occupant_ids],
+            }
+        )
@@ -0,0 +1,234 @@
+import datajoint as dj
+
+from . import genotyping, subject
+from .activation import activate_schema, resolve_linking_module
+
+schema = dj.schema()
+_linking_module = None
+
+
+def activate(
+    census_schema_name: str,
+    genotyping_schema_name: str = None,
+    subject_schema_name: str = None,
+    *,
+    create_schema: bool = True,
+    create_tables: bool = True,
+    linking_module=None,
+):
+    """Activate this schema.
+
+    Args:
+        census_schema_name (str): schema name on the database server to
+                                activate the `census` element.
+        genotyping_schema_name (str): schema name on the database server to
+                                activate the `genotyping` element.
+        subject_schema_name (str): schema name on the database server to
+                                activate the `subject` element.
+        create_schema (bool): when True (default), create schema in the
+                            database if it does not yet exist.
+        create_tables (bool): when True (default), create tables in the
+                            database if they do not yet exist.
+        linking_module (str): A module name or a module containing the required
+            dependencies to activate the `census` module.
+
+    Dependencies:
+    Upstream tables:
+        Lab: The lab for which a particular animal belongs to.
+    """
+    linking_module = resolve_linking_module(
+        "census", census_schema_name, linking_module
+    )
+
+    global _linking_module
+    _linking_module = linking_module
+
+    genotyping.activate(
+        genotyping_schema_name,
+        subject_schema_name,
+        create_schema=create_schema,
+        create_tables=create_tables,
+        linking_module=linking_module,
+    )
+    activate_schema(
+        "census",
+        schema,
+        census_schema_name,
+        create_schema=create_schema,
+        create_tables=create_tables,
+        add_objects=_linking_module.__dict__,
+    )
+
+
+@schema
+class SubjectCensus(dj.Computed):
+    """Current state of each subject, materialized for colony dashboards.
+
+    A subject that belongs to several labs is counted under the first lab in
+    alphabetical order. Use `refresh_census` to update only the subjects whose
+    source rows changed.
+
+    Attributes:
+        subject.Subject (foreign key): subject.Subject key.
+        sex (enum): 'M', 'F', or 'U'; Male, Female, or Unknown.
+        subject_birth_date (date): Birth date of the subject.
+        subject.Line (foreign key, nullable): Genetic line of the subject.
+        Lab (foreign key, nullable): Lab where the subject belongs.
+        genotyping.Cage (foreign key, nullable): Cage of the latest caging event.
+        caging_datetime (datetime, nullable): Date of the latest cage entry.
+        death_date (date, nullable): Death date.
+        is_alive (bool): Whether no death is recorded for the subject.
+    """
+
+    definition = """
+    -> subject.Subject
+    ---
+    sex                     : enum('M', 'F', 'U')
+    subject_birth_date      : date
+    -> [nullable] subject.Line
+    -> [nullable] Lab
+    -> [nullable] genotyping.Cage
+    caging_datetime=null    : datetime  # date of the latest cage entry
+    death_date=null         : date
+    is_alive                : bool
+    """
+
+    def make(self, key):
+        """Populate the census entry of one subject."""
+        self.insert1(_current_census(key).fetch1())
+
+
+def _lab_attribute() -> str:
+    """Primary-key attribute of the upstream Lab table."""
+    (lab_attribute,) = set(subject.Subject.Lab.primary_key) - {"subject"}
+    return lab_attribute
+
+
+def _current_census(restriction=None):
+    """Query computing the census attributes of subjects from source tables.
+
+    Args:
+        restriction (optional): Subject keys to compute the census of, applied
+            before aggregating labs and caging events. Defaults to all subjects.
+    """
+    lab_attribute = _lab_attribute()
+    subjects, labs, caging = (
+        table if restriction is None else table & restriction
+        for table in (
+            subject.Subject,
+            subject.Subject.Lab,
+            genotyping.SubjectCaging,
+        )
+    )
+    first_lab = subjects.aggr(labs, **{lab_attribute: f"MIN({lab_attribute})"})
+    latest_caging = caging & subjects.aggr(
+        caging, caging_datetime="MAX(caging_datetime)"
+    )
+    current = subjects.join(subject.Subject.Line, left=True)
+    current = current.join(first_lab, left=True)
+    current = current.join(latest_caging.proj("cage"), left=True)
+    current = current.join(subject.SubjectDeath, left=True)
+    return current.proj(
+        "sex",
+        "subject_birth_date",
+        "line",
+        lab_attribute,
+        "cage",
+        "caging_datetime",
+        "death_date",
+        is_alive="death_date IS NULL",
+    )
+
+
+def _stale_subjects() -> set:
+    """Subjects whose census entry disagrees with one of its source tables.
+
+    Each source table is compared with the census on its own, joined on the
+    subject, so no query computes the full census. Newer caging events are
+    found through the primary key of `SubjectCaging` rather than by
+    recomputing the latest event of every subject.
+    """
+    lab_attribute = _lab_attribute()
+    census = SubjectCensus()
+    caging = census.proj(census_cage="cage", latest="caging_datetime")
+    checks = [
+        census * subject.Subject.proj(sex_now="sex", birth_now="subject_birth_date")
+        & "NOT (sex <=> sex_now AND subject_birth_date <=> birth_now)",
+        census.join(subject.Subject.Line.proj(line_now="line"), left=True)
+        & "NOT (line <=> line_now)",
+        census.join(
+            subject.Subject.aggr(subject.Subject.Lab, lab_now=f"MIN({lab_attribute})"),
+            left=True,
+        )
+        & f"NOT ({lab_attribute} <=> lab_now)",
+        census.join(subject.SubjectDeath.proj(death_now="death_date"), left=True)
+        & "NOT (death_date <=> death_now)",
+        # a caging event after the recorded latest one
+        caging * genotyping.SubjectCaging.proj(event="caging_datetime")
+        & "latest IS NULL OR event > latest",
+        # the recorded latest caging event was deleted or corrected
+        (caging & "latest IS NOT NULL").join(
+            genotyping.SubjectCaging.proj(cage_now="cage", latest="caging_datetime"),
+            left=True,
+        )
+        & "NOT (census_cage <=> cage_now)",
+    ]
+    return {name for check in checks for name in check.fetch("subject")}
+
+
+def refresh_census(batch_size: int = 10000) -> dict:
+    """Bring `SubjectCensus` up to date, recomputing only changed subjects.
+
+    Stale entries are found by comparing the census with each source table
+    separately (see `_stale_subjects`), and only the census of stale or new
+    subjects is computed and transferred. Census entries of deleted subjects
+    are removed by the foreign key cascade when subjects are deleted.
+
+    Args:
+        batch_size (int, optional): Maximum rows per INSERT statement.
+            Defaults to 10000.
+
+    Returns:
+        dict: Number of subjects `added` to and `updated` in the census.
+    """
+    changed = _stale_subjects()
+    added = (subject.Subject - SubjectCensus).fetch("subject")
+
+    connection = SubjectCensus.connection
+    stale = [{"subject": s} for s in [*sorted(changed), *added]]
+    for start in range(0, len(stale), batch_size):
+        keys = stale[start : start + batch_size]
+        with connection.transaction:
+            (SubjectCensus & keys).delete_quick()
+            SubjectCensus.insert(
+                _current_census(keys).fetch(as_dict=True), allow_direct_insert=True
+            )
+    return {"added": len(added), "updated": len(changed)}
+
+
+def live_census(
+    by=("line", "sex", "cage"), age_brackets=(21, 60, 90, 180, 365)
+) -> dj.expression.QueryExpression:
+    """Counts of live subjects grouped by census attributes, read from one table.
+
+    Args:
+        by (tuple, optional): Grouping attributes among the `SubjectCensus`
+            attributes, the lab attribute and `age_bracket`. Defaults to line,
+            sex and cage.
+        age_brackets (tuple, optional): Age bracket boundaries in days,
+            ascending. Brackets are labeled like "21-59d" and ">=365d".
+
+    Returns:
+        QueryExpression: One row per group with the number of live subjects in
+            `n_subjects`; fetch it as usual.
+    """
+    age = "DATEDIFF(CURDATE(), subject_birth_date)"
+    edges = [0, *age_brackets]
+    cases = " ".join(
+        f"WHEN {age} < {upper} THEN '{lower}-{upper - 1}d'"
+        for lower, upper in zip(edges[:-1], edges[1:])
+    )
+    census = (SubjectCensus & "is_alive").proj(
+        ..., age_bracket=f"CASE {cases} ELSE '>={edges[-1]}d' END"
+    )
+    return dj.U(*by).aggr(census, n_subjects="COUNT(*)")
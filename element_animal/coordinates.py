@@ -0,0 +1,217 @@
+"""Stereotaxic coordinates of implantations as NumPy arrays.
+
+`surgery.Implantation.Coordinate` stores each of ap, ml and dv relative to its
+own `CoordinateReference`. `Coordinates` fetches a whole restriction with one
+query and converts it between reference frames, and computes insertion
+directions and trajectory endpoints, as array operations:
+
+    >>> from element_animal.coordinates import Coordinates, ReferenceOffsets
+    >>> offsets = ReferenceOffsets()
+    >>> offsets.set(measured)  # per-subject lambda, dura, ... positions
+    >>> coordinates = Coordinates.load({"implant_type": "opto"})
+    >>> coordinates.positions("bregma", offsets)
+    >>> coordinates.trajectory_endpoints(depth=2.5, offsets=offsets)
+
+Positions are (n, 3) arrays with columns ap, ml and dv, in mm, anterior, right
+and dorsal positive. The direction of an implant is the unit vector
+u = (sin(theta) sin(phi), sin(theta) cos(phi), cos(theta)) in (ap, ml, dv), with
+theta measured from the dorsal axis and phi from the ml axis; a probe advances
+along -u from its insertion site.
+"""
+
+import numpy as np
+import pandas as pd
+
+from . import surgery
+
+AXES = ("ap", "ml", "dv")
+
+# position of each reference relative to bregma (ap, ml, dv) in mm; NaN where it
+# depends on the subject or the site and must be provided per subject
+DEFAULT_OFFSETS = {
+    "bregma": (0.0, 0.0, 0.0),
+    "lambda": (-4.2, 0.0, 0.0),
+    "sagittal_suture": (np.nan, 0.0, np.nan),
+    "dura": (np.nan, np.nan, np.nan),
+    "skull_surface": (np.nan, np.nan, np.nan),
+    "sinus": (np.nan, np.nan, np.nan),
+}
+
+
+class ReferenceOffsets:
+    """Position of each coordinate reference relative to bregma, per subject.
+
+    Per-subject offsets, e.g. the measured lambda-to-bregma distance, take
+    precedence over `defaults`. Offsets of subjects not yet known are requested
+    from `loader` once and cached for later conversions.
+
+    Args:
+        defaults (dict, optional): Reference to its (ap, ml, dv) offset from
+            bregma. Defaults to `DEFAULT_OFFSETS`.
+        loader (callable, optional): Called with a list of subjects, returns a
+            DataFrame of their offsets as accepted by `set`.
+    """
+
+    def __init__(self, defaults: dict = None, loader=None):
+        defaults = DEFAULT_OFFSETS if defaults is None else defaults
+        self._default_index = pd.Index(list(defaults))
+        self._defaults = np.array(list(defaults.values()), dtype=np.float64)
+        self.loader = loader
+        self._index = pd.MultiIndex.from_arrays([[], []])
+        self._offsets = np.empty((0, 3))
+        self._loaded = set()
+
+    def set(self, offsets: pd.DataFrame):
+        """Add or replace per-subject offsets.
+
+        Args:
+            offsets (pd.DataFrame): Columns `subject`, `reference`, `ap`, `ml`
+                and `dv`; NaN falls back to the default for that axis.
+        """
+        keys = pd.MultiIndex.from_arrays([offsets["subject"], offsets["reference"]])
+        values = offsets[list(AXES)].to_numpy(dtype=np.float64)
+        kept = ~self._index.isin(keys)
+        self._index = self._index[kept].append(keys)
+        self._offsets = np.concatenate([self._offsets[kept], values])
+        self._loaded.update(offsets["subject"])
+
+    def clear(self):
+        """Drop all per-subject offsets."""
+        self._index = pd.MultiIndex.from_arrays([[], []])
+        self._offsets = np.empty((0, 3))
+        self._loaded = set()
+
+    def lookup(self, subjects, references) -> np.ndarray:
+        """Offsets from bregma of the references of each row.
+
+        Args:
+            subjects (array-like): Subject of each row.
+            references (array-like): Reference of each row.
+
+        Returns:
+            np.ndarray: (n, 3) offsets in (ap, ml, dv); NaN where unknown.
+        """
+        subjects = np.asarray(subjects, dtype=object)
+        references = np.asarray(references, dtype=object)
+        if self.loader is not None:
+            missing = [s for s in pd.unique(subjects) if s not in self._loaded]
+            if missing:
+                self.set(self.loader(missing))
+                self._loaded.update(missing)
+
+        default_rows = self._default_index.get_indexer(references)
+        offsets = np.where(
+            (default_rows >= 0)[:, None],
+            self._defaults[np.maximum(default_rows, 0)],
+            np.nan,
+        )
+        rows = self._index.get_indexer(
+            pd.MultiIndex.from_arrays([subjects, references])
+        )
+        found = rows >= 0
+        measured = self._offsets[rows[found]]
+        offsets[found] = np.where(np.isnan(measured), offsets[found], measured)
+        return offsets
+
+
+class Coordinates:
+    """Implantation coordinates as arrays, one row per implantation.
+
+    Args:
+        coordinates (pd.DataFrame): Rows of `surgery.Implantation.Coordinate`.
+
+    Attributes:
+        keys (pd.DataFrame): Primary keys of the implantations.
+        values (np.ndarray): (n, 3) ap, ml and dv as stored.
+        references (np.ndarray): (n, 3) reference of each stored value.
+        theta, phi, beta (np.ndarray): Angles in degrees, NaN where unset.
+    """
+
+    def __init__(self, coordinates: pd.DataFrame):
+        self.keys = coordinates[surgery.Implantation.primary_key].reset_index(drop=True)
+        self.values = coordinates[list(AXES)].to_numpy(dtype=np.float64)
+        self.references = coordinates[[f"{axis}_ref" for axis in AXES]].to_numpy(
+            dtype=object
+        )
+        self.theta = coordinates["theta"].to_numpy(dtype=np.float64)
+        self.phi = coordinates["phi"].to_numpy(dtype=np.float64)
+        self.beta = coordinates["beta"].to_numpy(dtype=np.float64)
+
+    @classmethod
+    def load(cls, restriction=None):
+        """Fetch the coordinates of implantations matching `restriction`.
+
+        Args:
+            restriction (optional): Restriction on `surgery.Implantation`.
+                Defaults to all implantations.
+
+        Returns:
+            Coordinates: Coordinates fetched with a single query.
+        """
+        query = surgery.Implantation.Coordinate()
+        if restriction is not None:
+            query &= restriction
+        return cls(pd.DataFrame(query.fetch(order_by=query.primary_key)))
+
+    def __len__(self):
+        return len(self.values)
+
+    def positions(self, reference: str = "bregma", offsets=None) -> np.ndarray:
+        """Coordinates of all implantations in one reference frame.
+
+        Args:
+            reference (str, optional): Target reference. Defaults to bregma.
+            offsets (ReferenceOffsets, optional): Reference positions. Defaults
+                to `DEFAULT_OFFSETS` for every subject.
+
+        Returns:
+            np.ndarray: (n, 3) ap, ml and dv relative to `reference`; NaN where
+                an offset is unknown.
+        """
+        offsets = ReferenceOffsets() if offsets is None else offsets
+        subjects = self.keys["subject"].to_numpy(dtype=object)
+        positions = self.values.copy()
+        for axis in range(3):
+            same = self.references[:, axis] == reference
+            source = offsets.lookup(subjects[~same], self.references[~same, axis])
+            target = offsets.lookup(
+                subjects[~same], np.full((~same).sum(), reference, dtype=object)
+            )
+            positions[~same, axis] += source[:, axis] - target[:, axis]
+        return positions
+
+    def unit_vectors(self) -> np.ndarray:
+        """Insertion directions as (n, 3) unit vectors in (ap, ml, dv).
+
+        Unset angles are taken as 0, a vertical insertion.
+        """
+        theta = np.radians(np.nan_to_num(self.theta))
+        phi = np.radians(np.nan_to_num(self.phi))
+        return np.column_stack(
+            [np.sin(theta) * np.sin(phi), np.sin(theta) * np.cos(phi), np.cos(theta)]
+        )
+
+    def trajectory_endpoints(
+        self, depth, reference: str = "bregma", offsets=None
+    ) -> np.ndarray:
+        """Tip positions after advancing `depth` mm along each trajectory.
+
+        Args:
+            depth (float | array-like): Insertion depth, one value or one per
+                implantation.
+            reference (str, optional): Reference frame of the result.
+            offsets (ReferenceOffsets, optional): Reference positions.
+
+        Returns:
+            np.ndarray: (n, 3) ap, ml and dv of the tips.
+        """
+        depth = np.broadcast_to(np.asarray(depth, dtype=np.float64), len(self))
+        return self.positions(reference, offsets) - depth[:, None] * self.unit_vectors()
+
+    def to_dataframe(self, reference: str = "bregma", offsets=None) -> pd.DataFrame:
+        """Implantation keys with positions in one reference frame."""
+        positions = self.positions(reference, offsets)
+        return self.keys.assign(
+            **{axis: positions[:, i] for i, axis in enumerate(AXES)},
+            reference=reference,
+        )
@@ -1,3 +1,24 @@
-from .nwb import subject_to_nwb
+from .nwb import (
+    NWBSurgery,
+    SubjectExportError,
+    SurgeryLookups,
+    subject_to_nwb,
+    subjects_to_nwb,
+    subjects_to_nwb_parallel,
+    surgeries_to_nwb,
+    surgery_to_nwb,
+)
+from .parquet import export_snapshot, read_snapshot
 
-__all__ = ["subject_to_nwb"]
+__all__ = [
+    "NWBSurgery",
+    "SubjectExportError",
+    "SurgeryLookups",
+    "export_snapshot",
+    "read_snapshot",
+    "subject_to_nwb",
+    "subjects_to_nwb",
+    "subjects_to_nwb_parallel",
+    "surgeries_to_nwb",
+    "surgery_to_nwb",
+]
@@ -1,26 +1,36 @@
+import importlib.util
+import inspect
 import json
+import multiprocessing
+from dataclasses import dataclass
 from datetime import datetime
+from itertools import islice
+from typing import TYPE_CHECKING
 
-import pynwb
+import datajoint as dj
+import pandas as pd
 
 from .. import subject
+from ..instrumentation import operation
 
+if TYPE_CHECKING:
+    import hdmf
+    import pynwb
 
-def subject_to_nwb(session_key: dict):
-    """Generate a dictionary object containing subject information.
+
+def _build_nwb_subject(subject_info: dict, species, alleles) -> "pynwb.file.Subject":
+    """Assemble a pynwb Subject from a fetched subject record.
 
     Args:
-        session_key (dict): Key specifying one entry in element_animal.subject.Subject
+        subject_info (dict): Subject record joined with its one-to-one parts.
+        species (str): Species of the subject, or None if unknown.
+        alleles (list): Alleles of the subject's line, joined as the genotype.
 
     Returns:
         pynwb.file.Subject: NWB object
     """
-    subject_query = subject.Subject & session_key
-    subject_query = subject_query.join(subject.Subject.Species, left=True)
-    subject_query = subject_query.join(subject.Subject.Line, left=True)
-    subject_query = subject_query.join(subject.Subject.Strain, left=True)
-    subject_query = subject_query.join(subject.Subject.Source, left=True)
-    subject_info = subject_query.fetch1()
+    # imported here so that importing this module does not load pynwb
+    import pynwb
 
     return pynwb.file.Subject(
         subject_id=subject_info["subject"],
@@ -30,8 +40,555 @@ def subject_to_nwb(session_key: dict):
             datetime.strptime("00:00:00", "%H:%M:%S").time(),
         ),
         description=json.dumps(subject_info, default=str),
-        species=str((subject.Species & subject_query).fetch1("species")),
-        genotype=" x ".join(
-            (subject.Line.Allele * subject.Subject.Line & subject_query).fetch("allele")
+        species=None if species is None else str(species),
+        genotype=" x ".join(alleles),
+    )
+
+
+def _subject_info_query(restriction):
+    """Subject restricted by `restriction`, left-joined with its one-to-one parts."""
+    subject_query = subject.Subject & restriction
+    subject_query = subject_query.join(subject.Subject.Species, left=True)
+    subject_query = subject_query.join(subject.Subject.Line, left=True)
+    subject_query = subject_query.join(subject.Subject.Strain, left=True)
+    subject_query = subject_query.join(subject.Subject.Source, left=True)
+    return subject_query
+
+
+@operation("subject_to_nwb")
+def subject_to_nwb(session_key: dict):
+    """Generate a dictionary object containing subject information.
+
+    Args:
+        session_key (dict): Key specifying one entry in element_animal.subject.Subject
+
+    Returns:
+        pynwb.file.Subject: NWB object
+    """
+    subject_query = _subject_info_query(session_key)
+    subject_info = subject_query.fetch1()
+
+    return _build_nwb_subject(
+        subject_info,
+        species=(subject.Species & subject_query).fetch1("species"),
+        alleles=(subject.Line.Allele * subject.Subject.Line & subject_query).fetch(
+            "allele"
         ),
     )
+
+
+def _iter_subject_key_batches(session_keys, batch_size: int):
+    """Yield lists of Subject primary keys, at most `batch_size` long.
+
+    An iterable of keys is consumed lazily. Any other restriction (dict, string,
+    query expression or None for all subjects) is resolved with a single fetch
+    of the primary keys.
+    """
+    if session_keys is None:
+        session_keys = subject.Subject.fetch("KEY", order_by="subject")
+    elif isinstance(session_keys, (dict, str, dj.expression.QueryExpression)):
+        session_keys = (subject.Subject & session_keys).fetch("KEY", order_by="subject")
+    subject_keys = ({"subject": key["subject"]} for key in session_keys)
+    while True:
+        batch = list(islice(subject_keys, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def subjects_to_nwb(session_keys=None, *, batch_size: int = 1000):
+    """Generate NWB subject objects for many subjects with bulk queries.
+
+    Each batch of `batch_size` subjects costs two queries, one for the subject
+    records with their species, line, strain and source, and one for the
+    alleles of their lines, regardless of how many subjects are in the batch.
+
+    Args:
+        session_keys (iterable | dict | str | QueryExpression, optional): Keys
+            specifying entries in element_animal.subject.Subject, or any
+            restriction on it. Defaults to all subjects.
+        batch_size (int, optional): Number of subjects fetched per batch.
+            Defaults to 1000.
+
+    Yields:
+        pynwb.file.Subject: NWB object, one per key, in the order of the keys.
+
+    Raises:
+        DataJointError: If a key does not specify an existing subject.
+    """
+    for batch in _iter_subject_key_batches(session_keys, batch_size):
+        with operation("subjects_to_nwb.batch"):
+            subject_infos = {
+                subject_info["subject"]: subject_info
+                for subject_info in _subject_info_query(batch).fetch(as_dict=True)
+            }
+            subjects, alleles = (
+                subject.Line.Allele * subject.Subject.Line & batch
+            ).fetch("subject", "allele", order_by=["subject", "allele"])
+        missing = {key["subject"] for key in batch} - subject_infos.keys()
+        if missing:
+            raise dj.DataJointError(f"Unknown subject(s): {sorted(missing)}")
+        genotypes = {}
+        for subject_id, allele in zip(subjects, alleles):
+            genotypes.setdefault(subject_id, []).append(allele)
+
+        for key in batch:
+            subject_info = subject_infos[key["subject"]]
+            yield _build_nwb_subject(
+                subject_info,
+                species=subject_info["species"],
+                alleles=genotypes.get(key["subject"], []),
+            )
+
+
+class SubjectExportError(Exception):
+    """Failure to export one subject, returned in place of its NWB object."""
+
+    def __init__(self, key: dict, message: str):
+        super().__init__(key, message)
+        self.key = key
+        self.message = message
+
+    def __str__(self):
+        return f"{self.key}: {self.message}"
+
+
+class _WorkerStartError:
+    """Returned by a worker whose initialization failed."""
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+_worker_start_error = None
+
+
+def _init_export_worker(
+    subject_schema_name: str, linking_module: str, database_config: dict
+):
+    """Open this worker's connection and activate `subject` once.
+
+    Errors are kept for `_export_worker` to return rather than raised, because
+    `multiprocessing.Pool` replaces a worker whose initializer raises forever.
+    """
+    global _worker_start_error
+    try:
+        dj.config.update(database_config)
+        dj.conn()
+        subject.activate(
+            subject_schema_name,
+            create_schema=False,
+            create_tables=False,
+            linking_module=linking_module,
+        )
+    except Exception as e:
+        _worker_start_error = f"{type(e).__name__}: {e}"
+
+
+def _export_worker(session_key: dict):
+    """Export one subject, returning the error instead of raising it."""
+    if _worker_start_error is not None:
+        return _WorkerStartError(_worker_start_error)
+    try:
+        return subject_to_nwb(session_key)
+    except Exception as e:
+        return SubjectExportError(session_key, f"{type(e).__name__}: {e}")
+
+
+def _is_importable(module_name: str) -> bool:
+    """Whether a spawned process can import `module_name`."""
+    if module_name in ("__main__", "__mp_main__"):
+        return False
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def subjects_to_nwb_parallel(
+    session_keys=None,
+    *,
+    processes: int = None,
+    chunksize: int = 16,
+    subject_schema_name: str = None,
+    linking_module=None,
+):
+    """Export NWB subject objects with `subject_to_nwb` across a process pool.
+
+    Each worker process opens its own DataJoint connection and activates the
+    `subject` schema once, then reuses them for every key it handles.
+
+    Args:
+        session_keys (iterable | dict | str | QueryExpression, optional): Keys
+            specifying entries in element_animal.subject.Subject, or any
+            restriction on it. Defaults to all subjects.
+        processes (int, optional): Number of worker processes. Defaults to the
+            number of CPUs.
+        chunksize (int, optional): Number of keys sent to a worker at a time.
+            Defaults to 16.
+        subject_schema_name (str, optional): Schema name of the `subject`
+            element. Defaults to the schema activated in this process.
+        linking_module (str, optional): A module name containing the required
+            dependencies to activate the `subject` module. Defaults to the
+            linking module used in this process.
+
+    Returns:
+        list: `pynwb.file.Subject` objects in the order of the input keys, with a
+            `SubjectExportError` in place of each subject that failed to export.
+
+    Raises:
+        dj.DataJointError: If the linking module cannot be imported by name,
+            e.g. when it is defined in `__main__`, or a worker fails to
+            connect or activate the schema.
+    """
+    subject_schema_name = subject_schema_name or subject.schema.database
+    linking_module = linking_module or getattr(subject, "_linking_module", None)
+    if inspect.ismodule(linking_module):
+        linking_module = linking_module.__name__
+    assert (
+        subject_schema_name and linking_module
+    ), "Activate the `subject` module or provide its schema name and linking module"
+    if not _is_importable(linking_module):
+        raise dj.DataJointError(
+            f"The linking module {linking_module!r} cannot be imported by worker "
+            "processes; define its tables in an importable module"
+        )
+
+    session_keys = [
+        key
+        for batch in _iter_subject_key_batches(session_keys, chunksize)
+        for key in batch
+    ]
+    database_config = {k: v for k, v in dj.config.items() if k.startswith("database.")}
+
+    # spawn, so that no worker inherits the parent's open connection
+    with multiprocessing.get_context("spawn").Pool(
+        processes,
+        initializer=_init_export_worker,
+        initargs=(subject_schema_name, linking_module, database_config),
+    ) as pool:
+        results = []
+        for result in pool.imap(_export_worker, session_keys, chunksize=chunksize):
+            if isinstance(result, _WorkerStartError):
+                raise dj.DataJointError(
+                    f"An export worker failed to start: {result.message}"
+                )
+            results.append(result)
+        return results
+
+
+_IMPLANTATION_COLUMNS = {
+    "implant_date": "Date and time of the implantation surgery",
+    "implant_type": "Type of implanted device",
+    "implant_description": "Description of the implanted device",
+    "target_region": "Acronym of the targeted brain region",
+    "target_region_name": "Name of the targeted brain region",
+    "target_hemisphere": "Targeted hemisphere",
+    "surgeon": "User who performed the surgery",
+    "ap": "Anterior-posterior coordinate (mm), anterior positive",
+    "ap_ref": "Reference of the anterior-posterior coordinate",
+    "ml": "Medial-lateral coordinate (mm), right positive",
+    "ml_ref": "Reference of the medial-lateral coordinate",
+    "dv": "Dorsal-ventral coordinate (mm), ventral negative",
+    "dv_ref": "Reference of the dorsal-ventral coordinate",
+    "theta": "Elevation (deg), rotation about the ml-axis relative to z",
+    "phi": "Azimuth (deg), rotation about the dv-axis relative to x",
+    "beta": "Rotation about the shank (deg), 0 facing anterior",
+    "implant_comment": "Comments about the implant",
+}
+
+_INJECTION_COLUMNS = {
+    "implant_date": "Date and time of the surgery",
+    "implant_type": "Type of implanted device",
+    "target_region": "Acronym of the injected brain region",
+    "target_region_name": "Name of the injected brain region",
+    "target_hemisphere": "Injected hemisphere",
+    "virus_name": "Full virus name",
+    "virus_serotype": "Virus serotype",
+    "protocol_id": "Injection protocol",
+    "device": "Injection device",
+    "volume_per_pulse": "Volume dispensed per pulse",
+    "injection_rate": "Rate at which the injectate is dispensed",
+    "interpulse_delay": "Delay between injection pulses",
+    "titer": "Titer of the injectate",
+    "total_volume": "Total volume injected",
+    "injection_comment": "Comments about the injection",
+}
+
+_FLOAT_COLUMNS = {
+    "ap",
+    "ml",
+    "dv",
+    "theta",
+    "phi",
+    "beta",
+    "volume_per_pulse",
+    "injection_rate",
+    "interpulse_delay",
+    "total_volume",
+}
+
+
+class SurgeryLookups:
+    """Lookup rows shared by the surgery and injection export.
+
+    Rows of `surgery.BrainRegion`, `surgery.ImplantationType`,
+    `injection.VirusName` and `injection.InjectionProtocol` are fetched the
+    first time a batch references them and reused for every later batch. Pass
+    the same instance to several export calls to share them across calls.
+    """
+
+    def __init__(self):
+        self._rows = {}
+
+    def rows(self, table, values) -> pd.DataFrame:
+        """Rows of a table with a one-attribute primary key, for `values`.
+
+        Args:
+            table (dj.Table): Lookup table.
+            values (iterable): Primary-key values; only unknown ones are
+                fetched, with one query.
+
+        Returns:
+            pd.DataFrame: All known rows of the table.
+        """
+        (attribute,) = table.primary_key
+        known = self._rows.setdefault(table.full_table_name, {})
+        missing = {v for v in values if not pd.isna(v) and v not in known}
+        if missing:
+            for row in (table & [{attribute: v} for v in missing]).fetch(as_dict=True):
+                known[row[attribute]] = row
+        return pd.DataFrame(list(known.values()), columns=table.heading.names)
+
+
+def _queryable(table) -> bool:
+    """Whether the schema of `table` is activated, or the table served offline."""
+    return not isinstance(table, type) or table.database is not None
+
+
+def _fetch_frame(query, columns) -> pd.DataFrame:
+    return pd.DataFrame(query.fetch(as_dict=True, order_by="KEY"), columns=columns)
+
+
+def _implantation_frame(batch: list, lookups: SurgeryLookups) -> pd.DataFrame:
+    """Implantations of a batch of subjects with coordinates, region and type."""
+    from .. import surgery
+
+    query = (surgery.Implantation & batch).join(
+        surgery.Implantation.Coordinate, left=True
+    )
+    implantations = _fetch_frame(query, query.heading.names)
+    regions = lookups.rows(surgery.BrainRegion, implantations["target_region"])
+    types = lookups.rows(surgery.ImplantationType, implantations["implant_type"])
+    return implantations.merge(
+        regions.rename(
+            columns={
+                "region_acronym": "target_region",
+                "region_name": "target_region_name",
+            }
+        ),
+        on="target_region",
+        how="left",
+    ).merge(types, on="implant_type", how="left")
+
+
+def _injection_frame(batch: list, lookups: SurgeryLookups) -> pd.DataFrame:
+    """Injections of a batch of subjects with virus, protocol and region."""
+    from .. import injection, surgery
+
+    query = injection.Injection & batch
+    injections = _fetch_frame(query, query.heading.names)
+    viruses = lookups.rows(injection.VirusName, injections["virus_name"])
+    protocols = lookups.rows(injection.InjectionProtocol, injections["protocol_id"])
+    regions = lookups.rows(surgery.BrainRegion, injections["target_region"])
+    return (
+        injections.merge(viruses, on="virus_name", how="left")
+        .merge(protocols, on="protocol_id", how="left")
+        .merge(
+            regions.rename(
+                columns={
+                    "region_acronym": "target_region",
+                    "region_name": "target_region_name",
+                }
+            ),
+            on="target_region",
+            how="left",
+        )
+    )
+
+
+def _to_dynamic_table(frame: pd.DataFrame, name: str, description: str, columns):
+    """DynamicTable of `columns` of `frame`, with text for missing strings."""
+    from hdmf.common import DynamicTable
+
+    frame = frame.reindex(columns=list(columns)).reset_index(drop=True)
+    for column in frame:
+        if column in _FLOAT_COLUMNS:
+            frame[column] = pd.to_numeric(frame[column]).astype(float)
+        elif not pd.api.types.is_numeric_dtype(frame[column]):
+            frame[column] = ["" if pd.isna(v) else str(v) for v in frame[column]]
+    return DynamicTable.from_dataframe(
+        df=frame,
+        name=name,
+        table_description=description,
+        columns=[{"name": n, "description": d} for n, d in columns.items()],
+    )
+
+
+def _describe_coordinates(row) -> str:
+    """Coordinates of an implantation, or nothing if none is known."""
+    coordinates = [
+        f"{axis.upper()} {value:g} mm" + (f" from {reference}" if reference else "")
+        for axis, value, reference in (
+            ("ap", row.ap, row.ap_ref),
+            ("ml", row.ml, row.ml_ref),
+            ("dv", row.dv, row.dv_ref),
+        )
+        if not pd.isna(value)
+    ]
+    return "; " + ", ".join(coordinates) if coordinates else ""
+
+
+def _describe_surgery(implantations: pd.DataFrame) -> str:
+    """Text for `NWBFile.surgery`, one line per implantation."""
+    return "\n".join(
+        f"{row.implant_date}: {row.implant_type} implant "
+        f"({row.implant_description}) in {row.target_region} "
+        f"({row.target_region_name}), {row.target_hemisphere} hemisphere"
+        f"{_describe_coordinates(row)}; surgeon {row.surgeon}."
+        + (f" {row.implant_comment}" if row.implant_comment else "")
+        for row in implantations.itertuples(index=False)
+    )
+
+
+def _describe_virus(injections: pd.DataFrame) -> str:
+    """Text for `NWBFile.virus`, one line per injection."""
+    unit = dj.config.get("custom", {}).get("injection_volume_unit", "nl")
+    return "\n".join(
+        f"{row.virus_name}"
+        + (f" ({row.virus_serotype})" if row.virus_serotype else "")
+        + f", titer {row.titer}, {row.total_volume:g} {unit} into "
+        f"{row.target_region} ({row.target_hemisphere}) on {row.implant_date}."
+        + (f" {row.injection_comment}" if row.injection_comment else "")
+        for row in injections.itertuples(index=False)
+    )
+
+
+@dataclass
+class NWBSurgery:
+    """Surgery and injection metadata of one subject for an NWB file.
+
+    Attributes:
+        subject (str): Subject identifier.
+        implantations (hdmf.common.DynamicTable): One row per implantation.
+        injections (hdmf.common.DynamicTable): One row per injection; None
+            when the `injection` schema is not activated.
+        surgery (str): Description for `NWBFile.surgery`.
+        virus (str): Description for `NWBFile.virus`.
+    """
+
+    subject: str
+    implantations: "hdmf.common.DynamicTable"
+    injections: "hdmf.common.DynamicTable"
+    surgery: str
+    virus: str
+
+    def add_to(self, nwbfile: "pynwb.NWBFile", module_name: str = "surgery"):
+        """Add the tables to a processing module of `nwbfile` and set its text.
+
+        `NWBFile.surgery` and `NWBFile.virus` are only set when still empty.
+        """
+        module = nwbfile.processing.get(
+            module_name
+        ) or nwbfile.create_processing_module(
+            module_name, "Implantations and virus injections"
+        )
+        module.add(self.implantations)
+        if self.injections is not None:
+            module.add(self.injections)
+        if nwbfile.surgery is None and self.surgery:
+            nwbfile.surgery = self.surgery
+        if nwbfile.virus is None and self.virus:
+            nwbfile.virus = self.virus
+
+
+def surgeries_to_nwb(session_keys=None, *, batch_size: int = 1000, lookups=None):
+    """Generate surgery and injection metadata for many subjects in bulk.
+
+    Each batch of `batch_size` subjects costs one query for the implantations
+    with their coordinates and one for the injections. Brain regions,
+    implantation types, viruses and injection protocols are fetched once for
+    all batches through `lookups`.
+
+    Args:
+        session_keys (iterable | dict | str | QueryExpression, optional): Keys
+            specifying entries in element_animal.subject.Subject, or any
+            restriction on it. Defaults to all subjects.
+        batch_size (int, optional): Number of subjects fetched per batch.
+            Defaults to 1000.
+        lookups (SurgeryLookups, optional): Lookup rows to reuse. Defaults to
+            new lookups shared by the batches of this call.
+
+    Yields:
+        NWBSurgery: Metadata of one subject, in the order of the keys.
+    """
+    from .. import injection
+
+    lookups = lookups or SurgeryLookups()
+    with_injections = _queryable(injection.Injection)
+    for batch in _iter_subject_key_batches(session_keys, batch_size):
+        with operation("surgeries_to_nwb.batch"):
+            implantations = _implantation_frame(batch, lookups)
+            injections = _injection_frame(batch, lookups) if with_injections else None
+        implantations = dict(tuple(implantations.groupby("subject", sort=False)))
+        if injections is not None:
+            injections = dict(tuple(injections.groupby("subject", sort=False)))
+        for key in batch:
+            subject_implantations = implantations.get(
+                key["subject"], pd.DataFrame(columns=list(_IMPLANTATION_COLUMNS))
+            )
+            subject_injections = (
+                None
+                if injections is None
+                else injections.get(
+                    key["subject"], pd.DataFrame(columns=list(_INJECTION_COLUMNS))
+                )
+            )
+            yield NWBSurgery(
+                subject=key["subject"],
+                implantations=_to_dynamic_table(
+                    subject_implantations,
+                    "implantations",
+                    "Implanted devices and their stereotaxic coordinates",
+                    _IMPLANTATION_COLUMNS,
+                ),
+                injections=None
+                if subject_injections is None
+                else _to_dynamic_table(
+                    subject_injections,
+                    "injections",
+                    "Virus injections",
+                    _INJECTION_COLUMNS,
+                ),
+                surgery=_describe_surgery(subject_implantations),
+                virus=""
+                if subject_injections is None
+                else _describe_virus(subject_injections),
+            )
+
+
+@operation("surgery_to_nwb")
+def surgery_to_nwb(session_key: dict, *, lookups=None) -> NWBSurgery:
+    """Surgery and injection metadata of one subject.
+
+    Args:
+        session_key (dict): Key specifying one entry in
+            element_animal.subject.Subject.
+        lookups (SurgeryLookups, optional): Lookup rows to reuse across files.
+
+    Returns:
+        NWBSurgery: Tables and descriptions to add to the subject's NWB file.
+    """
+    for record in surgeries_to_nwb(session_key, lookups=lookups):
+        return record
+    raise dj.DataJointError(f"No subject matches {session_key}")
@@ -0,0 +1,599 @@
+"""Columnar snapshots of the element-animal schemas in Parquet.
+
+`export_snapshot` writes every table of the activated element-animal modules,
+parts included, to a directory of Parquet files with an Arrow schema derived
+from the table headings, together with denormalized views of subjects,
+implantations and injections. Rows are read in primary-key order, one chunk
+per query. Later runs compare server-side hashes of every row with those of
+the previous snapshot and write only the rows inserted, changed or deleted
+since. Each later run still transfers the primary key and hash of every row,
+which is much less than the rows themselves but grows with the tables:
+
+    >>> from element_animal.export import export_snapshot, read_snapshot
+    >>> export_snapshot("/data/colony")  # everything the first time
+    >>> export_snapshot("/data/colony")  # changed rows only
+    >>> subjects = read_snapshot("/data/colony", "subject.Subject").to_pandas()
+    >>> wide = read_snapshot("/data/colony", "subject").to_pandas()
+
+The snapshot directory holds:
+
+    manifest.json                                   snapshots, tables and views
+    tables/<table>/snapshot=<n>/part-<i>.parquet    rows written by snapshot n
+    deleted/<table>/snapshot=<n>/part-<i>.parquet   keys deleted by snapshot n
+    hashes/<table>/snapshot=<n>.parquet             key and hash of every row
+    views/<view>/snapshot=<n>/part-<i>.parquet      the view, in full
+
+so that `tables/<table>` can also be opened directly as a hive-partitioned
+dataset. Blob, attachment and filepath attributes are not exported.
+"""
+
+import json
+import os
+import re
+import shutil
+import uuid
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import datajoint as dj
+import pandas as pd
+
+from ..instrumentation import operation
+from ..utils import element_tables
+
+MANIFEST = "manifest.json"
+
+_INTEGER_BITS = {"tinyint": 8, "smallint": 16, "mediumint": 32, "int": 32, "bigint": 64}
+_STRING_TYPES = {
+    "char",
+    "varchar",
+    "tinytext",
+    "text",
+    "mediumtext",
+    "longtext",
+    "enum",
+    "set",
+    "expression",
+}
+_SQL_TYPE = re.compile(r"(\w+)\s*(?:\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\))?")
+
+
+# -------- schema
+
+
+def _arrow_type(attribute):
+    """Arrow type of a heading attribute."""
+    import pyarrow as pa
+
+    if attribute.uuid or attribute.json:
+        return pa.string()
+    sql_type = attribute.type.lower()
+    base, precision, scale = _SQL_TYPE.match(sql_type).groups()
+    if base in _INTEGER_BITS:
+        bits = _INTEGER_BITS[base]
+        return getattr(pa, f"uint{bits}" if "unsigned" in sql_type else f"int{bits}")()
+    if base == "float":
+        return pa.float32()
+    if base in ("double", "real"):
+        return pa.float64()
+    if base in ("decimal", "numeric"):
+        return pa.decimal128(int(precision or 10), int(scale or 0))
+    if base == "date":
+        return pa.date32()
+    if base in ("datetime", "timestamp"):
+        return pa.timestamp("us")
+    if base == "time":
+        return pa.duration("us")
+    if base in _STRING_TYPES:
+        return pa.string()
+    if base in ("binary", "varbinary"):
+        return pa.binary()
+    raise dj.DataJointError(
+        f"Attribute `{attribute.name}` of type {attribute.type} has no Arrow type"
+    )
+
+
+def _exported_attributes(query) -> list:
+    """Attributes of `query` stored in the snapshot."""
+    return [
+        attribute
+        for attribute in query.heading.attributes.values()
+        if not (attribute.is_blob or attribute.is_attachment or attribute.is_filepath)
+    ]
+
+
+def arrow_schema(query):
+    """Arrow schema of the exported attributes of a table or query.
+
+    Args:
+        query (QueryExpression): e.g. `subject.Subject` or a join.
+
+    Returns:
+        pyarrow.Schema: One field per attribute, primary key first. Only
+            primary-key fields are non-nullable, as secondary attributes may
+            be null in outer joins. Computed attributes are strings; uuid and
+            json attributes are stored as text.
+    """
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            pa.field(
+                attribute.name, _arrow_type(attribute), nullable=not attribute.in_key
+            )
+            for attribute in _exported_attributes(query)
+        ]
+    )
+
+
+def _to_arrow(rows: list, schema):
+    """Arrow table of fetched rows, with uuid and json values as text."""
+    import pyarrow as pa
+
+    converted = [name for name in schema.names if rows and not _arrow_ready(rows, name)]
+    for row in rows if converted else ():
+        for name in converted:
+            value = row[name]
+            if isinstance(value, uuid.UUID):
+                row[name] = str(value)
+            elif value is not None and not isinstance(value, str):
+                row[name] = json.dumps(value, default=str)
+    return pa.Table.from_pylist(rows, schema=schema)
+
+
+def _arrow_ready(rows: list, name: str) -> bool:
+    value = next((row[name] for row in rows if row[name] is not None), None)
+    return not isinstance(value, (uuid.UUID, dict, list))
+
+
+# -------- chunked reads
+
+
+def _sql_literal(value) -> str:
+    """SQL literal of a primary-key value."""
+    if isinstance(value, uuid.UUID):
+        return f"X'{value.hex}'"
+    if isinstance(value, datetime):
+        return f"'{value.isoformat(sep=' ')}'"
+    if isinstance(value, date):
+        return f"'{value.isoformat()}'"
+    if isinstance(value, str):
+        escaped = value.replace("\\", "\\\\").replace("'", "''")
+        return f"'{escaped}'"
+    return repr(value.item() if hasattr(value, "item") else value)
+
+
+def _after(primary_key: list, row: dict) -> str:
+    """Restriction to the rows following `row` in primary-key order."""
+    columns = ", ".join(f"`{name}`" for name in primary_key)
+    values = ", ".join(_sql_literal(row[name]) for name in primary_key)
+    return f"({columns}) > ({values})"
+
+
+def _iter_chunks(query, attributes: list, chunk_size: int):
+    """Yield lists of row dicts of `query` in primary-key order.
+
+    Each chunk is one query that resumes after the last key of the previous
+    chunk, so the cost of a chunk does not grow with its position.
+    """
+    primary_key = query.primary_key
+    last = None
+    while True:
+        chunk = query if last is None else query & _after(primary_key, last)
+        rows = chunk.fetch(
+            *attributes, as_dict=True, order_by=primary_key, limit=chunk_size
+        )
+        if not rows:
+            return
+        last = {name: rows[-1][name] for name in primary_key}
+        yield rows
+        if len(rows) < chunk_size:
+            return
+
+
+def _row_hash(attributes: list) -> str:
+    """SQL expression of the MD5 hash of the values of `attributes`.
+
+    Values are length-prefixed so that no two different rows give the same
+    string to hash.
+    """
+    if not attributes:
+        return "MD5('')"
+    values = []
+    for attribute in attributes:
+        value = f"CAST(`{attribute.name}` AS CHAR)"
+        values.append(f"COALESCE(CONCAT(CHAR_LENGTH({value}), ':', {value}), 'NULL')")
+    return f"MD5(CONCAT_WS(',', {', '.join(values)}))"
+
+
+# -------- files
+
+
+def _read_manifest(root: Path) -> dict:
+    path = root / MANIFEST
+    if not path.exists():
+        return {"snapshots": [], "tables": {}, "views": {}}
+    return json.loads(path.read_text())
+
+
+def _write_manifest(root: Path, manifest: dict):
+    """Atomically replace the manifest, which commits a snapshot."""
+    path = root / MANIFEST
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(manifest, indent=2))
+    os.replace(temporary, path)
+
+
+def _partition(root: Path, kind: str, name: str, snapshot: int) -> Path:
+    """Empty directory of one table or view in one snapshot."""
+    path = root / kind / name / f"snapshot={snapshot}"
+    if path.exists():  # left behind by an interrupted run
+        shutil.rmtree(path)
+    path.mkdir(parents=True)
+    return path
+
+
+def _write_chunks(chunks, schema, path: Path) -> int:
+    """Write each chunk of rows to its own Parquet file in `path`."""
+    import pyarrow.parquet as pq
+
+    rows = index = 0
+    for index, chunk in enumerate(chunks):
+        pq.write_table(_to_arrow(chunk, schema), path / f"part-{index:05d}.parquet")
+        rows += len(chunk)
+    if not rows:  # keep the schema of empty tables
+        pq.write_table(schema.empty_table(), path / f"part-{index:05d}.parquet")
+    return rows
+
+
+def _read_parts(path: Path, columns=None):
+    """Parquet files of one partition, memory-mapped, or None if there are none."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parts = sorted(path.glob("part-*.parquet"))
+    if not parts:
+        return None
+    return pa.concat_tables(
+        pq.read_table(part, columns=columns, memory_map=True) for part in parts
+    )
+
+
+# -------- export
+
+
+def _subject_view():
+    """Subjects with their one-to-one parts and a comma-separated list of labs."""
+    from .. import subject
+    from ..census import _lab_attribute
+
+    lab = _lab_attribute()
+    subjects = subject.Subject.aggr(
+        subject.Subject.Lab,
+        labs=f"GROUP_CONCAT({lab} ORDER BY {lab} SEPARATOR ',')",
+        keep_all_rows=True,
+    )
+    for part in (
+        subject.Subject.Species,
+        subject.Subject.Line,
+        subject.Subject.Strain,
+        subject.Subject.Source,
+    ):
+        subjects = subjects.join(part, left=True)
+    return subjects
+
+
+def _implantation_view():
+    """Implantations with their coordinates and target region name."""
+    from .. import surgery
+
+    regions = surgery.BrainRegion.proj(
+        target_region="region_acronym", target_region_name="region_name"
+    )
+    return surgery.Implantation.join(surgery.Implantation.Coordinate, left=True).join(
+        regions, left=True
+    )
+
+
+def _injection_view():
+    """Injections with their protocol, virus and dose."""
+    from .. import injection
+
+    return (
+        injection.Injection * injection.InjectionProtocol * injection.VirusName
+    ).join(injection.InjectionDose, left=True)
+
+
+# view name: (module whose activation it requires, query builder)
+VIEWS = {
+    "subject": ("subject", _subject_view),
+    "implantation": ("surgery", _implantation_view),
+    "injection": ("injection", _injection_view),
+}
+
+
+def _export_table(root, name, table, snapshot, previous, chunk_size) -> dict:
+    """Export the rows of one table that differ from the `previous` hashes."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(table)
+    primary_key = table.primary_key
+    key_schema = pa.schema([schema.field(name) for name in primary_key])
+    hash_schema = key_schema.append(pa.field("row_hash", pa.string()))
+    secondary = [a for a in _exported_attributes(table) if not a.in_key]
+    query = table.proj(*[a.name for a in secondary], row_hash=_row_hash(secondary))
+    partition = _partition(root, "tables", name, snapshot)
+
+    if previous is None:
+        hashes = []
+
+        def chunks():
+            for chunk in _iter_chunks(query, schema.names + ["row_hash"], chunk_size):
+                yield chunk
+                hashes.extend({k: row[k] for k in hash_schema.names} for row in chunk)
+
+        rows = _write_chunks(chunks(), schema, partition)
+        current = _to_arrow(hashes, hash_schema).to_pandas()
+        deleted = current.iloc[:0][primary_key]
+    else:
+        current = _to_arrow(
+            [
+                row
+                for chunk in _iter_chunks(query, hash_schema.names, chunk_size)
+                for row in chunk
+            ],
+            hash_schema,
+        ).to_pandas()
+        merged = current.merge(
+            previous,
+            on=primary_key,
+            how="outer",
+            suffixes=("", "_previous"),
+            indicator=True,
+        )
+        is_changed = (merged["_merge"] == "left_only") | (
+            (merged["_merge"] == "both")
+            & (merged["row_hash"] != merged["row_hash_previous"])
+        )
+        keys = merged.loc[is_changed, primary_key].to_dict("records")
+        deleted = merged.loc[merged["_merge"] == "right_only", primary_key]
+        rows = _write_chunks(
+            (
+                (table & keys[start : start + chunk_size]).fetch(
+                    *schema.names, as_dict=True, order_by=primary_key
+                )
+                for start in range(0, len(keys), chunk_size)
+            ),
+            schema,
+            partition,
+        )
+
+    pq.write_table(
+        pa.Table.from_pandas(deleted, schema=key_schema, preserve_index=False),
+        _partition(root, "deleted", name, snapshot) / "part-00000.parquet",
+    )
+    hash_path = root / "hashes" / name / f"snapshot={snapshot}.parquet"
+    hash_path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(
+        pa.Table.from_pandas(current, schema=hash_schema, preserve_index=False),
+        hash_path,
+    )
+    return {"rows": rows, "deleted": len(deleted)}
+
+
+def _previous_hashes(root: Path, table: dict, columns: list):
+    """Row hashes of the latest snapshot of a table, None to export it in full."""
+    import pyarrow.parquet as pq
+
+    if table is None or table["columns"] != columns:
+        return None
+    path = root / "hashes" / table["name"] / f"snapshot={table['snapshot']}.parquet"
+    return pq.read_table(path).to_pandas()
+
+
+def _snapshot_number(path: Path) -> int:
+    return int(path.name.split("=", 1)[1].split(".", 1)[0])
+
+
+def _table_snapshots(manifest: dict, name: str) -> list:
+    """Snapshots holding the current rows of a table, oldest first."""
+    since = manifest["tables"][name]["since"]
+    return [
+        entry["snapshot"]
+        for entry in manifest["snapshots"]
+        if name in entry["tables"] and entry["snapshot"] >= since
+    ]
+
+
+def _remove_superseded(root: Path, manifest: dict):
+    """Delete the files that the current snapshot does not need."""
+    for name, table in manifest["tables"].items():
+        current = set(_table_snapshots(manifest, name))
+        for kind in ("tables", "deleted"):
+            for path in (root / kind / name).glob("snapshot=*"):
+                if _snapshot_number(path) not in current:
+                    shutil.rmtree(path)
+        for path in (root / "hashes" / name).glob("snapshot=*.parquet"):
+            if _snapshot_number(path) != table["snapshot"]:
+                path.unlink()
+    for name, view in manifest["views"].items():
+        for path in (root / "views" / name).glob("snapshot=*"):
+            if _snapshot_number(path) != view["snapshot"]:
+                shutil.rmtree(path)
+
+
+@operation("export_snapshot")
+def export_snapshot(
+    root,
+    *,
+    tables=None,
+    views: bool = True,
+    chunk_size: int = 10000,
+    full: bool = False,
+) -> dict:
+    """Export the element-animal tables to a Parquet snapshot directory.
+
+    All tables are read within one transaction, so the snapshot is consistent
+    across tables. A table is exported in full the first time, when its
+    columns change, or when `full` is set; otherwise only the rows whose hash
+    differs from the previous snapshot are written, and the keys of deleted
+    rows are recorded. Finding those rows transfers the primary key and the
+    hash of every row of the table. Views are rewritten in full.
+
+    Args:
+        root (str | Path): Snapshot directory, created if needed.
+        tables (list, optional): Labels of the tables to export, e.g.
+            "subject.Subject.Lab". Defaults to all tables of the activated
+            element-animal modules.
+        views (bool, optional): Also write the views of `VIEWS` whose module
+            is activated. Defaults to True.
+        chunk_size (int, optional): Rows per query and per Parquet file.
+            Defaults to 10000.
+        full (bool, optional): Export every row even if a previous snapshot
+            exists. Defaults to False.
+
+    Returns:
+        dict: The manifest entry of the new snapshot, with the rows written
+            and deleted per table and the rows of each view.
+
+    Raises:
+        dj.DataJointError: If a table of `tables` is not activated.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = _read_manifest(root)
+    snapshot = len(manifest["snapshots"])
+    activated = element_tables()
+    selected = activated if tables is None else {}
+    for name in tables or ():
+        if name not in activated:
+            raise dj.DataJointError(f"Table {name} is not activated")
+        selected[name] = activated[name]
+    modules = {name.split(".", 1)[0] for name in activated}
+    selected_views = {
+        name: build
+        for name, (module, build) in VIEWS.items()
+        if views and module in modules
+    }
+
+    entry = {
+        "snapshot": snapshot,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "tables": {},
+        "views": {},
+    }
+    if not activated:
+        return entry
+    with next(iter(activated.values())).connection.transaction:
+        for name, table in selected.items():
+            columns = arrow_schema(table).names
+            previous_table = manifest["tables"].get(name)
+            previous = None if full else _previous_hashes(root, previous_table, columns)
+            entry["tables"][name] = _export_table(
+                root, name, table, snapshot, previous, chunk_size
+            )
+            manifest["tables"][name] = {
+                "name": name,
+                "full_table_name": table.full_table_name,
+                "primary_key": table.primary_key,
+                "columns": columns,
+                "since": snapshot if previous is None else previous_table["since"],
+                "snapshot": snapshot,
+            }
+        for name, build in selected_views.items():
+            query = build()
+            schema = arrow_schema(query)
+            entry["views"][name] = {
+                "rows": _write_chunks(
+                    _iter_chunks(query, schema.names, chunk_size),
+                    schema,
+                    _partition(root, "views", name, snapshot),
+                )
+            }
+            manifest["views"][name] = {
+                "primary_key": query.primary_key,
+                "columns": schema.names,
+                "snapshot": snapshot,
+            }
+    manifest["snapshots"].append(entry)
+    _write_manifest(root, manifest)
+    _remove_superseded(root, manifest)
+    return entry
+
+
+# -------- reading
+
+
+def read_snapshot(root, name: str, columns=None):
+    """Current rows of a table or view of a snapshot directory.
+
+    The Parquet files are memory-mapped. Rows written by later snapshots
+    replace earlier versions and deleted keys are dropped.
+
+    Args:
+        root (str | Path): Snapshot directory written by `export_snapshot`.
+        name (str): Table label, e.g. "subject.Subject.Lab", or view name,
+            e.g. "subject".
+        columns (list, optional): Columns to read. Defaults to all.
+
+    Returns:
+        pyarrow.Table: The rows.
+
+    Raises:
+        dj.DataJointError: If `name` is not in the snapshot.
+    """
+    import numpy as np
+    import pyarrow as pa
+
+    root = Path(root)
+    manifest = _read_manifest(root)
+    if name in manifest["views"]:
+        snapshot = manifest["views"][name]["snapshot"]
+        return _read_parts(root / "views" / name / f"snapshot={snapshot}", columns)
+    if name not in manifest["tables"]:
+        raise dj.DataJointError(f"{name} is not in the snapshot at {root}")
+
+    primary_key = manifest["tables"][name]["primary_key"]
+    read_columns = (
+        None if columns is None else list(dict.fromkeys([*primary_key, *columns]))
+    )
+    written, deleted = [], []
+    for snapshot in _table_snapshots(manifest, name):
+        written.append(
+            (
+                snapshot,
+                _read_parts(
+                    root / "tables" / name / f"snapshot={snapshot}", read_columns
+                ),
+            )
+        )
+        keys = _read_parts(root / "deleted" / name / f"snapshot={snapshot}")
+        if keys.num_rows:
+            deleted.append((snapshot, keys))
+    rows = pa.concat_tables(table for _, table in written)
+
+    if len(written) > 1 or deleted:
+        numbers = np.repeat(
+            [snapshot for snapshot, _ in written],
+            [table.num_rows for _, table in written],
+        )
+        events = pd.concat(
+            [
+                rows.select(primary_key)
+                .to_pandas()
+                .assign(_snapshot=numbers, _row=np.arange(rows.num_rows))
+            ]
+            + [
+                keys.to_pandas().assign(_snapshot=snapshot, _row=-1)
+                for snapshot, keys in deleted
+            ],
+            ignore_index=True,
+        )
+        latest = (
+            events.sort_values("_snapshot", kind="stable")
+            .drop_duplicates(primary_key, keep="last")["_row"]
+            .to_numpy()
+        )
+        rows = rows.take(np.sort(latest[latest >= 0]))
+    return rows if columns is None else rows.select(list(columns))
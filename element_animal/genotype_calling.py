@@ -0,0 +1,172 @@
+"""Batch genotype calling from `genotyping.GenotypeTest` results.
+
+The results of a batch of PCR tests, e.g. one plate or a range of test
+identifiers, are mapped to alleles through `genotyping.AlleleSequence` and
+called in one pass:
+
+    >>> from element_animal.genotype_calling import call_zygosity
+    >>> calls = call_zygosity('genotype_test_id LIKE "plate-0412%"')
+    >>> calls.unresolved  # left for manual review, not inserted
+
+For each (subject, allele) the tests of each sequence of the allele are pooled:
+
+- "Present" when every sequence of the allele tested Present,
+- "Absent" when every sequence of the allele tested Absent,
+
+otherwise the pair is unresolved with one of the reasons in `REASONS`.
+"""
+
+from dataclasses import dataclass
+
+import datajoint as dj
+import numpy as np
+import pandas as pd
+
+from . import genotyping, subject
+from .utils import insert_in_batches
+
+REASONS = {
+    "repeated_tests": "repeated tests of a sequence disagree",
+    "mixed_sequences": "sequences of the allele disagree",
+    "missing_sequences": "not all sequences of the allele were tested",
+    "recorded": "differs from the recorded zygosity",
+}
+
+
+@dataclass
+class GenotypeCalls:
+    """Outcome of a genotype calling batch.
+
+    Attributes:
+        calls (pd.DataFrame): Called zygosity, with columns `subject`, `allele`
+            and `zygosity`.
+        unresolved (pd.DataFrame): (subject, allele) pairs that were not called,
+            with columns `subject`, `allele` and `reason`, a key of `REASONS`.
+        inserted (int): Number of calls submitted to `subject.Zygosity`.
+    """
+
+    calls: pd.DataFrame
+    unresolved: pd.DataFrame
+    inserted: int = 0
+
+
+def _pool_tests(tests: pd.DataFrame) -> pd.DataFrame:
+    """One result per (subject, sequence), "Conflict" when repeated tests disagree."""
+    present = tests["test_result"].eq("Present")
+    pooled = (
+        tests.assign(present=present, absent=~present)
+        .groupby(["subject", "sequence"], sort=False)[["present", "absent"]]
+        .any()
+        .reset_index()
+    )
+    pooled["result"] = np.select(
+        [pooled["present"] & pooled["absent"], pooled["present"]],
+        ["Conflict", "Present"],
+        "Absent",
+    )
+    return pooled[["subject", "sequence", "result"]]
+
+
+def _call(pooled: pd.DataFrame, allele_sequences: pd.DataFrame) -> pd.DataFrame:
+    """Zygosity, or the reason it cannot be called, per (subject, allele)."""
+    n_required = allele_sequences.groupby("allele").size().rename("n_required")
+    results = pooled.merge(allele_sequences, on="sequence")
+    per_allele = (
+        results.assign(
+            n_present=results["result"].eq("Present"),
+            n_absent=results["result"].eq("Absent"),
+            n_conflict=results["result"].eq("Conflict"),
+        )
+        .groupby(["subject", "allele"], sort=False)[
+            ["n_present", "n_absent", "n_conflict"]
+        ]
+        .sum()
+        .join(n_required, on="allele")
+        .reset_index()
+    )
+    n_tested = per_allele[["n_present", "n_absent", "n_conflict"]].sum(axis=1)
+    per_allele["zygosity"] = np.select(
+        [
+            per_allele["n_present"].eq(per_allele["n_required"]),
+            per_allele["n_absent"].eq(per_allele["n_required"]),
+        ],
+        ["Present", "Absent"],
+        None,
+    )
+    per_allele["reason"] = np.select(
+        [
+            per_allele["n_conflict"] > 0,
+            (per_allele["n_present"] > 0) & (per_allele["n_absent"] > 0),
+            n_tested < per_allele["n_required"],
+        ],
+        ["repeated_tests", "mixed_sequences", "missing_sequences"],
+        None,
+    )
+    return per_allele[["subject", "allele", "zygosity", "reason"]]
+
+
+def call_zygosity(
+    restriction=None,
+    *,
+    insert: bool = True,
+    batch_size: int = 10000,
+) -> GenotypeCalls:
+    """Call the zygosity of every tested (subject, allele) in a batch of tests.
+
+    The batch is read with three queries regardless of its size: the test
+    results, the sequences of the alleles they cover, and the zygosity already
+    recorded for the tested subjects. Calls that differ from a recorded
+    zygosity are reported as unresolved rather than overwritten.
+
+    Args:
+        restriction (optional): Restriction on `genotyping.GenotypeTest`
+            selecting the batch, e.g. a list of `genotype_test_id` dicts or a
+            condition on `genotype_test_id`. Defaults to all tests.
+        insert (bool, optional): Whether to insert the calls into
+            `subject.Zygosity`, in one transaction. Defaults to True.
+        batch_size (int, optional): Maximum rows per INSERT statement.
+            Defaults to 10000.
+
+    Returns:
+        GenotypeCalls: Calls, unresolved pairs and the number of calls inserted.
+    """
+    tests = genotyping.GenotypeTest()
+    if restriction is not None:
+        tests &= restriction
+    test_results = pd.DataFrame(
+        tests.fetch("subject", "sequence", "test_result", as_dict=True),
+        columns=["subject", "sequence", "test_result"],
+    )
+    alleles = dj.U("allele") & (genotyping.AlleleSequence & tests)
+    allele_sequences = pd.DataFrame(
+        (genotyping.AlleleSequence & alleles).fetch("allele", "sequence", as_dict=True),
+        columns=["allele", "sequence"],
+    )
+    recorded = pd.DataFrame(
+        (subject.Zygosity & tests).fetch(as_dict=True),
+        columns=["subject", "allele", "zygosity"],
+    )
+
+    called = _call(_pool_tests(test_results), allele_sequences)
+    called = called.merge(
+        recorded, on=["subject", "allele"], how="left", suffixes=("", "_recorded")
+    )
+    differs = (
+        called["reason"].isna()
+        & called["zygosity_recorded"].notna()
+        & called["zygosity"].ne(called["zygosity_recorded"])
+    )
+    called.loc[differs, "reason"] = "recorded"
+
+    is_called = called["reason"].isna()
+    calls = called.loc[is_called, ["subject", "allele", "zygosity"]]
+    unresolved = called.loc[~is_called, ["subject", "allele", "reason"]]
+    result = GenotypeCalls(
+        calls.reset_index(drop=True), unresolved.reset_index(drop=True)
+    )
+    if insert and len(calls):
+        with subject.Zygosity.connection.transaction:
+            result.inserted = insert_in_batches(
+                subject.Zygosity, calls, batch_size=batch_size, skip_duplicates=True
+            )
+    return result
@@ -1,9 +1,7 @@
-import importlib
-import inspect
-
 import datajoint as dj
 
 from . import subject
+from .activation import activate_schema, resolve_linking_module
 
 schema = dj.schema()
 _linking_module = None
@@ -38,11 +36,9 @@ def activate(
         Protocol: The protocol applicable to a particular animal (e.g. IACUC, IRB).
         User: The user associated with a particular animal.
     """
-    if isinstance(linking_module, str):
-        linking_module = importlib.import_module(linking_module)
-    assert inspect.ismodule(
-        linking_module
-    ), "The argument 'linking_module' must be a module's name or a module"
+    linking_module = resolve_linking_module(
+        "genotyping", genotyping_schema_name, linking_module
+    )
 
     global _linking_module
     _linking_module = linking_module
@@ -53,7 +49,9 @@ def activate(
         create_tables=create_tables,
         linking_module=linking_module,
     )
-    schema.activate(
+    activate_schema(
+        "genotyping",
+        schema,
         genotyping_schema_name,
         create_schema=create_schema,
         create_tables=create_tables,
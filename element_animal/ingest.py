@@ -0,0 +1,326 @@
+"""Bulk ingestion of colony records into element-animal tables."""
+
+import json
+import os
+from pathlib import Path
+
+import datajoint as dj
+import numpy as np
+import pandas as pd
+
+from . import injection, subject, surgery
+from .utils import insert_in_batches, to_dataframe, validate_foreign_keys
+
+
+def _file_chunks(path: Path, file_format: str, chunk_size: int, skip_rows: int):
+    """Yield DataFrames of at most `chunk_size` rows, after the first `skip_rows`."""
+    if file_format == "csv":
+        yield from pd.read_csv(
+            path, chunksize=chunk_size, skiprows=range(1, skip_rows + 1)
+        )
+        return
+
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    row_groups, to_skip, offset = [], 0, 0
+    for index in range(parquet_file.num_row_groups):
+        num_rows = parquet_file.metadata.row_group(index).num_rows
+        if offset + num_rows > skip_rows:
+            if not row_groups:
+                to_skip = skip_rows - offset
+            row_groups.append(index)
+        offset += num_rows
+    if not row_groups:
+        return
+    for batch in parquet_file.iter_batches(
+        batch_size=chunk_size, row_groups=row_groups
+    ):
+        if to_skip >= batch.num_rows:
+            to_skip -= batch.num_rows
+            continue
+        yield to_dataframe(batch.slice(to_skip))
+        to_skip = 0
+
+
+def _read_checkpoint(checkpoint_path: Path, fingerprint: dict) -> int:
+    """Rows already imported according to the checkpoint, 0 if it is stale."""
+    if not checkpoint_path.exists():
+        return 0
+    checkpoint = json.loads(checkpoint_path.read_text())
+    if checkpoint.get("fingerprint") != fingerprint:
+        return 0
+    return checkpoint["rows_done"]
+
+
+def _write_checkpoint(checkpoint_path: Path, fingerprint: dict, rows_done: int):
+    """Atomically record the number of imported rows."""
+    temp_path = checkpoint_path.with_name(checkpoint_path.name + ".tmp")
+    temp_path.write_text(
+        json.dumps({"fingerprint": fingerprint, "rows_done": rows_done})
+    )
+    os.replace(temp_path, checkpoint_path)
+
+
+def import_colony_file(
+    path,
+    table,
+    *,
+    column_map: dict = None,
+    chunk_size: int = 50000,
+    batch_size: int = 10000,
+    checkpoint_path=None,
+    file_format: str = None,
+) -> int:
+    """Stream a CSV or Parquet colony export into a table in fixed-size chunks.
+
+    Only one chunk is held in memory at a time. Each chunk is inserted with
+    `skip_duplicates=True` and the number of rows done is then recorded in a
+    checkpoint file, so an interrupted import resumes after the last completed
+    chunk. The checkpoint is ignored when the file's size or modification time
+    changed since it was written.
+
+    Rows for `subject.Subject` go through `Subject.insert_bulk`, so columns for
+    its part tables (e.g. `species`, `line`, `lab`) are imported as well.
+
+    Args:
+        path (str | Path): CSV or Parquet file.
+        table (dj.Table): Destination table, e.g. `subject.Subject`,
+            `subject.Zygosity`, `genotyping.SubjectCaging` or
+            `genotyping.GenotypeTest`.
+        column_map (dict, optional): Maps file column names to table attribute
+            names. Unmapped columns are used as is; columns that match no
+            attribute are ignored.
+        chunk_size (int, optional): Rows read from the file at a time.
+            Defaults to 50000.
+        batch_size (int, optional): Maximum rows per INSERT statement.
+            Defaults to 10000.
+        checkpoint_path (str | Path, optional): Checkpoint file. Defaults to the
+            input path with a `.checkpoint.json` suffix appended.
+        file_format (str, optional): "csv" or "parquet". Defaults to the file
+            extension.
+
+    Returns:
+        int: Number of rows read from the file during this call.
+    """
+    path = Path(path)
+    file_format = file_format or (
+        "parquet" if path.suffix.lower() in (".parquet", ".pq") else "csv"
+    )
+    assert file_format in ("csv", "parquet"), "file_format must be csv or parquet"
+    checkpoint_path = Path(checkpoint_path or f"{path}.checkpoint.json")
+    stat = path.stat()
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    is_subject = table is subject.Subject or isinstance(table, subject.Subject)
+    rows_done = _read_checkpoint(checkpoint_path, fingerprint)
+    rows_read = 0
+    for chunk in _file_chunks(path, file_format, chunk_size, rows_done):
+        if chunk.empty:
+            continue
+        chunk = chunk.rename(columns=column_map or {})
+        if is_subject:
+            subject.Subject.insert_bulk(
+                chunk, batch_size=batch_size, skip_duplicates=True
+            )
+        else:
+            insert_in_batches(
+                table,
+                chunk[[c for c in table.heading.names if c in chunk]],
+                batch_size=batch_size,
+                skip_duplicates=True,
+            )
+        rows_read += len(chunk)
+        _write_checkpoint(checkpoint_path, fingerprint, rows_done + rows_read)
+    return rows_read
+
+
+# coordinate column: inclusive range of valid values, in degrees
+_ANGLE_RANGES = {"theta": (0, 180), "phi": (0, 360), "beta": (-180, 180)}
+
+
+def _required_columns(table) -> list:
+    return [
+        name
+        for name, attr in table.heading.attributes.items()
+        if attr.default is None and not attr.nullable
+    ]
+
+
+def _check_required(table, frame: pd.DataFrame):
+    """Raise if `frame` lacks a value that `table` requires or has a bad number.
+
+    Values of numeric attributes must be finite numbers where they are set.
+    """
+    required = _required_columns(table)
+    missing = [name for name in required if name not in frame]
+    if missing:
+        raise dj.DataJointError(
+            f"Columns {missing} are required for {table.full_table_name}"
+        )
+    is_null = frame[required].isna().any(axis=1)
+    if is_null.any():
+        raise dj.DataJointError(
+            f"{is_null.sum()} row(s) lack a value required for "
+            f"{table.full_table_name}: rows {frame.index[is_null][:20].tolist()}"
+        )
+    numeric = [
+        name
+        for name, attr in table.heading.attributes.items()
+        if attr.numeric and name in frame
+    ]
+    values = frame[numeric].apply(pd.to_numeric, errors="coerce")
+    is_bad = (frame[numeric].notna() & ~np.isfinite(values.astype(float))).any(axis=1)
+    if is_bad.any():
+        raise dj.DataJointError(
+            f"{is_bad.sum()} row(s) have a value of {numeric} that is not a finite "
+            f"number: rows {frame.index[is_bad][:20].tolist()}"
+        )
+
+
+def _check_angles(frame: pd.DataFrame):
+    """Raise if a coordinate angle of `frame` is out of its range."""
+    errors = []
+    for name, (low, high) in _ANGLE_RANGES.items():
+        if name not in frame:
+            continue
+        values = frame[name].astype(float)
+        is_bad = values.notna() & ~values.between(low, high)
+        if is_bad.any():
+            errors.append(
+                f"{name} outside [{low}, {high}] in {is_bad.sum()} row(s): "
+                f"rows {frame.index[is_bad][:20].tolist()}"
+            )
+    if errors:
+        raise dj.DataJointError("Invalid coordinates: " + "; ".join(errors))
+
+
+def _missing_lookups(table, frame: pd.DataFrame) -> pd.DataFrame:
+    """Rows of `frame` whose primary key is not yet in `table`, one per key."""
+    (name,) = table.primary_key
+    frame = frame.drop_duplicates(name)
+    existing = (table & frame[[name]].to_dict("records")).fetch(name)
+    return frame[~frame[name].isin(existing)]
+
+
+def _unique_rows(table, frame: pd.DataFrame) -> pd.DataFrame:
+    """Rows of `frame` without repeats, checking that each key has one value.
+
+    Raises:
+        dj.DataJointError: If rows with the same primary key differ, listing
+            the conflicting keys.
+    """
+    frame = frame.drop_duplicates()
+    is_conflicting = frame.duplicated(table.primary_key, keep=False)
+    if is_conflicting.any():
+        keys = frame.loc[is_conflicting, table.primary_key].drop_duplicates()
+        raise dj.DataJointError(
+            f"Conflicting values in {is_conflicting.sum()} rows of "
+            f"{table.full_table_name} for {len(keys)} key(s): rows "
+            f"{frame.index[is_conflicting][:20].tolist()}, keys "
+            f"{keys.head(20).to_dict('records')}"
+        )
+    return frame
+
+
+def import_surgeries(
+    data, *, batch_size: int = 10000, skip_duplicates: bool = False
+) -> dict:
+    """Insert a batch of implantations, coordinates and injections at once.
+
+    Each row is one implantation site: the attributes of
+    `surgery.Implantation`, optionally the attributes of its `Coordinate` part
+    (`ap`, `ap_ref`, `ml`, ..., `beta`) and of an `injection.Injection` at the
+    site (`virus_name`, `protocol_id`, `titer`, `total_volume`,
+    `injection_comment`). Several rows may describe the same implantation, one
+    per injection, and must then agree on its attributes and coordinates. Rows
+    may cover any number of subjects and surgery days.
+
+    Target regions missing from `surgery.BrainRegion` are created, named by the
+    optional `region_name` column or else by their acronym, and viruses missing
+    from `injection.VirusName` are created with the optional `virus_serotype`
+    column. Required values, numbers (coordinates, volumes, ...), which must be
+    finite where set, coordinate angles (theta in [0, 180], phi in [0, 360],
+    beta in [-180, 180]) and foreign keys, such as coordinate references,
+    subjects and injection protocols, are checked in memory before anything is
+    written. Everything is then inserted in one transaction as multi-row
+    inserts of `batch_size` rows, so either the whole batch is ingested or
+    nothing is.
+
+    Args:
+        data (pd.DataFrame | pyarrow.Table | list): One row per implantation
+            site and injection.
+        batch_size (int, optional): Maximum rows per INSERT statement.
+            Defaults to 10000.
+        skip_duplicates (bool, optional): If True, silently skip implantations,
+            coordinates and injections that already exist. Defaults to False.
+
+    Returns:
+        dict: Number of rows submitted per table class name.
+
+    Raises:
+        dj.DataJointError: If a row is invalid; nothing is inserted then.
+    """
+    frame = to_dataframe(data).reset_index(drop=True)
+    implantation = surgery.Implantation()
+    _check_required(implantation, frame)
+
+    regions = frame[["target_region"]].rename(
+        columns={"target_region": "region_acronym"}
+    )
+    regions["region_name"] = (
+        frame["region_name"].fillna(frame["target_region"])
+        if "region_name" in frame
+        else frame["target_region"]
+    )
+    lookups = [(surgery.BrainRegion(), _missing_lookups(surgery.BrainRegion, regions))]
+    inserts = []
+
+    implantations = frame[[c for c in implantation.heading.names if c in frame]]
+    inserts.append((implantation, _unique_rows(implantation, implantations)))
+
+    coordinate = surgery.Implantation.Coordinate()
+    coordinate_names = [
+        c for c in coordinate.heading.secondary_attributes if c in frame
+    ]
+    if coordinate_names:
+        coordinates = frame[[c for c in coordinate.heading.names if c in frame]]
+        coordinates = coordinates[frame[coordinate_names].notna().any(axis=1)]
+        _check_required(coordinate, coordinates)
+        _check_angles(coordinates)
+        inserts.append((coordinate, _unique_rows(coordinate, coordinates)))
+
+    if "virus_name" in frame:
+        injections = frame[frame["virus_name"].notna()]
+        viruses = injections[["virus_name"]].assign(
+            virus_serotype=injections["virus_serotype"]
+            if "virus_serotype" in injections
+            else None
+        )
+        lookups.append(
+            (injection.VirusName(), _missing_lookups(injection.VirusName, viruses))
+        )
+        injection_table = injection.Injection()
+        injections = injections[
+            [c for c in injection_table.heading.names if c in injections]
+        ]
+        _check_required(injection_table, injections)
+        inserts.append((injection_table, _unique_rows(injection_table, injections)))
+
+    created = tuple(table.full_table_name for table, _ in lookups + inserts)
+    for table, rows in lookups + inserts:
+        validate_foreign_keys(table, rows, exclude=created)
+
+    with implantation.connection.transaction:
+        # skip lookups created by another client since they were resolved
+        counts = {
+            table.__class__.__name__: insert_in_batches(
+                table, rows, batch_size=batch_size, skip_duplicates=True
+            )
+            for table, rows in lookups
+        }
+        for table, rows in inserts:
+            counts[table.__class__.__name__] = insert_in_batches(
+                table, rows, batch_size=batch_size, skip_duplicates=skip_duplicates
+            )
+        return counts
@@ -1,9 +1,12 @@
-import importlib
-import inspect
+import re
 
 import datajoint as dj
+import numpy as np
+import pandas as pd
 
 from . import surgery
+from .activation import activate_schema, resolve_linking_module
+from .utils import insert_in_batches
 
 schema = dj.Schema()
 _linking_module = None
@@ -35,11 +38,9 @@ def activate(
         Device: table from `element-lab`.
     """
 
-    if isinstance(linking_module, str):
-        linking_module = importlib.import_module(linking_module)
-    assert inspect.ismodule(
-        linking_module
-    ), "The argument 'linking_module' must be a module's name or a module"
+    linking_module = resolve_linking_module(
+        "injection", injection_schema_name, linking_module
+    )
 
     global _linking_module
     _linking_module = linking_module
@@ -50,7 +51,9 @@ def activate(
         create_tables=create_tables,
         linking_module=_linking_module,
     )
-    schema.activate(
+    activate_schema(
+        "injection",
+        schema,
         injection_schema_name,
         create_schema=create_schema,
         create_tables=create_tables,
@@ -151,3 +154,155 @@ class Injection(dj.Manual):
     total_volume    : float
     injection_comment=''  : varchar(1024)
     """
+
+
+_TITER = re.compile(
+    r"^\s*(?P<mantissa>\d+(?:\.\d*)?|\.\d+)\s*"
+    r"(?:[eE](?P<exponent>[+-]?\d+)|[xX×*]\s*10\s*(?:\^|\*\*)?\s*(?P<power>[+-]?\d+))?"
+    r"\s*(?:(?:gc|vg|gp|genome copies|viral genomes)?\s*/\s*(?P<per>ml|ul|µl|μl))?"
+    r"\s*$",
+    re.IGNORECASE,
+)
+
+_VOLUME_UNITS = {"nl": 1e-6, "ul": 1e-3, "µl": 1e-3, "ml": 1.0}
+
+
+def parse_titer(titers) -> np.ndarray:
+    """Parse titer strings into genome copies per ml.
+
+    Accepts forms such as "1.2e13", "1.2 x 10^13", "2e12 GC/ml" and
+    "5e9 vg/ul". Titers without a unit are taken as per ml.
+
+    Args:
+        titers (array-like): Titer strings.
+
+    Returns:
+        np.ndarray: Genome copies per ml, NaN where a titer cannot be parsed.
+    """
+    parts = pd.Series(titers, dtype=object).astype(str).str.extract(_TITER)
+    exponent = parts["exponent"].fillna(parts["power"]).fillna(0).astype(float)
+    per_ul = parts["per"].str.lower().isin(["ul", "µl", "μl"])
+    return (
+        parts["mantissa"].astype(float) * 10.0**exponent * np.where(per_ul, 1e3, 1.0)
+    ).to_numpy()
+
+
+def _volume_to_ml() -> float:
+    """Factor from the configured injection volume unit to ml."""
+    unit = dj.config.get("custom", {}).get("injection_volume_unit", "nl")
+    assert (
+        unit in _VOLUME_UNITS
+    ), f"injection_volume_unit must be one of {list(_VOLUME_UNITS)}"
+    return _VOLUME_UNITS[unit]
+
+
+def _doses(injections: pd.DataFrame) -> pd.DataFrame:
+    """Dose, pulse count and duration of injections joined with their protocol."""
+    volume = injections["total_volume"].to_numpy(dtype=np.float64)
+    per_pulse = injections["volume_per_pulse"].to_numpy(dtype=np.float64)
+    rate = injections["injection_rate"].to_numpy(dtype=np.float64)
+    delay = injections["interpulse_delay"].to_numpy(dtype=np.float64)
+    titer = parse_titer(injections["titer"])
+    volume_ml = volume * _volume_to_ml()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n_pulses = np.where(per_pulse > 0, np.ceil(volume / per_pulse), np.nan)
+        duration = np.where(rate > 0, volume / rate, np.nan) + np.nan_to_num(
+            np.maximum(n_pulses - 1, 0) * delay
+        )
+    doses = injections[Injection.primary_key].assign(
+        titer_gc_per_ml=titer,
+        volume_ml=volume_ml,
+        dose_gc=titer * volume_ml,
+        n_pulses=n_pulses,
+        duration=duration,
+    )
+    return doses.astype(object).where(doses.notna(), None)
+
+
+@schema
+class InjectionDose(dj.Computed):
+    """Dose delivered by each injection, derived from its titer and protocol.
+
+    Volumes of `Injection` and `InjectionProtocol` are in the unit set by
+    `dj.config["custom"]["injection_volume_unit"]` ("nl" by default, or "ul" or
+    "ml"); injection rates are in that unit per second.
+
+    Attributes:
+        Injection (foreign key): Injection primary key.
+        titer_gc_per_ml (double, nullable): Titer in genome copies per ml; null
+        if it could not be parsed.
+        volume_ml (double): Total volume injected, in ml.
+        dose_gc (double, nullable): Genome copies delivered.
+        n_pulses (int, nullable): Number of pulses of the injection protocol.
+        duration (float, nullable): Injection duration in seconds, including
+        interpulse delays.
+    """
+
+    definition = """
+    -> Injection
+    ---
+    titer_gc_per_ml=null : double        # genome copies per ml
+    volume_ml            : double        # total volume injected (ml)
+    dose_gc=null         : double        # genome copies delivered
+    n_pulses=null        : int unsigned  # pulses of the injection protocol
+    duration=null        : float         # (s) including interpulse delays
+    """
+
+    def make(self, key):
+        """Compute the dose of one injection."""
+        injections = pd.DataFrame((Injection * InjectionProtocol & key).fetch())
+        self.insert(_doses(injections).to_dict("records"))
+
+
+def populate_doses(batch_size: int = 10000) -> int:
+    """Compute `InjectionDose` for all injections missing from it in bulk.
+
+    Unlike `InjectionDose.populate()`, which issues queries per injection, the
+    missing injections are fetched with one query and their doses are inserted
+    as multi-row inserts.
+
+    Args:
+        batch_size (int, optional): Maximum rows per INSERT statement.
+            Defaults to 10000.
+
+    Returns:
+        int: Number of injections computed.
+    """
+    injections = pd.DataFrame(((Injection - InjectionDose) * InjectionProtocol).fetch())
+    if injections.empty:
+        return 0
+    return insert_in_batches(
+        InjectionDose,
+        _doses(injections),
+        batch_size=batch_size,
+        allow_direct_insert=True,
+    )
+
+
+def dose_summary(by=("subject",), restriction=None) -> dj.expression.QueryExpression:
+    """Dosing aggregated in the database, one row per group.
+
+    Args:
+        by (tuple, optional): Grouping attributes of `InjectionDose` and
+            `VirusName`, e.g. ("subject",), ("virus_name",),
+            ("virus_serotype",) or ("subject", "target_region").
+            Defaults to subject.
+        restriction (optional): Restriction on the injections.
+
+    Returns:
+        QueryExpression: `n_injections`, `total_volume_ml`, `total_dose_gc`,
+            `max_dose_gc`, `total_pulses` and `total_duration` per group; fetch
+            it as usual.
+    """
+    doses = InjectionDose * VirusName
+    if restriction is not None:
+        doses &= restriction
+    return dj.U(*by).aggr(
+        doses,
+        n_injections="COUNT(*)",
+        total_volume_ml="SUM(volume_ml)",
+        total_dose_gc="SUM(dose_gc)",
+        max_dose_gc="MAX(dose_gc)",
+        total_pulses="SUM(n_pulses)",
+        total_duration="SUM(duration)",
+    )
@@ -0,0 +1,298 @@
+"""Opt-in instrumentation of the queries issued through a DataJoint connection.
+
+While enabled, every query of the connection is timed and attributed to the
+element-animal tables it references and to the innermost running operation,
+e.g. `subject_to_nwb`. Query counts per operation call reveal N+1 patterns:
+
+    >>> from element_animal import instrumentation
+    >>> from element_animal.export import subject_to_nwb
+    >>> stats = instrumentation.enable_instrumentation()
+    >>> for key in keys:
+    ...     subject_to_nwb(key)
+    >>> stats.summary()
+    >>> print(stats.prometheus())
+
+A query that joins several tables counts once for each of them, so per-table
+counts can add up to more than the total number of queries.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import datajoint as dj
+import pandas as pd
+
+from . import activation
+from .utils import element_tables
+
+_TABLE_NAME = re.compile(r"`([^`]+)`\.`([^`]+)`")
+_RETURNS_ROWS = ("select", "show", "describe", "explain")
+
+_default_instrumentation = None
+
+
+@dataclass
+class QueryStats:
+    """Accumulated queries of one table or operation.
+
+    Attributes:
+        queries (int): Number of queries.
+        seconds (float): Total wall-clock time of the queries.
+        max_seconds (float): Slowest query.
+        rows (int): Rows returned by the queries.
+        calls (int): Invocations of the operation; 0 for tables.
+    """
+
+    queries: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    rows: int = 0
+    calls: int = 0
+
+    def add(self, seconds: float, rows: int):
+        self.queries += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows += rows
+
+
+class QueryInstrumentation:
+    """Query statistics of one connection, by table and by operation.
+
+    Args:
+        connection (dj.Connection, optional): Connection to instrument.
+            Defaults to `dj.conn()`.
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection or dj.conn()
+        self.total = QueryStats()
+        self.by_table = {}
+        self.by_operation = {}
+        self._labels = {}
+        self._labeled_activations = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._installed = False
+
+    def install(self):
+        """Start recording the queries of the connection.
+
+        All instrumentations installed on a connection share one wrapper of its
+        `query` method, so that each records every query exactly once.
+        Installing twice has no effect.
+        """
+        if self._installed:
+            return
+        wrapper = vars(self.connection).get("query")
+        if getattr(wrapper, "instrumentations", None) is None:
+            query = self.connection.query
+
+            def wrapper(sql, args=(), **kwargs):
+                start = time.perf_counter()
+                rows = 0
+                try:
+                    cursor = query(sql, args, **kwargs)
+                    if sql.lstrip()[:8].lower().startswith(_RETURNS_ROWS):
+                        rows = max(cursor.rowcount, 0)
+                    return cursor
+                finally:
+                    seconds = time.perf_counter() - start
+                    for instrumentation in list(wrapper.instrumentations):
+                        instrumentation._record(sql, seconds, rows)
+
+            wrapper.instrumentations = []
+            wrapper.replaced = vars(self.connection).get("query")
+            self.connection.query = wrapper
+        wrapper.instrumentations.append(self)
+        self._installed = True
+
+    def uninstall(self):
+        """Stop recording; the statistics are kept."""
+        if not self._installed:
+            return
+        wrapper = vars(self.connection)["query"]
+        wrapper.instrumentations.remove(self)
+        if not wrapper.instrumentations:
+            if wrapper.replaced is None:
+                del self.connection.query
+            else:
+                self.connection.query = wrapper.replaced
+        self._installed = False
+
+    def reset(self):
+        """Clear the statistics."""
+        with self._lock:
+            self.total = QueryStats()
+            self.by_table.clear()
+            self.by_operation.clear()
+
+    def _label(self, full_table_name: str) -> str:
+        """Element-animal label of a table, or its full name if it has none.
+
+        The labels are collected again when a table is missing from them and
+        schemas were activated since they were last collected.
+        """
+        label = self._labels.get(full_table_name)
+        if label is None:
+            activations = tuple(activation._registry)
+            if activations != self._labeled_activations:
+                self._labeled_activations = activations
+                self._labels = {
+                    table.full_table_name: label
+                    for label, table in element_tables().items()
+                }
+                label = self._labels.get(full_table_name)
+        return label or full_table_name
+
+    def _record(self, sql: str, seconds: float, rows: int):
+        tables = {
+            self._label(f"`{database}`.`{table}`")
+            for database, table in _TABLE_NAME.findall(sql)
+        }
+        stack = getattr(self._local, "operations", None)
+        with self._lock:
+            self.total.add(seconds, rows)
+            for label in tables:
+                self.by_table.setdefault(label, QueryStats()).add(seconds, rows)
+            if stack:
+                self.by_operation.setdefault(stack[-1], QueryStats()).add(seconds, rows)
+
+    @contextmanager
+    def operation(self, name: str):
+        """Attribute the queries issued in this context, in this thread, to `name`."""
+        stack = getattr(self._local, "operations", None)
+        if stack is None:
+            stack = self._local.operations = []
+        with self._lock:
+            self.by_operation.setdefault(name, QueryStats()).calls += 1
+        stack.append(name)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def summary(self) -> pd.DataFrame:
+        """Statistics as a table.
+
+        Returns:
+            pd.DataFrame: One row per table and per operation, with columns
+                `kind` ("table" or "operation"), `name`, `queries`, `seconds`,
+                `max_seconds`, `rows`, `calls` and `queries_per_call`.
+        """
+        with self._lock:
+            rows = [
+                {"kind": kind, "name": name, **vars(stats)}
+                for kind, group in (
+                    ("table", self.by_table),
+                    ("operation", self.by_operation),
+                )
+                for name, stats in group.items()
+            ]
+        summary = pd.DataFrame(
+            rows,
+            columns=[
+                "kind",
+                "name",
+                "queries",
+                "seconds",
+                "max_seconds",
+                "rows",
+                "calls",
+            ],
+        )
+        summary["queries_per_call"] = summary["queries"] / summary["calls"].where(
+            summary["calls"] > 0
+        )
+        return summary.sort_values(["kind", "seconds"], ascending=[False, False])
+
+    def prometheus(self, prefix: str = "element_animal") -> str:
+        """Statistics in the Prometheus text exposition format.
+
+        Args:
+            prefix (str, optional): Metric name prefix.
+
+        Returns:
+            str: Counters of queries, query seconds and rows by table and by
+                operation, and of operation calls.
+        """
+        metrics = [
+            ("queries_total", "queries", "Queries issued"),
+            ("query_seconds_total", "seconds", "Wall-clock time of queries"),
+            ("query_rows_total", "rows", "Rows returned by queries"),
+        ]
+        with self._lock:
+            groups = [
+                ("table", dict(self.by_table)),
+                ("operation", dict(self.by_operation)),
+            ]
+            lines = []
+            for metric, attribute, help_text in metrics:
+                name = f"{prefix}_{metric}"
+                lines += [
+                    f"# HELP {name} {help_text}, by table and by operation.",
+                    f"# TYPE {name} counter",
+                    f"{name} {getattr(self.total, attribute)}",
+                ]
+                for label, group in groups:
+                    lines += [
+                        f'{name}{{{label}="{key}"}} {getattr(stats, attribute)}'
+                        for key, stats in group.items()
+                    ]
+            name = f"{prefix}_operation_calls_total"
+            lines += [
+                f"# HELP {name} Invocations of instrumented operations.",
+                f"# TYPE {name} counter",
+            ]
+            lines += [
+                f'{name}{{operation="{key}"}} {stats.calls}'
+                for key, stats in groups[1][1].items()
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def enable_instrumentation(connection=None) -> QueryInstrumentation:
+    """Start the package-wide query instrumentation.
+
+    Args:
+        connection (dj.Connection, optional): Connection to instrument.
+            Defaults to `dj.conn()`.
+
+    Returns:
+        QueryInstrumentation: The statistics being recorded.
+    """
+    global _default_instrumentation
+    disable_instrumentation()
+    _default_instrumentation = QueryInstrumentation(connection)
+    _default_instrumentation.install()
+    return _default_instrumentation
+
+
+def disable_instrumentation():
+    """Stop the package-wide query instrumentation."""
+    global _default_instrumentation
+    if _default_instrumentation is not None:
+        _default_instrumentation.uninstall()
+    _default_instrumentation = None
+
+
+def get_instrumentation():
+    """The package-wide query instrumentation, or None when it is disabled."""
+    return _default_instrumentation
+
+
+@contextmanager
+def operation(name: str):
+    """Attribute queries to the operation `name` while instrumentation is enabled.
+
+    Usable as a context manager or as a decorator; a no-op when instrumentation
+    is disabled.
+    """
+    if _default_instrumentation is None:
+        yield
+        return
+    with _default_instrumentation.operation(name):
+        yield
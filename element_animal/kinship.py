@@ -0,0 +1,234 @@
+"""Kinship and inbreeding coefficients over the colony pedigree.
+
+The kinship coefficient of two subjects is the probability that alleles drawn at
+random from each of them are identical by descent; the inbreeding coefficient of
+a subject is the kinship of its parents. Coefficients follow the recursive
+definition
+
+    K(i, i) = (1 + K(father_i, mother_i)) / 2
+    K(i, j) = (K(father_i, j) + K(mother_i, j)) / 2
+
+where `i` is not an ancestor of `j` and unknown parents contribute 0. All pairs
+needed for a batch of candidates are expanded and evaluated generation by
+generation as array operations, and every evaluated pair is memoized.
+
+Example:
+    >>> from element_animal.kinship import Kinship
+    >>> from element_animal.pedigree import Pedigree
+    >>> kinship = Kinship(Pedigree.load())
+    >>> kinship.kinship_matrix(["M01", "M02"], ["F07", "F09", "F11"])
+"""
+
+import numpy as np
+import pandas as pd
+
+_SHIFT = np.int64(32)
+_MASK = np.int64((1 << 32) - 1)
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    """Sorted unique values; faster than np.unique for large integer arrays."""
+    values = np.sort(values)
+    return values[np.concatenate([values[:1] == values[:1], values[1:] != values[:-1]])]
+
+
+def _in_sorted(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    """Whether each of `values` occurs in the sorted array `sorted_values`."""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[pos] == values
+
+
+class Kinship:
+    """Memoized kinship computation on a `Pedigree`.
+
+    The memo is kept across calls. When the pedigree is updated with new
+    litters, entries involving re-parented subjects or their descendants are
+    dropped; entries for other subjects remain valid.
+
+    Args:
+        pedigree (Pedigree): Colony pedigree.
+    """
+
+    def __init__(self, pedigree):
+        self.pedigree = pedigree
+        self._version = pedigree.version
+        self._memo_codes = np.empty(0, dtype=np.int64)
+        self._memo_values = np.empty(0, dtype=np.float64)
+
+    def __len__(self):
+        """Number of memoized pairs."""
+        return len(self._memo_codes)
+
+    def clear(self):
+        """Drop all memoized coefficients."""
+        self._memo_codes = np.empty(0, dtype=np.int64)
+        self._memo_values = np.empty(0, dtype=np.float64)
+
+    def _sync(self):
+        """Invalidate memo entries made stale by pedigree updates."""
+        if self.pedigree.version == self._version:
+            return
+        reparented = self.pedigree.reparented_since(self._version)
+        self._version = self.pedigree.version
+        if not len(reparented) or not len(self._memo_codes):
+            return
+        affected = np.zeros(len(self.pedigree.subjects), dtype=bool)
+        affected[reparented] = True
+        affected[
+            self.pedigree.ids(
+                list(self.pedigree._walk(reparented, self.pedigree._children))
+            )
+        ] = True
+        keep = ~(
+            affected[self._memo_codes >> _SHIFT] | affected[self._memo_codes & _MASK]
+        )
+        self._memo_codes = self._memo_codes[keep]
+        self._memo_values = self._memo_values[keep]
+
+    def _encode(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Order-independent pair codes, with the deeper subject in the high bits.
+
+        A subject is never an ancestor of a subject at the same or a smaller
+        generation depth, so the high subject can always be expanded.
+        """
+        depth = self.pedigree.depth
+        swap = (depth[a] < depth[b]) | ((depth[a] == depth[b]) & (a < b))
+        high, low = np.where(swap, b, a), np.where(swap, a, b)
+        return (high << _SHIFT) | low
+
+    def _evaluate(self, codes: np.ndarray):
+        """Compute and memoize all `codes` missing from the memo."""
+        father, mother = self.pedigree.father, self.pedigree.mother
+        component = self.pedigree.component
+        nodes, children_1, children_2 = [], [], []
+        frontier = _sorted_unique(codes[~_in_sorted(codes, self._memo_codes)])
+        seen = frontier
+        while len(frontier):
+            high, low = frontier >> _SHIFT, frontier & _MASK
+            diagonal = high == low
+            # K(i, i) expands to K(father_i, mother_i), K(i, j) to the parents of i;
+            # subjects of unrelated families are not expanded, their kinship is 0
+            related = component[high] == component[low]
+            parent_1 = np.where(related, father[high], -1)
+            parent_2 = np.where(related, mother[high], -1)
+            other_1 = np.where(diagonal, parent_2, low)
+            child_1 = np.where(
+                (parent_1 >= 0) & (other_1 >= 0), self._encode(parent_1, other_1), -1
+            )
+            child_2 = np.where(
+                ~diagonal & (parent_2 >= 0), self._encode(parent_2, low), -1
+            )
+            nodes.append(frontier)
+            children_1.append(child_1)
+            children_2.append(child_2)
+
+            frontier = _sorted_unique(np.concatenate([child_1, child_2]))
+            frontier = frontier[frontier >= 0]
+            frontier = frontier[
+                ~_in_sorted(frontier, self._memo_codes) & ~_in_sorted(frontier, seen)
+            ]
+            seen = np.sort(np.concatenate([seen, frontier]), kind="stable")
+
+        if not nodes:
+            return
+        nodes = np.concatenate(nodes)
+        children_1 = np.concatenate(children_1)
+        children_2 = np.concatenate(children_2)
+
+        # a pair only depends on pairs with a smaller sum of generation depths
+        depth = self.pedigree.depth
+        depth_sum = depth[nodes >> _SHIFT] + depth[nodes & _MASK]
+        by_level = np.argsort(depth_sum, kind="stable")
+        nodes, depth_sum = nodes[by_level], depth_sum[by_level]
+        children = np.stack([children_1[by_level], children_2[by_level]])
+        diagonal = (nodes >> _SHIFT) == (nodes & _MASK)
+
+        codes = np.concatenate([self._memo_codes, nodes])
+        values = np.concatenate([self._memo_values, np.full(len(nodes), np.nan)])
+        order = np.argsort(codes)
+        codes, values = codes[order], values[order]
+        node_pos = np.searchsorted(codes, nodes)
+        # unknown or unrelated children point at a trailing 0
+        values = np.append(values, 0.0)
+        child_order = np.argsort(children, axis=None)
+        child_pos = np.empty(children.size, dtype=np.int64)
+        child_pos[child_order] = np.searchsorted(
+            codes, np.maximum(children.ravel()[child_order], 0)
+        )
+        child_pos = np.where(
+            children >= 0, child_pos.reshape(children.shape), len(codes)
+        )
+
+        bounds = np.flatnonzero(np.diff(depth_sum)) + 1
+        for start, stop in zip(
+            np.concatenate([[0], bounds]), np.concatenate([bounds, [len(nodes)]])
+        ):
+            value_1 = values[child_pos[0, start:stop]]
+            value_2 = values[child_pos[1, start:stop]]
+            values[node_pos[start:stop]] = np.where(
+                diagonal[start:stop], 0.5 * (1 + value_1), 0.5 * (value_1 + value_2)
+            )
+        values = values[:-1]
+
+        self._memo_codes, self._memo_values = codes, values
+
+    def kinship(self, subjects_a, subjects_b) -> np.ndarray:
+        """Kinship coefficients of pairs of subjects.
+
+        Args:
+            subjects_a (array-like): First subject of each pair.
+            subjects_b (array-like): Second subject of each pair.
+
+        Returns:
+            np.ndarray: Kinship coefficient per pair.
+        """
+        self._sync()
+        codes = self._encode(
+            self.pedigree.ids(subjects_a), self.pedigree.ids(subjects_b)
+        )
+        self._evaluate(codes)
+        return self._memo_values[np.searchsorted(self._memo_codes, codes)]
+
+    def kinship_matrix(self, subjects_a, subjects_b) -> pd.DataFrame:
+        """Kinship coefficients of all combinations of two sets of subjects.
+
+        Args:
+            subjects_a (array-like): Row subjects, e.g. candidate fathers.
+            subjects_b (array-like): Column subjects, e.g. candidate mothers.
+
+        Returns:
+            pd.DataFrame: Kinship coefficients indexed by `subjects_a` with
+                `subjects_b` as columns.
+        """
+        subjects_a = np.asarray(subjects_a, dtype=object)
+        subjects_b = np.asarray(subjects_b, dtype=object)
+        values = self.kinship(
+            np.repeat(subjects_a, len(subjects_b)), np.tile(subjects_b, len(subjects_a))
+        )
+        return pd.DataFrame(
+            values.reshape(len(subjects_a), len(subjects_b)),
+            index=subjects_a,
+            columns=subjects_b,
+        )
+
+    def inbreeding(self, subjects) -> np.ndarray:
+        """Inbreeding coefficients of subjects, 0 where a parent is unknown.
+
+        Args:
+            subjects (array-like): Subject identifiers.
+
+        Returns:
+            np.ndarray: Inbreeding coefficient per subject.
+        """
+        ids = self.pedigree.ids(subjects)
+        father, mother = self.pedigree.father[ids], self.pedigree.mother[ids]
+        known = (father >= 0) & (mother >= 0)
+        coefficients = np.zeros(len(ids))
+        if known.any():
+            coefficients[known] = self.kinship(
+                self.pedigree.subjects[father[known]],
+                self.pedigree.subjects[mother[known]],
+            )
+        return coefficients
@@ -0,0 +1,438 @@
+"""Read-only offline mode backed by a Parquet snapshot.
+
+`enable_offline` replaces the tables of the `subject`, `surgery`, `injection`
+and `genotyping` modules with stand-ins that serve restrictions, joins,
+projections and fetches from a snapshot written by
+`element_animal.export.export_snapshot`, so that code written against the
+DataJoint tables, e.g. the NWB export, runs where no database is reachable:
+
+    >>> from element_animal import offline
+    >>> from element_animal.export import subject_to_nwb
+    >>> offline.enable_offline("/data/colony")
+    >>> subject_to_nwb({"subject": "M001"})
+    >>> offline.disable_offline()
+
+Opening a snapshot only reads its manifest. Each table is memory-mapped from
+its Parquet files the first time it is queried and evaluated with Arrow
+compute kernels and hash joins. Restrictions by SQL strings are not
+available offline.
+"""
+
+import importlib
+from pathlib import Path
+from types import SimpleNamespace
+
+import datajoint as dj
+import numpy as np
+import pandas as pd
+
+from .export.parquet import _read_manifest, read_snapshot
+
+MODULES = ("subject", "surgery", "injection", "genotyping")
+
+_ROW = "__row"
+
+_default_snapshot = None
+_replaced = {}
+
+
+def _row_numbers(table):
+    import pyarrow as pa
+
+    return pa.array(np.arange(table.num_rows))
+
+
+def _key_table(keys):
+    """Arrow table of restricting keys, from dicts, a DataFrame or records."""
+    import pyarrow as pa
+
+    if isinstance(keys, pa.Table):
+        return keys
+    return pa.Table.from_pandas(pd.DataFrame(keys), preserve_index=False)
+
+
+def _cast_like(keys, table):
+    """`keys` with the column types of `table`."""
+    for index, name in enumerate(keys.column_names):
+        if name not in table.column_names:
+            continue
+        target = table.schema.field(name).type
+        if keys.schema.field(name).type != target:
+            keys = keys.set_column(index, name, keys[name].cast(target))
+    return keys
+
+
+def _semijoin_rows(table, keys) -> np.ndarray:
+    """Rows of `table` matching any row of `keys` on their common columns."""
+    common = [name for name in keys.column_names if name in table.column_names]
+    if not common:
+        return np.arange(table.num_rows if keys.num_rows else 0)
+    keys = _cast_like(keys.select(common), table)
+    indexed = table.select(common).append_column(_ROW, _row_numbers(table))
+    matched = indexed.join(keys, common, join_type="left semi")
+    return np.sort(matched[_ROW].to_numpy())
+
+
+def _dict_rows(table, restriction: dict) -> np.ndarray:
+    """Rows of `table` equal to `restriction` on the attributes it shares."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    mask = None
+    for name, value in restriction.items():
+        if name not in table.column_names:
+            continue
+        column = table[name]
+        equal = pc.equal(column, pa.scalar(value).cast(column.type))
+        mask = equal if mask is None else pc.and_(mask, equal)
+    if mask is None:
+        return np.arange(table.num_rows)
+    return np.flatnonzero(mask.to_numpy(zero_copy_only=False) == True)  # noqa: E712
+
+
+def _restricted_rows(table, restriction) -> np.ndarray:
+    """Sorted rows of `table` matching a restriction, as DataJoint would."""
+    if isinstance(restriction, OfflineQuery):
+        return _semijoin_rows(table, restriction.table)
+    if isinstance(restriction, dict):
+        return _dict_rows(table, restriction)
+    if isinstance(restriction, (pd.DataFrame, np.ndarray)):
+        return _semijoin_rows(table, _key_table(restriction))
+    if isinstance(restriction, str):
+        raise dj.DataJointError("SQL restrictions are not available offline")
+    if isinstance(restriction, (list, tuple, set)):
+        # dicts with the same attributes are matched with one join
+        groups, rows = {}, []
+        for item in restriction:
+            if isinstance(item, dict):
+                groups.setdefault(tuple(sorted(item)), []).append(item)
+            else:
+                rows.append(_restricted_rows(table, item))
+        rows += [_semijoin_rows(table, _key_table(group)) for group in groups.values()]
+        return np.unique(np.concatenate(rows)) if rows else np.empty(0, dtype=int)
+    raise dj.DataJointError(
+        f"Restrictions of type {type(restriction).__name__} are not available offline"
+    )
+
+
+def _column_values(column) -> np.ndarray:
+    """A fetched column as DataJoint returns it."""
+    import pyarrow.types as types
+
+    if (types.is_integer(column.type) or types.is_floating(column.type)) and (
+        column.null_count == 0
+    ):
+        return column.to_numpy()
+    values = np.empty(len(column), dtype=object)
+    values[:] = column.to_pylist()
+    return values
+
+
+class OfflineQuery:
+    """Query over snapshot rows, with the DataJoint operators used for reading.
+
+    Args:
+        table (pyarrow.Table): Rows of the query.
+        primary_key (list): Primary-key attributes.
+    """
+
+    def __init__(self, table, primary_key: list):
+        self._table = table
+        self.primary_key = list(primary_key)
+
+    @property
+    def table(self):
+        """Rows of the query as a `pyarrow.Table`."""
+        return self._table
+
+    @property
+    def names(self) -> list:
+        """Attribute names."""
+        return self.table.column_names
+
+    @property
+    def heading(self):
+        """Attribute names, as `names`, `primary_key` and `secondary_attributes`."""
+        return SimpleNamespace(
+            names=self.names,
+            primary_key=self.primary_key,
+            secondary_attributes=[n for n in self.names if n not in self.primary_key],
+        )
+
+    def __repr__(self):
+        return f"{type(self).__name__}({len(self)} rows)\n{self.table.slice(0, 10)}"
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        return iter(self.fetch(as_dict=True))
+
+    # -------- operators
+
+    def __and__(self, restriction):
+        if isinstance(restriction, bool) or restriction is None:
+            if restriction is False:
+                return OfflineQuery(self.table.slice(0, 0), self.primary_key)
+            return self
+        rows = _restricted_rows(self.table, restriction)
+        return OfflineQuery(self.table.take(rows), self.primary_key)
+
+    def __sub__(self, restriction):
+        kept = np.setdiff1d(
+            np.arange(len(self)), _restricted_rows(self.table, restriction)
+        )
+        return OfflineQuery(self.table.take(kept), self.primary_key)
+
+    def __mul__(self, other):
+        return self.join(other)
+
+    def join(self, other, left: bool = False):
+        """Join on the common attributes, as `*` or a left join."""
+        common = [name for name in other.names if name in self.names]
+        primary_key = self.primary_key + [
+            name for name in other.primary_key if name not in self.primary_key
+        ]
+        if not common:
+            repeat = np.repeat(np.arange(len(self)), len(other))
+            tile = np.tile(np.arange(len(other)), len(self))
+            table = self.table.take(repeat)
+            for name in other.names:
+                table = table.append_column(name, other.table[name].take(tile))
+            return OfflineQuery(table, primary_key)
+        right = _cast_like(other.table, self.table.select(common))
+        table = self.table.join(
+            right, common, join_type="left outer" if left else "inner"
+        )
+        columns = self.names + [name for name in other.names if name not in common]
+        return OfflineQuery(table.select(columns), primary_key)
+
+    def proj(self, *attributes, **renamed):
+        """Primary key with `attributes` and renamed attributes.
+
+        Renamed attributes are given as new_name="existing_name"; computed
+        expressions are not available offline.
+        """
+        for new_name, name in renamed.items():
+            if name not in self.names:
+                raise dj.DataJointError(
+                    f"Computed attribute {new_name}={name!r} is not available offline"
+                )
+        if ... in attributes:
+            attributes = self.names
+        renamed_from = set(renamed.values())
+        kept = [
+            name
+            for name in self.names
+            if (name in self.primary_key or name in attributes)
+            and name not in renamed_from
+        ]
+        names = {name: name for name in kept}
+        names.update({new: old for new, old in renamed.items()})
+        table = self.table.select(list(names.values())).rename_columns(list(names))
+        primary_key = [
+            next((new for new, old in renamed.items() if old == name), name)
+            for name in self.primary_key
+        ]
+        return OfflineQuery(table, primary_key)
+
+    # -------- fetch
+
+    def _ordered(self, order_by, limit, offset):
+        table = self.table
+        if order_by is not None:
+            order_by = [order_by] if isinstance(order_by, str) else list(order_by)
+            sort_keys = []
+            for item in order_by:
+                if item == "KEY":
+                    sort_keys += [(name, "ascending") for name in self.primary_key]
+                    continue
+                name, _, direction = item.partition(" ")
+                descending = direction.strip().lower() == "desc"
+                sort_keys.append((name, "descending" if descending else "ascending"))
+            table = table.sort_by(sort_keys)
+        start = offset or 0
+        return table.slice(start, limit) if limit is not None else table.slice(start)
+
+    def fetch(
+        self,
+        *attrs,
+        as_dict: bool = False,
+        format: str = None,
+        order_by=None,
+        limit: int = None,
+        offset: int = None,
+    ):
+        """Fetch rows or attributes as DataJoint's `fetch` does.
+
+        Returns:
+            np.recarray | list | pd.DataFrame | np.ndarray | tuple: Records by
+                default, dicts with `as_dict`, a DataFrame indexed by the
+                primary key with `format="frame"`, or one array per attribute
+                (or a list of key dicts for "KEY") when attributes are given.
+        """
+        table = self._ordered(order_by, limit, offset)
+        if not attrs:
+            if as_dict:
+                return table.to_pylist()
+            frame = table.to_pandas()
+            if format == "frame":
+                return frame.set_index(self.primary_key)
+            return frame.to_records(index=False)
+        if as_dict:
+            names = [
+                n for a in attrs for n in (self.primary_key if a == "KEY" else [a])
+            ]
+            return table.select(list(dict.fromkeys(names))).to_pylist()
+        values = [
+            table.select(self.primary_key).to_pylist()
+            if attr == "KEY"
+            else _column_values(table[attr])
+            for attr in attrs
+        ]
+        return values[0] if len(attrs) == 1 else tuple(values)
+
+    def fetch1(self, *attrs):
+        """Fetch the single row of the query, as DataJoint's `fetch1` does."""
+        if len(self) != 1:
+            raise dj.DataJointError(
+                f"fetch1 should only return one tuple. {len(self)} tuples found"
+            )
+        if not attrs:
+            return self.table.to_pylist()[0]
+        values = [
+            self.table.select(self.primary_key).to_pylist()[0]
+            if attr == "KEY"
+            else self.table[attr][0].as_py()
+            for attr in attrs
+        ]
+        return values[0] if len(attrs) == 1 else tuple(values)
+
+    def head(self, limit: int = 25, **fetch_kwargs):
+        return self.fetch(order_by="KEY", limit=limit, **fetch_kwargs)
+
+
+class OfflineTable(OfflineQuery):
+    """Stand-in for one table of a snapshot; parts are attributes, as in DataJoint.
+
+    Args:
+        snapshot (OfflineSnapshot): Snapshot holding the table.
+        name (str): Table label, e.g. "subject.Subject".
+    """
+
+    def __init__(self, snapshot, name: str):
+        self._snapshot = snapshot
+        self.name = name
+        self.primary_key = list(snapshot.manifest["tables"][name]["primary_key"])
+
+    @property
+    def table(self):
+        return self._snapshot.table(self.name)
+
+    @property
+    def names(self) -> list:
+        return list(self._snapshot.manifest["tables"][self.name]["columns"])
+
+    @property
+    def full_table_name(self) -> str:
+        return self._snapshot.manifest["tables"][self.name]["full_table_name"]
+
+    def __getattr__(self, part_name: str):
+        name = f"{self.name}.{part_name}"
+        if part_name.startswith("_") or name not in self._snapshot.manifest["tables"]:
+            raise AttributeError(part_name)
+        return self._snapshot.get(name)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+    def insert(self, *args, **kwargs):
+        raise dj.DataJointError("Offline tables are read-only")
+
+    insert1 = delete = delete_quick = insert
+
+
+class OfflineSnapshot:
+    """Tables of a snapshot directory, loaded when first queried.
+
+    Args:
+        root (str | Path): Directory written by `export_snapshot`.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.manifest = _read_manifest(self.root)
+        if not self.manifest["snapshots"]:
+            raise dj.DataJointError(f"No snapshot found at {root}")
+        self._tables = {}
+        self._stand_ins = {}
+
+    @property
+    def names(self) -> list:
+        """Labels of the tables in the snapshot."""
+        return list(self.manifest["tables"])
+
+    def get(self, name: str) -> OfflineTable:
+        """Stand-in for the table labelled `name`, e.g. "subject.Subject.Lab"."""
+        if name not in self.manifest["tables"]:
+            raise dj.DataJointError(f"{name} is not in the snapshot at {self.root}")
+        if name not in self._stand_ins:
+            self._stand_ins[name] = OfflineTable(self, name)
+        return self._stand_ins[name]
+
+    def table(self, name: str):
+        """Rows of a table as a memory-mapped `pyarrow.Table`, read once."""
+        if name not in self._tables:
+            self._tables[name] = read_snapshot(self.root, name)
+        return self._tables[name]
+
+    def view(self, name: str) -> OfflineQuery:
+        """A denormalized view of the snapshot, e.g. "subject"."""
+        view = self.manifest["views"][name]
+        return OfflineQuery(read_snapshot(self.root, name), view["primary_key"])
+
+
+def enable_offline(root, modules=MODULES) -> OfflineSnapshot:
+    """Serve the tables of `modules` from a snapshot until `disable_offline`.
+
+    Each top-level table class of the modules that is in the snapshot is
+    replaced by its `OfflineTable`, so code that reads the tables through the
+    modules, e.g. `subject.Subject & key`, uses the snapshot.
+
+    Args:
+        root (str | Path): Directory written by `export_snapshot`.
+        modules (tuple, optional): Names of the element-animal modules to
+            serve offline. Defaults to `MODULES`.
+
+    Returns:
+        OfflineSnapshot: The snapshot being served.
+    """
+    global _default_snapshot
+    disable_offline()
+    snapshot = OfflineSnapshot(root)
+    for name in snapshot.names:
+        module_name, _, table_name = name.partition(".")
+        if module_name not in modules or "." in table_name:
+            continue
+        module = importlib.import_module(f"{__package__}.{module_name}")
+        _replaced[(module, table_name)] = getattr(module, table_name)
+        setattr(module, table_name, snapshot.get(name))
+    _default_snapshot = snapshot
+    return snapshot
+
+
+def disable_offline():
+    """Restore the DataJoint tables replaced by `enable_offline`."""
+    global _default_snapshot
+    for (module, table_name), table in _replaced.items():
+        setattr(module, table_name, table)
+    _replaced.clear()
+    _default_snapshot = None
+
+
+def get_offline_snapshot():
+    """The snapshot served by `enable_offline`, or None when it is disabled."""
+    return _default_snapshot
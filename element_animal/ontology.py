@@ -0,0 +1,208 @@
+"""Brain region hierarchies for `surgery.BrainRegion`.
+
+A hierarchy such as the Allen CCF structure graph is loaded from a local file
+into `surgery.BrainRegion`, `surgery.BrainRegionParent` and the precomputed
+closure `surgery.BrainRegionAncestry`. Subtree restrictions are then single
+indexed queries:
+
+    >>> from element_animal import ontology, surgery
+    >>> ontology.load_ontology("structure_graph.json")
+    >>> ontology.restrict_to_subtree(surgery.Implantation, "HPF")
+"""
+
+import json
+from pathlib import Path
+
+import datajoint as dj
+import numpy as np
+import pandas as pd
+
+from . import surgery
+from .utils import insert_in_batches
+
+
+def _flatten_structure_graph(structures) -> list:
+    """Structures of a nested Allen structure graph, parents first."""
+    if isinstance(structures, dict):
+        structures = structures.get("msg", [structures])
+    flat, stack = [], list(reversed(structures))
+    while stack:
+        structure = stack.pop()
+        flat.append(structure)
+        stack.extend(reversed(structure.get("children") or []))
+    return flat
+
+
+def read_ontology(path, file_format: str = None) -> pd.DataFrame:
+    """Read a region hierarchy from an Allen structure graph JSON or a CSV file.
+
+    JSON files hold the Allen structure graph, nested through `children` (as
+    returned by the Allen API, optionally under `msg`) or as a flat list. CSV
+    files hold one region per row, either with the Allen columns `id`,
+    `acronym`, `name` and `parent_structure_id`, or with `region_acronym`,
+    `region_name` and `parent_acronym`.
+
+    Args:
+        path (str | Path): JSON or CSV file.
+        file_format (str, optional): "json" or "csv". Defaults to the file
+            extension.
+
+    Returns:
+        pd.DataFrame: Columns `region_acronym`, `region_name` and
+            `parent_acronym`, None for roots.
+    """
+    path = Path(path)
+    file_format = file_format or path.suffix.lower().lstrip(".")
+    assert file_format in ("json", "csv"), "file_format must be json or csv"
+    if file_format == "json":
+        regions = pd.DataFrame(
+            _flatten_structure_graph(json.loads(path.read_text())),
+            columns=["id", "acronym", "name", "parent_structure_id"],
+        )
+    else:
+        regions = pd.read_csv(path)
+    if "parent_acronym" not in regions:
+        acronyms = pd.Series(regions["acronym"].to_numpy(), index=regions["id"])
+        regions = pd.DataFrame(
+            {
+                "region_acronym": regions["acronym"],
+                "region_name": regions["name"],
+                "parent_acronym": acronyms.reindex(
+                    regions["parent_structure_id"]
+                ).to_numpy(),
+            }
+        )
+    regions = regions[["region_acronym", "region_name", "parent_acronym"]]
+    return regions.astype(object).where(regions.notna(), None)
+
+
+def closure(regions: pd.DataFrame) -> pd.DataFrame:
+    """Transitive closure of a region hierarchy, one level per array operation.
+
+    Args:
+        regions (pd.DataFrame): Columns `region_acronym` and `parent_acronym`.
+
+    Returns:
+        pd.DataFrame: Columns `ancestor`, `descendant` and `depth`, including
+            each region as its own ancestor at depth 0.
+
+    Raises:
+        dj.DataJointError: If a parent is missing from `regions` or the hierarchy has a
+            cycle.
+    """
+    index = pd.Index(regions["region_acronym"])
+    has_parent = regions["parent_acronym"].notna().to_numpy()
+    parent = np.full(len(regions), -1, dtype=np.int64)
+    parent[has_parent] = index.get_indexer(regions["parent_acronym"][has_parent])
+    if (parent[has_parent] < 0).any():
+        missing = regions["parent_acronym"][has_parent][parent[has_parent] < 0]
+        raise dj.DataJointError(f"Parent region(s) not in the ontology: {set(missing)}")
+
+    descendants, ancestors, depths = [], [], []
+    current, depth = np.arange(len(regions)), 0
+    rows = np.arange(len(regions))
+    while len(rows):
+        if depth > len(regions):
+            raise dj.DataJointError("The region hierarchy contains a cycle")
+        descendants.append(rows)
+        ancestors.append(current)
+        depths.append(np.full(len(rows), depth))
+        current = parent[current]
+        rows, current = rows[current >= 0], current[current >= 0]
+        depth += 1
+    acronyms = index.to_numpy(dtype=object)
+    return pd.DataFrame(
+        {
+            "ancestor": acronyms[np.concatenate(ancestors)],
+            "descendant": acronyms[np.concatenate(descendants)],
+            "depth": np.concatenate(depths),
+        }
+    )
+
+
+def load_ontology(source, *, batch_size: int = 10000, file_format: str = None):
+    """Load a region hierarchy into the surgery schema in one transaction.
+
+    New regions are added to `surgery.BrainRegion`; names of existing regions
+    are kept. The parents and the closure of all loaded regions are replaced.
+
+    Args:
+        source (str | Path | pd.DataFrame): File accepted by `read_ontology`,
+            or its result. It must hold the complete hierarchy above every
+            region.
+        batch_size (int, optional): Maximum rows per INSERT statement.
+            Defaults to 10000.
+        file_format (str, optional): Passed to `read_ontology`.
+
+    Returns:
+        dict: Number of rows submitted per table class name.
+    """
+    regions = (
+        source
+        if isinstance(source, pd.DataFrame)
+        else read_ontology(source, file_format)
+    )
+    ancestry = closure(regions)
+    loaded = regions[["region_acronym"]].to_dict("records")
+    with surgery.BrainRegion.connection.transaction:
+        for start in range(0, len(loaded), batch_size):
+            batch = loaded[start : start + batch_size]
+            (surgery.BrainRegionParent & batch).delete_quick()
+            (
+                surgery.BrainRegionAncestry
+                & [{"descendant": r["region_acronym"]} for r in batch]
+            ).delete_quick()
+        return {
+            "BrainRegion": insert_in_batches(
+                surgery.BrainRegion,
+                regions[["region_acronym", "region_name"]],
+                batch_size=batch_size,
+                skip_duplicates=True,
+            ),
+            "BrainRegionParent": insert_in_batches(
+                surgery.BrainRegionParent,
+                regions[["region_acronym", "parent_acronym"]],
+                batch_size=batch_size,
+            ),
+            "BrainRegionAncestry": insert_in_batches(
+                surgery.BrainRegionAncestry, ancestry, batch_size=batch_size
+            ),
+        }
+
+
+def subtree(region_acronym: str, *, max_depth: int = None):
+    """Regions in the subtree of a region, including the region itself.
+
+    Args:
+        region_acronym (str): Root of the subtree.
+        max_depth (int, optional): Levels below the root to include. Defaults to
+            all levels.
+
+    Returns:
+        QueryExpression: `surgery.BrainRegion` restricted to the subtree.
+    """
+    ancestry = surgery.BrainRegionAncestry & {"ancestor": region_acronym}
+    if max_depth is not None:
+        ancestry &= f"depth <= {int(max_depth)}"
+    return surgery.BrainRegion & ancestry.proj(region_acronym="descendant")
+
+
+def restrict_to_subtree(
+    query, region_acronym: str, *, attribute: str = "target_region"
+):
+    """Restrict a query to entries whose region lies in a subtree.
+
+    Args:
+        query (QueryExpression): e.g. `surgery.Implantation` or
+            `injection.Injection`.
+        region_acronym (str): Root of the subtree, e.g. "HPF".
+        attribute (str, optional): Region attribute of `query`. Defaults to
+            "target_region".
+
+    Returns:
+        QueryExpression: `query` restricted with a single semijoin on the
+            closure table.
+    """
+    return query & (surgery.BrainRegionAncestry & {"ancestor": region_acronym}).proj(
+        **{attribute: "descendant"}
+    )
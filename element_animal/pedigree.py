@@ -0,0 +1,492 @@
+"""In-memory pedigree of the colony built from `genotyping` breeding records.
+
+Subjects are mapped to integer ids and their parents are held in NumPy arrays,
+so that ancestry questions spanning many generations are answered without
+further queries:
+
+    >>> from element_animal.pedigree import Pedigree
+    >>> pedigree = Pedigree.load()
+    >>> pedigree.ancestors("M0123", max_generations=3)
+    {'M0045': 1, 'F0046': 1, 'M0002': 2, ...}
+    >>> pedigree.update()  # pick up litters inserted or corrected since loading
+"""
+
+from itertools import compress
+
+import datajoint as dj
+import numpy as np
+import pandas as pd
+
+from . import genotyping, subject
+
+# bucket of a subject in the digests compared by `Pedigree.update`
+_BUCKET = "crc32(subject) % 1024"
+
+
+class Pedigree:
+    """Parent/child graph of the colony with integer subject ids.
+
+    Args:
+        subjects (array-like): Subject identifiers, one per node.
+        father (array-like): Id of each subject's father, -1 when unknown.
+        mother (array-like): Id of each subject's mother, -1 when unknown.
+        breeding_pairs (list, optional): (line, breeding_pair) tuples.
+        pair (array-like, optional): Id in `breeding_pairs` of the pair each
+            subject was born to, -1 when unknown.
+
+    Attributes:
+        subjects (np.ndarray): Subject identifiers indexed by id.
+        father (np.ndarray): Father id per subject, -1 when unknown.
+        mother (np.ndarray): Mother id per subject, -1 when unknown.
+        depth (np.ndarray): Generation depth per subject; 0 for founders, else
+            one more than the deeper parent.
+        component (np.ndarray): Label of the family each subject belongs to;
+            subjects with different labels share no ancestor.
+        version (int): Incremented whenever an update adds subjects or changes
+            parentage; unchanged by updates that merge nothing.
+        reparented (np.ndarray): Ids of previously loaded subjects whose parents
+            changed in the latest update that changed anything. See
+            `reparented_since` for the changes of several updates.
+    """
+
+    def __init__(self, subjects, father, mother, breeding_pairs=None, pair=None):
+        self.subjects = np.asarray(subjects, dtype=object)
+        self.father = np.asarray(father, dtype=np.int64)
+        self.mother = np.asarray(mother, dtype=np.int64)
+        self.breeding_pairs = [tuple(pair) for pair in breeding_pairs or []]
+        self._pair_ids = {pair: i for i, pair in enumerate(self.breeding_pairs)}
+        self.pair = (
+            np.full(len(self.subjects), -1, dtype=np.int64)
+            if pair is None
+            else np.asarray(pair, dtype=np.int64)
+        )
+        self.version = 0
+        self.reparented = np.empty(0, dtype=np.int64)
+        self._reparented = {}
+        self._digests = {}
+        self._build()
+
+    def _build(self):
+        """Index subjects and derive children lists, generation depths and families."""
+        self._index = pd.Index(self.subjects)
+        n = len(self.subjects)
+        self._set_children(np.sort(self._edge_keys(np.arange(n))))
+        self.depth = np.zeros(n, dtype=np.int64)
+        self._set_depth(np.arange(n))
+        self.component = np.arange(n)
+        self._set_components(np.arange(n))
+
+    def _patch(self, ids: np.ndarray, father: np.ndarray, mother: np.ndarray):
+        """Update the derived arrays after the parents of `ids` changed.
+
+        Only the children lists of the old and new parents are edited, depths
+        are recomputed for `ids` and their descendants, and families for the
+        families `ids` belonged to or joined.
+
+        Args:
+            ids (np.ndarray): Subjects whose parents changed, including new
+                subjects appended since the derived arrays were computed.
+            father (np.ndarray): Previous father of each of `ids`.
+            mother (np.ndarray): Previous mother of each of `ids`.
+        """
+        n, n_before = len(self.subjects), len(self.depth)
+        # children as sorted `parent * n + child` keys: drop the previous edges
+        # of `ids` and insert their current ones in place
+        counts = np.zeros(n, dtype=np.int64)
+        counts[:n_before] = np.diff(self._child_ptr)
+        keys = np.repeat(np.arange(n), counts) * n + self._child_idx
+        parents = np.concatenate([father, mother])
+        removed = np.unique((parents * n + np.tile(ids, 2))[parents >= 0])
+        starts = np.searchsorted(keys, removed)
+        stops = np.searchsorted(keys, removed, side="right")
+        delta = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.add.at(delta, starts, 1)
+        np.add.at(delta, stops, -1)
+        keys = keys[np.cumsum(delta[:-1]) == 0]
+        added = np.sort(self._edge_keys(ids))
+        self._set_children(np.insert(keys, np.searchsorted(keys, added), added))
+
+        self.depth = np.concatenate(
+            [self.depth, np.zeros(n - n_before, dtype=np.int64)]
+        )
+        self._set_depth(
+            np.union1d(ids, self.ids(list(self._walk(ids, self._children))))
+        )
+
+        self.component = np.concatenate([self.component, np.arange(n_before, n)])
+        touched = np.concatenate(
+            [ids, father, mother, self.father[ids], self.mother[ids]]
+        )
+        families = np.unique(self.component[touched[touched >= 0]])
+        self._set_components(np.flatnonzero(np.isin(self.component, families)))
+
+    def _edge_keys(self, ids: np.ndarray) -> np.ndarray:
+        """Parent-child edges of `ids` encoded as `parent * n + child`."""
+        parents = np.concatenate([self.father[ids], self.mother[ids]])
+        children = np.tile(ids, 2)
+        known = parents >= 0
+        return parents[known] * len(self.subjects) + children[known]
+
+    def _set_children(self, keys: np.ndarray):
+        """Store children in compressed sparse row form from sorted edge keys."""
+        n = len(self.subjects)
+        self._child_idx = keys % n if n else keys
+        self._child_ptr = np.zeros(n + 1, dtype=np.int64)
+        if n:
+            np.cumsum(np.bincount(keys // n, minlength=n), out=self._child_ptr[1:])
+
+    def _set_depth(self, ids: np.ndarray):
+        """Recompute the depths of `ids`, which must include their descendants.
+
+        Kahn's algorithm: subjects are visited once all their parents among
+        `ids` are, pushing one more than their depth to their children.
+
+        Raises:
+            DataJointError: If the parentage of `ids` contains a cycle.
+        """
+        inside = np.zeros(len(self.subjects), dtype=bool)
+        inside[ids] = True
+        waiting = np.zeros(len(self.subjects), dtype=np.int64)
+        depth = np.zeros(len(ids), dtype=np.int64)
+        for parent in (self.father[ids], self.mother[ids]):
+            known = parent >= 0
+            outside = known & ~inside[parent]
+            depth = np.maximum(depth, np.where(outside, self.depth[parent] + 1, 0))
+            waiting[ids] += known & ~outside
+        self.depth[ids] = depth
+
+        frontier, visited = ids[waiting[ids] == 0], 0
+        while len(frontier):
+            visited += len(frontier)
+            counts = self._child_ptr[frontier + 1] - self._child_ptr[frontier]
+            children = self._children(frontier)
+            np.maximum.at(
+                self.depth, children, np.repeat(self.depth[frontier] + 1, counts)
+            )
+            np.subtract.at(waiting, children, 1)
+            children = np.unique(children)
+            frontier = children[waiting[children] == 0]
+        if visited < len(ids):
+            raise dj.DataJointError("The pedigree contains a cycle")
+
+    def _set_components(self, ids: np.ndarray):
+        """Relabel the families made of the sorted subjects `ids`.
+
+        Each family is labeled with its smallest id, propagated along parent
+        edges. `ids` must hold whole families.
+        """
+        parents = [
+            np.where(parent >= 0, np.searchsorted(ids, parent), -1)
+            for parent in (self.father[ids], self.mother[ids])
+        ]
+        component = ids.copy()
+        while True:
+            new_component = component.copy()
+            for parent in parents:
+                has_parent = parent >= 0
+                np.minimum.at(
+                    new_component, parent[has_parent], new_component[has_parent]
+                )
+                new_component[has_parent] = np.minimum(
+                    new_component[has_parent], new_component[parent[has_parent]]
+                )
+            new_component = new_component[np.searchsorted(ids, new_component)]
+            if np.array_equal(new_component, component):
+                break
+            component = new_component
+        self.component[ids] = component
+
+    @staticmethod
+    def _litter_query() -> dj.expression.QueryExpression:
+        """Every subject with the breeding pair and parents of its litter.
+
+        Subjects without a litter have null pair and parent attributes.
+        """
+        return (
+            subject.Subject.proj()
+            .join(genotyping.SubjectLitter.proj("line", "breeding_pair"), left=True)
+            .join(genotyping.BreedingPair.Father, left=True)
+            .join(genotyping.BreedingPair.Mother, left=True)
+        )
+
+    @staticmethod
+    def _fetch_digests() -> dict:
+        """Row count and checksum of `_litter_query` per bucket of subjects.
+
+        Only the digests are transferred; `update` compares them with the
+        previous ones to find the buckets holding added or corrected records.
+        """
+        rows = Pedigree._litter_query().proj(
+            bucket=_BUCKET,
+            row_hash="crc32(concat_ws(',', subject, ifnull(line, ''), "
+            "ifnull(breeding_pair, ''), ifnull(father, ''), ifnull(mother, '')))",
+        )
+        digests = dj.U("bucket").aggr(rows, n="count(*)", checksum="sum(row_hash)")
+        return {
+            row["bucket"]: (row["n"], row["checksum"])
+            for row in digests.fetch(as_dict=True)
+        }
+
+    @staticmethod
+    def _fetch_litters(buckets=None) -> pd.DataFrame:
+        """Subjects with the breeding pair and parents of their litter.
+
+        Args:
+            buckets (list, optional): Restrict to the subjects of these buckets.
+                Defaults to None, all subjects.
+
+        Returns:
+            pd.DataFrame: Columns `subject`, `line`, `breeding_pair`, `father`
+                and `mother`, null for subjects without a litter.
+        """
+        columns = ["subject", "line", "breeding_pair", "father", "mother"]
+        query = Pedigree._litter_query()
+        if buckets is not None:
+            query &= f"{_BUCKET} in ({', '.join(str(int(b)) for b in buckets)})"
+        return pd.DataFrame(query.fetch(*columns, as_dict=True), columns=columns)
+
+    @classmethod
+    def load(cls):
+        """Load the pedigree of all subjects.
+
+        Returns:
+            Pedigree: The colony pedigree.
+        """
+        pedigree = cls([], [], [])
+        digests = cls._fetch_digests()
+        litters = cls._fetch_litters()
+        pedigree._merge(litters["subject"], litters)
+        pedigree._digests = digests
+        pedigree.version = 0
+        pedigree.reparented = np.empty(0, dtype=np.int64)
+        pedigree._reparented = {}
+        return pedigree
+
+    def update(self) -> int:
+        """Incorporate subjects, litters and breeding pairs changed since loading.
+
+        Subjects are split into buckets by a hash of their identifier, and the
+        row count and checksum of each bucket's subjects, litter keys and pair
+        parents are compared with those of the previous update. Only the
+        buckets that differ are fetched, so that new subjects and litters as
+        well as corrected `SubjectLitter` and `BreedingPair` rows are picked
+        up: subjects whose litter or whose pair's parents changed are
+        reparented, and subjects removed from their litter lose their parents.
+        The derived arrays (children, depths, families) are patched for the
+        reparented subjects and their descendants only.
+
+        Returns:
+            int: Number of subjects whose parents were set or changed.
+        """
+        digests = self._fetch_digests()
+        buckets = [
+            bucket
+            for bucket, digest in digests.items()
+            if self._digests.get(bucket) != digest
+        ]
+        if not buckets:
+            return 0
+        litters = self._fetch_litters(buckets)
+        merged = self._merge(litters["subject"], litters)
+        self._digests = digests
+        return merged
+
+    def _merge(self, subjects, litters: pd.DataFrame = None) -> int:
+        """Add new subjects and set the parents of subjects in `litters`.
+
+        Rows of `litters` without a breeding pair clear the parents.
+
+        Returns:
+            int: Number of subjects whose parents were set or changed.
+
+        Raises:
+            DataJointError: If a subject or parent in `litters` is neither in
+                the pedigree nor in `subjects`.
+        """
+        n_before = len(self.subjects)
+        new_subjects = pd.unique(np.asarray(subjects, dtype=object))
+        new_subjects = new_subjects[self._index.get_indexer(new_subjects) < 0]
+        n_new = len(new_subjects)
+        self.subjects = np.concatenate([self.subjects, new_subjects])
+        self.father = np.concatenate([self.father, np.full(n_new, -1, dtype=np.int64)])
+        self.mother = np.concatenate([self.mother, np.full(n_new, -1, dtype=np.int64)])
+        self.pair = np.concatenate([self.pair, np.full(n_new, -1, dtype=np.int64)])
+        self._index = self._index.append(pd.Index(new_subjects))
+
+        father, mother = self.father.copy(), self.mother.copy()
+        if litters is not None and len(litters):
+            ids = self._index.get_indexer(litters["subject"])
+            fathers = self._index.get_indexer(litters["father"].fillna(""))
+            mothers = self._index.get_indexer(litters["mother"].fillna(""))
+            unknown = (
+                (ids < 0)
+                | (litters["father"].notna().to_numpy() & (fathers < 0))
+                | (litters["mother"].notna().to_numpy() & (mothers < 0))
+            )
+            if unknown.any():
+                raise dj.DataJointError(
+                    "Litter records refer to subjects missing from the pedigree: "
+                    f"{sorted(set(litters[unknown].subject))}"
+                )
+
+            has_pair = litters["breeding_pair"].notna().to_numpy()
+            pairs = list(zip(litters["line"], litters["breeding_pair"]))
+            for pair in compress(pairs, has_pair):
+                self._pair_ids.setdefault(pair, len(self._pair_ids))
+            self.breeding_pairs = list(self._pair_ids)
+
+            self.father[ids], self.mother[ids] = fathers, mothers
+            self.pair[ids] = [
+                self._pair_ids[pair] if known else -1
+                for pair, known in zip(pairs, has_pair)
+            ]
+
+        changed = (self.father != father) | (self.mother != mother)
+        reparented = np.flatnonzero(changed[:n_before])
+        if not n_new and not len(reparented):
+            return 0
+        self.version += 1
+        self.reparented = reparented
+        self._reparented[self.version] = reparented
+        ids = np.union1d(np.flatnonzero(changed), np.arange(n_before, len(changed)))
+        self._patch(ids, father[ids], mother[ids])
+        return int(changed.sum())
+
+    def reparented_since(self, version: int) -> np.ndarray:
+        """Ids of previously loaded subjects whose parents changed after `version`.
+
+        Args:
+            version (int): A past value of `version`.
+
+        Returns:
+            np.ndarray: Sorted unique ids reparented by all later updates.
+        """
+        return np.unique(
+            np.concatenate(
+                [np.empty(0, dtype=np.int64)]
+                + [ids for v, ids in self._reparented.items() if v > version]
+            )
+        )
+
+    # -------- lookups
+
+    def ids(self, subjects) -> np.ndarray:
+        """Integer ids of `subjects`.
+
+        Raises:
+            KeyError: If a subject is not in the pedigree.
+        """
+        ids = self._index.get_indexer(np.atleast_1d(np.asarray(subjects, dtype=object)))
+        if (ids < 0).any():
+            raise KeyError(f"Unknown subject(s): {np.asarray(subjects)[ids < 0]}")
+        return ids
+
+    def _children(self, ids: np.ndarray) -> np.ndarray:
+        """Children ids of all subjects in `ids`, concatenated."""
+        starts, stops = self._child_ptr[ids], self._child_ptr[ids + 1]
+        counts = stops - starts
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        return self._child_idx[np.repeat(starts, counts) + offsets]
+
+    def _parents(self, ids: np.ndarray) -> np.ndarray:
+        """Known parent ids of all subjects in `ids`, concatenated."""
+        parents = np.concatenate([self.father[ids], self.mother[ids]])
+        return parents[parents >= 0]
+
+    def _walk(self, start: np.ndarray, step, max_generations=None) -> dict:
+        """Breadth-first walk from `start`, one generation per step."""
+        distance = {}
+        seen = np.zeros(len(self.subjects), dtype=bool)
+        seen[start] = True
+        frontier, generation = start, 0
+        while len(frontier) and (
+            max_generations is None or generation < max_generations
+        ):
+            generation += 1
+            frontier = np.unique(step(frontier))
+            frontier = frontier[~seen[frontier]]
+            seen[frontier] = True
+            distance.update(dict.fromkeys(self.subjects[frontier], generation))
+        return distance
+
+    # -------- queries
+
+    def parents(self, subject_id) -> tuple:
+        """(father, mother) of a subject, None where unknown."""
+        i = self.ids(subject_id)[0]
+        return tuple(
+            self.subjects[p] if p >= 0 else None
+            for p in (self.father[i], self.mother[i])
+        )
+
+    def ancestors(self, subject_id, max_generations: int = None) -> dict:
+        """Ancestors of a subject.
+
+        Args:
+            subject_id (str): Subject identifier.
+            max_generations (int, optional): Generations to go back. Defaults to
+                None, all generations.
+
+        Returns:
+            dict: Ancestor identifier to the number of generations separating it
+                from the subject (1 for parents), shortest path first.
+        """
+        return self._walk(self.ids(subject_id), self._parents, max_generations)
+
+    def descendants(
+        self, subject_id=None, *, breeding_pair: tuple = None, max_generations=None
+    ) -> dict:
+        """Descendants of a subject or of a breeding pair.
+
+        Args:
+            subject_id (str, optional): Subject identifier.
+            breeding_pair (tuple, optional): (line, breeding_pair) of a pair,
+                instead of a subject.
+            max_generations (int, optional): Generations to go forward. Defaults
+                to None, all generations.
+
+        Returns:
+            dict: Descendant identifier to the number of generations separating
+                it from the subject or pair (1 for children or pups).
+        """
+        assert (subject_id is None) != (
+            breeding_pair is None
+        ), "Provide exactly one of subject_id or breeding_pair"
+        if subject_id is not None:
+            return self._walk(self.ids(subject_id), self._children, max_generations)
+
+        pair_id = self._pair_ids.get(tuple(breeding_pair))
+        if pair_id is None:
+            raise KeyError(f"Unknown breeding pair: {breeding_pair}")
+        pups = np.flatnonzero(self.pair == pair_id)
+        if max_generations == 0 or not len(pups):
+            return {}
+        descendants = dict.fromkeys(self.subjects[pups], 1)
+        for name, generation in self._walk(
+            pups,
+            self._children,
+            None if max_generations is None else max_generations - 1,
+        ).items():
+            descendants.setdefault(name, generation + 1)
+        return descendants
+
+    def common_ancestors(self, subject_a, subject_b, max_generations=None) -> dict:
+        """Ancestors shared by two subjects.
+
+        Returns:
+            dict: Common ancestor identifier to its (generations from
+                `subject_a`, generations from `subject_b`), closest first.
+        """
+        ancestors_a = self.ancestors(subject_a, max_generations)
+        ancestors_b = self.ancestors(subject_b, max_generations)
+        common = {
+            name: (ancestors_a[name], ancestors_b[name])
+            for name in ancestors_a.keys() & ancestors_b.keys()
+        }
+        return dict(sorted(common.items(), key=lambda item: sum(item[1])))
+
+    def generation_depth(self, subjects) -> np.ndarray:
+        """Generation depth of each of `subjects`; 0 for founders."""
+        return self.depth[self.ids(subjects)]
@@ -0,0 +1,301 @@
+"""Spatial index over implantation sites.
+
+Sites are the positions of `surgery.Implantation.Coordinate` rows in one
+reference frame (see `element_animal.coordinates`). They are bucketed into a
+uniform grid of cubic cells, sorted by cell, so that radius, nearest-neighbour
+and bounding-box queries only look at the cells they overlap:
+
+    >>> from element_animal.spatial import ImplantIndex
+    >>> index = ImplantIndex.load()
+    >>> index.within((-1.8, 1.5, -1.2), radius=0.3, implant_type="opto")
+    >>> index.nearest((-1.8, 1.5, -1.2), k=5, hemisphere="right")
+    >>> index.update()  # index implantations inserted since loading
+    >>> index.region_density()
+
+Points are (ap, ml, dv) in mm.
+"""
+
+import numpy as np
+import pandas as pd
+
+from . import surgery
+from .coordinates import AXES, Coordinates
+
+_BITS = 21
+_OFFSET = np.int64(1 << (_BITS - 1))
+
+
+def _cell_codes(cells: np.ndarray) -> np.ndarray:
+    """Sort keys of (n, 3) cells, contiguous in dv within an (ap, ml) column."""
+    cells = cells.astype(np.int64) + _OFFSET
+    return (cells[:, 0] << (2 * _BITS)) | (cells[:, 1] << _BITS) | cells[:, 2]
+
+
+def _as_list(values):
+    if values is None:
+        return None
+    return [values] if isinstance(values, str) else list(values)
+
+
+class ImplantIndex:
+    """Grid index of implantation sites.
+
+    Args:
+        sites (pd.DataFrame): Implantation primary keys with site positions in
+            columns `ap`, `ml` and `dv`. Rows with an unknown position are not
+            indexed.
+        cell_size (float, optional): Edge of the grid cells in mm; about the
+            typical query radius works well. Defaults to 0.25.
+        reference (str, optional): Reference frame of the positions.
+        offsets (ReferenceOffsets, optional): Reference positions used by
+            `update` to place new implantations.
+
+    Attributes:
+        sites (pd.DataFrame): Indexed sites, in insertion order.
+        unplaced (pd.DataFrame): Sites with an unknown position. They are not
+            indexed, but kept so that `update` does not fetch them again.
+    """
+
+    def __init__(
+        self,
+        sites: pd.DataFrame,
+        *,
+        cell_size: float = 0.25,
+        reference: str = "bregma",
+        offsets=None,
+    ):
+        self.cell_size = cell_size
+        self.reference = reference
+        self.offsets = offsets
+        self.sites = sites.iloc[:0].reset_index(drop=True)
+        self.unplaced = self.sites
+        self._positions = np.empty((0, 3))
+        self._codes = np.empty(0, dtype=np.int64)
+        self._order = np.empty(0, dtype=np.int64)
+        # bounding box of the indexed positions
+        self._lower = np.full(3, np.inf)
+        self._upper = np.full(3, -np.inf)
+        self.add(sites)
+
+    @classmethod
+    def load(
+        cls,
+        restriction=None,
+        *,
+        cell_size: float = 0.25,
+        reference: str = "bregma",
+        offsets=None,
+    ):
+        """Index the implantations matching `restriction` with one query.
+
+        Args:
+            restriction (optional): Restriction on `surgery.Implantation`.
+            cell_size (float, optional): Edge of the grid cells in mm.
+            reference (str, optional): Reference frame of the index.
+            offsets (ReferenceOffsets, optional): Reference positions.
+
+        Returns:
+            ImplantIndex: The index.
+        """
+        coordinates = Coordinates.load(restriction)
+        return cls(
+            coordinates.to_dataframe(reference, offsets),
+            cell_size=cell_size,
+            reference=reference,
+            offsets=offsets,
+        )
+
+    def __len__(self):
+        return len(self.sites)
+
+    # -------- maintenance
+
+    def add(self, sites: pd.DataFrame) -> int:
+        """Index additional sites, merging them into the sorted grid.
+
+        Returns:
+            int: Number of sites indexed.
+        """
+        positions = sites[list(AXES)].to_numpy(dtype=np.float64)
+        placed = ~np.isnan(positions).any(axis=1)
+        self.unplaced = pd.concat([self.unplaced, sites[~placed]], ignore_index=True)
+        sites, positions = sites[placed], positions[placed]
+        codes = _cell_codes(np.floor(positions / self.cell_size))
+        order = np.argsort(codes, kind="stable")
+        at = np.searchsorted(self._codes, codes[order], side="right")
+        self._codes = np.insert(self._codes, at, codes[order])
+        self._order = np.insert(self._order, at, order + len(self.sites))
+        self._positions = np.concatenate([self._positions, positions])
+        if len(positions):
+            self._lower = np.minimum(self._lower, positions.min(axis=0))
+            self._upper = np.maximum(self._upper, positions.max(axis=0))
+        self.sites = pd.concat([self.sites, sites], ignore_index=True)
+        return len(sites)
+
+    def update(self) -> int:
+        """Index implantations inserted since the index was built.
+
+        Only the primary keys of all implantations, and the coordinates of the
+        new ones, are transferred. Implantations already seen without a
+        position are not fetched again.
+
+        Returns:
+            int: Number of sites added.
+        """
+        primary_key = surgery.Implantation.primary_key
+        keys = pd.DataFrame(
+            surgery.Implantation.Coordinate.fetch("KEY"), columns=primary_key
+        )
+        indexed = pd.MultiIndex.from_frame(
+            pd.concat([self.sites[primary_key], self.unplaced[primary_key]])
+        )
+        new_keys = keys[~pd.MultiIndex.from_frame(keys).isin(indexed)]
+        if new_keys.empty:
+            return 0
+        coordinates = Coordinates.load(new_keys.to_dict("records"))
+        return self.add(coordinates.to_dataframe(self.reference, self.offsets))
+
+    # -------- queries
+
+    def _candidates(self, lower, upper) -> np.ndarray:
+        """Site rows in the grid cells overlapping the box [lower, upper]."""
+        low = np.floor(np.asarray(lower, dtype=np.float64) / self.cell_size)
+        high = np.floor(np.asarray(upper, dtype=np.float64) / self.cell_size)
+        ap, ml = np.meshgrid(
+            np.arange(low[0], high[0] + 1), np.arange(low[1], high[1] + 1)
+        )
+        columns = np.column_stack([ap.ravel(), ml.ravel()])
+        starts = np.searchsorted(
+            self._codes,
+            _cell_codes(np.column_stack([columns, np.full(len(columns), low[2])])),
+        )
+        stops = np.searchsorted(
+            self._codes,
+            _cell_codes(np.column_stack([columns, np.full(len(columns), high[2])])),
+            side="right",
+        )
+        counts = stops - starts
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        return self._order[np.repeat(starts, counts) + offsets]
+
+    def _filter(self, rows, implant_type, hemisphere) -> np.ndarray:
+        """Rows of sites with one of the given implant types and hemispheres."""
+        for column, values in (
+            ("implant_type", _as_list(implant_type)),
+            ("target_hemisphere", _as_list(hemisphere)),
+        ):
+            if values is not None:
+                column_values = self.sites[column].to_numpy(dtype=object)[rows]
+                rows = rows[np.isin(column_values, values)]
+        return rows
+
+    def _result(self, rows, point=None) -> pd.DataFrame:
+        result = self.sites.iloc[rows].copy()
+        if point is not None:
+            result["distance"] = np.linalg.norm(
+                self._positions[rows] - np.asarray(point, dtype=np.float64), axis=1
+            )
+            result = result.sort_values("distance", kind="stable")
+        return result
+
+    def within(
+        self, point, radius: float, *, implant_type=None, hemisphere=None
+    ) -> pd.DataFrame:
+        """Sites within `radius` mm of `point`.
+
+        Args:
+            point (array-like): (ap, ml, dv) in mm.
+            radius (float): Distance in mm, e.g. 0.3 for 300 µm.
+            implant_type (str | list, optional): Implantation type(s) to keep.
+            hemisphere (str | list, optional): Target hemisphere(s) to keep.
+
+        Returns:
+            pd.DataFrame: Matching sites with a `distance` column, closest first.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        rows = self._filter(
+            self._candidates(point - radius, point + radius), implant_type, hemisphere
+        )
+        distance = np.linalg.norm(self._positions[rows] - point, axis=1)
+        return self._result(rows[distance <= radius], point)
+
+    def nearest(
+        self, point, k: int = 1, *, implant_type=None, hemisphere=None
+    ) -> pd.DataFrame:
+        """The `k` sites closest to `point`.
+
+        The search radius starts at one cell and doubles until `k` sites are
+        found within it, so only nearby cells are visited.
+
+        Returns:
+            pd.DataFrame: Up to `k` sites with a `distance` column, closest first.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        # once the search box covers every site, all candidates are known
+        extent = (
+            np.maximum(point - self._lower, self._upper - point).max()
+            if len(self)
+            else 0.0
+        )
+        radius = self.cell_size
+        while True:
+            rows = self._filter(
+                self._candidates(point - radius, point + radius),
+                implant_type,
+                hemisphere,
+            )
+            distance = np.linalg.norm(self._positions[rows] - point, axis=1)
+            inside = distance <= radius
+            if inside.sum() >= k or radius >= extent:
+                break
+            radius *= 2
+        rows = rows[np.argsort(distance, kind="stable")[:k]]
+        return self._result(rows, point)
+
+    def in_box(
+        self, lower, upper, *, implant_type=None, hemisphere=None
+    ) -> pd.DataFrame:
+        """Sites inside the axis-aligned box [lower, upper].
+
+        Args:
+            lower (array-like): Minimum (ap, ml, dv) in mm.
+            upper (array-like): Maximum (ap, ml, dv) in mm.
+
+        Returns:
+            pd.DataFrame: Matching sites.
+        """
+        lower = np.asarray(lower, dtype=np.float64)
+        upper = np.asarray(upper, dtype=np.float64)
+        rows = self._filter(self._candidates(lower, upper), implant_type, hemisphere)
+        positions = self._positions[rows]
+        inside = ((positions >= lower) & (positions <= upper)).all(axis=1)
+        return self._result(np.sort(rows[inside]))
+
+    def region_density(self, by_hemisphere: bool = False) -> pd.DataFrame:
+        """Site counts and spread per target region.
+
+        Args:
+            by_hemisphere (bool, optional): Group by hemisphere as well.
+
+        Returns:
+            pd.DataFrame: Per group, `n_sites`, the centroid (`ap`, `ml`,
+                `dv`), the root-mean-square distance of the sites from the
+                centroid (`spread`, mm) and `sites_per_mm3`, the number of
+                sites over the volume of a sphere of radius `spread`.
+        """
+        by = ["target_region"] + (["target_hemisphere"] if by_hemisphere else [])
+        frame = self.sites[by].assign(
+            **{axis: self._positions[:, i] for i, axis in enumerate(AXES)}
+        )
+        groups = frame.groupby(by, sort=True)
+        deviation = frame[list(AXES)] - groups[list(AXES)].transform("mean")
+        frame["squared"] = (deviation**2).sum(axis=1)
+
+        density = groups[list(AXES)].mean()
+        density.insert(0, "n_sites", groups.size())
+        density["spread"] = np.sqrt(frame.groupby(by, sort=True)["squared"].mean())
+        volume = 4 / 3 * np.pi * density["spread"] ** 3
+        density["sites_per_mm3"] = density["n_sites"] / volume.where(volume > 0)
+        return density.reset_index()
@@ -1,8 +1,8 @@
-import importlib
-import inspect
-
 import datajoint as dj
 
+from .activation import activate_schema, resolve_linking_module
+from .utils import insert_in_batches, to_dataframe, validate_foreign_keys
+
 schema = dj.schema()
 
 
@@ -36,16 +36,14 @@ def activate(
         User: the user associated with a particular animal
     """
 
-    if isinstance(linking_module, str):
-        linking_module = importlib.import_module(linking_module)
-    assert inspect.ismodule(
-        linking_module
-    ), "The argument 'linking_module' must be a module's name or a module"
+    linking_module = resolve_linking_module("subject", schema_name, linking_module)
 
     global _linking_module
     _linking_module = linking_module
 
-    schema.activate(
+    activate_schema(
+        "subject",
+        schema,
         schema_name,
         create_schema=create_schema,
         create_tables=create_tables,
@@ -271,6 +269,68 @@ class Subject(dj.Manual):
         subject_alias='' : varchar(32) # alias for lab if different from id.
         """
 
+    @classmethod
+    def insert_bulk(
+        cls, data, *, batch_size: int = 10000, skip_duplicates: bool = False
+    ) -> dict:
+        """Insert many subjects and their part tables in a single transaction.
+
+        `data` holds one row per animal with the attributes of `Subject` and of
+        any of its parts as columns, e.g. `species`, `line`, `strain`, `source`,
+        `lab`, `subject_alias`, `protocol` and `user`. Cells of the one-to-many
+        parts (`Protocol`, `User`, `Lab`) may hold a list of values. A part is
+        filled for the rows where all its required columns are set.
+
+        Foreign keys are checked in memory against the primary keys of the
+        referenced tables before anything is written, then the master and each
+        part are inserted as multi-row inserts of `batch_size` rows.
+
+        Args:
+            data (pd.DataFrame | pyarrow.Table | list): One row per animal.
+            batch_size (int, optional): Maximum rows per INSERT statement.
+                Defaults to 10000.
+            skip_duplicates (bool, optional): If True, silently skip rows that
+                already exist. Defaults to False.
+
+        Returns:
+            dict: Number of rows submitted per table class name.
+        """
+        frame = to_dataframe(data)
+        master = cls()
+        inserts = [(master, frame[[c for c in master.heading.names if c in frame]])]
+        for part in (
+            cls.Protocol,
+            cls.User,
+            cls.Species,
+            cls.Line,
+            cls.Strain,
+            cls.Source,
+            cls.Lab,
+        ):
+            part = part()
+            required = [
+                name
+                for name, attr in part.heading.attributes.items()
+                if attr.default is None and not attr.nullable
+            ]
+            if not all(name in frame for name in required):
+                continue
+            rows = frame[[name for name in part.heading.names if name in frame]]
+            for name in set(required) - set(master.primary_key):
+                rows = rows.explode(name)
+            inserts.append((part, rows.dropna(subset=required)))
+
+        for table, rows in inserts[1:]:
+            validate_foreign_keys(table, rows, exclude=(master.full_table_name,))
+
+        with master.connection.transaction:
+            return {
+                table.__class__.__name__: insert_in_batches(
+                    table, rows, batch_size=batch_size, skip_duplicates=skip_duplicates
+                )
+                for table, rows in inserts
+            }
+
 
 @schema
 class SubjectDeath(dj.Manual):
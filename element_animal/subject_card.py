@@ -0,0 +1,105 @@
+"""Complete subject records ("subject cards") in a single query.
+
+`subject.Subject` has one-to-one parts (`Species`, `Line`, `Strain`, `Source`)
+and one-to-many parts (`Protocol`, `User`, `Lab`). Joining them all multiplies
+rows, and querying each part costs one round trip per part. A subject card
+left-joins the one-to-one parts, collects each one-to-many part into a JSON
+array on the server, and adds the death and cull status, so any number of
+subjects is fetched with one query of one row per subject:
+
+    >>> from element_animal.subject_card import subject_cards, subject_card_query
+    >>> subject_cards({"sex": "F"}, limit=100)
+    >>> alive = subject_card_query() & "status = 'alive'"
+
+JSON_ARRAYAGG requires MySQL 5.7.22 or later.
+"""
+
+import json
+
+from . import subject
+
+# card attribute: one-to-many part collected into it
+MANY_PARTS = {
+    "protocols": subject.Subject.Protocol,
+    "users": subject.Subject.User,
+    "labs": subject.Subject.Lab,
+}
+
+_STATUS = "IF(death_date IS NULL, 'alive', IF(cull_method IS NULL, 'dead', 'culled'))"
+
+
+def _json_array(part) -> str:
+    """SQL aggregate collecting the rows of a part into a JSON array.
+
+    Parts with one attribute besides `subject` give an array of its values,
+    others an array of objects. Subjects without rows get an empty array.
+    """
+    names = [name for name in part.heading.names if name != "subject"]
+    if len(names) == 1:
+        value = f"`{names[0]}`"
+    else:
+        value = "JSON_OBJECT({})".format(
+            ", ".join(f"'{name}', `{name}`" for name in names)
+        )
+    return f"IF(COUNT(`{names[0]}`) = 0, JSON_ARRAY(), JSON_ARRAYAGG({value}))"
+
+
+def subject_card_query(restriction=None):
+    """Subject cards as a query, to be restricted or fetched in the database.
+
+    Args:
+        restriction (optional): Restriction on `subject.Subject`, applied
+            before the parts are aggregated. Defaults to all subjects.
+
+    Returns:
+        QueryExpression: One row per subject with the attributes of
+            `subject.Subject`, of its one-to-one parts (null if unset), the
+            JSON arrays of `MANY_PARTS`, `death_date`, the attributes of
+            `SubjectCull` (null if not culled) and `status` ("alive", "dead"
+            or "culled").
+    """
+    cards = subject.Subject()
+    if restriction is not None:
+        cards &= restriction
+    # aggregate each part grouped by the primary key only, so that the query is
+    # valid under ONLY_FULL_GROUP_BY, then join the one-row-per-subject results
+    keys = cards.proj()
+    for name, part in MANY_PARTS.items():
+        cards = cards * keys.aggr(part, keep_all_rows=True, **{name: _json_array(part)})
+    for part in (
+        subject.Subject.Species,
+        subject.Subject.Line,
+        subject.Subject.Strain,
+        subject.Subject.Source,
+        subject.SubjectDeath,
+        subject.SubjectCull,
+    ):
+        cards = cards.join(part, left=True)
+    return cards.proj(..., status=_STATUS)
+
+
+def subject_cards(
+    restriction=None, *, order_by="subject", limit: int = None, offset: int = None
+) -> list:
+    """Complete records of the subjects matching `restriction`, in one query.
+
+    Args:
+        restriction (optional): Restriction on `subject.Subject`. Defaults to
+            all subjects.
+        order_by (str | list, optional): Card attributes to sort by. Defaults
+            to "subject".
+        limit (int, optional): Maximum number of cards, e.g. one page.
+        offset (int, optional): Cards to skip before the first one returned.
+
+    Returns:
+        list: One dict per subject, as described in `subject_card_query`, with
+            the one-to-many parts decoded into sorted lists.
+    """
+    cards = subject_card_query(restriction).fetch(
+        as_dict=True, order_by=order_by, limit=limit, offset=offset
+    )
+    for card in cards:
+        for name in MANY_PARTS:
+            values = json.loads(card[name]) if card[name] else []
+            card[name] = sorted(values, key=json.dumps)
+    return cards
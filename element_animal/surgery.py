@@ -1,9 +1,7 @@
-import importlib
-import inspect
-
 import datajoint as dj
 
 from . import subject
+from .activation import activate_schema, resolve_linking_module
 
 schema = dj.Schema()
 
@@ -35,11 +33,9 @@ def activate(
         User: the who conducted a particular surgery/implantation
     """
 
-    if isinstance(linking_module, str):
-        linking_module = importlib.import_module(linking_module)
-    assert inspect.ismodule(
-        linking_module
-    ), "The argument 'linking_module' must be a module's name or a module"
+    linking_module = resolve_linking_module(
+        "surgery", surgery_schema_name, linking_module
+    )
 
     global _linking_module
     _linking_module = linking_module
@@ -50,7 +46,9 @@ def activate(
         create_tables=create_tables,
         linking_module=linking_module,
     )
-    schema.activate(
+    activate_schema(
+        "surgery",
+        schema,
         surgery_schema_name,
         create_schema=create_schema,
         create_tables=create_tables,
@@ -90,6 +88,46 @@ class BrainRegion(dj.Manual):
     """
 
 
+@schema
+class BrainRegionParent(dj.Manual):
+    """Parent of a brain region in a region hierarchy
+
+    Attributes:
+        BrainRegion (foreign key): BrainRegion primary key.
+        parent_acronym ( projected attribute, varchar(32), nullable ): Parent
+        brain region shorthand; null for the root.
+    """
+
+    definition = """
+    -> BrainRegion
+    ---
+    -> [nullable] BrainRegion.proj(parent_acronym='region_acronym')
+    """
+
+
+@schema
+class BrainRegionAncestry(dj.Manual):
+    """Transitive closure of the brain region hierarchy
+
+    One entry per (ancestor, descendant) pair, including each region as its own
+    ancestor at depth 0, so that the subtree of a region is a single indexed
+    restriction on `ancestor`.
+
+    Attributes:
+        ancestor ( projected attribute, varchar(32) ): Ancestor region shorthand.
+        descendant ( projected attribute, varchar(32) ): Descendant region
+        shorthand.
+        depth ( smallint unsigned ): Levels from ancestor to descendant.
+    """
+
+    definition = """
+    -> BrainRegion.proj(ancestor='region_acronym')
+    -> BrainRegion.proj(descendant='region_acronym')
+    ---
+    depth : smallint unsigned  # levels from ancestor to descendant; 0 for itself
+    """
+
+
 @schema
 class Hemisphere(dj.Lookup):
     """Brain region hemisphere
@@ -0,0 +1,126 @@
+"""Helpers shared by the bulk ingestion and query utilities of element-animal."""
+
+import sys
+
+import datajoint as dj
+import pandas as pd
+
+
+def element_tables() -> dict:
+    """Tables of the activated element-animal modules, parts included.
+
+    Returns:
+        dict: Labels such as "subject.Subject.Lab" to table classes, in the
+            order the modules and tables were defined.
+    """
+    tables = {}
+    for module_name, module in list(sys.modules.items()):
+        schema = getattr(module, "schema", None)
+        if (
+            not module_name.startswith("element_animal.")
+            or not isinstance(schema, dj.Schema)
+            or schema.database is None
+        ):
+            continue
+        label = module_name.rsplit(".", 1)[-1]
+        for name, table in vars(module).items():
+            if not (isinstance(table, type) and issubclass(table, dj.Table)):
+                continue
+            if getattr(table, "database", None) != schema.database:
+                continue
+            tables[f"{label}.{name}"] = table
+            for part_name, part in vars(table).items():
+                if isinstance(part, type) and issubclass(part, dj.Part):
+                    tables[f"{label}.{name}.{part_name}"] = part
+    return tables
+
+
+def to_dataframe(data) -> pd.DataFrame:
+    """Convert tabular input into a pandas DataFrame.
+
+    Args:
+        data (pd.DataFrame | pyarrow.Table | list | dict): A DataFrame, an Arrow
+            table (or any object with a `to_pandas` method), a list of row dicts
+            or a dict of columns.
+
+    Returns:
+        pd.DataFrame: The input as a DataFrame; DataFrames are returned as is.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    if hasattr(data, "to_pandas"):
+        return data.to_pandas()
+    return pd.DataFrame(data)
+
+
+def to_records(frame: pd.DataFrame) -> list:
+    """Rows of `frame` as dicts, with missing values as None."""
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def insert_in_batches(table, frame: pd.DataFrame, *, batch_size: int, **kwargs) -> int:
+    """Insert `frame` into `table` as multi-row inserts of `batch_size` rows.
+
+    Args:
+        table (dj.Table): Table to insert into.
+        frame (pd.DataFrame): Rows to insert, one column per attribute.
+        batch_size (int): Maximum number of rows per INSERT statement.
+        **kwargs: Keyword arguments passed to `table.insert`.
+
+    Returns:
+        int: Number of rows submitted.
+    """
+    for start in range(0, len(frame), batch_size):
+        table.insert(to_records(frame.iloc[start : start + batch_size]), **kwargs)
+    return len(frame)
+
+
+def _parent_primary_keys(parent) -> pd.DataFrame:
+    """Primary keys of a parent table, from the Lookup cache when it holds them."""
+    from .cache import get_lookup_cache
+
+    lookup_cache = get_lookup_cache()
+    if lookup_cache is not None:
+        for table in lookup_cache.tables:
+            if table.database and table.full_table_name == parent.full_table_name:
+                return pd.DataFrame(
+                    list(lookup_cache.primary_keys(table)), columns=table.primary_key
+                )
+    return pd.DataFrame(parent.fetch("KEY"), columns=parent.primary_key)
+
+
+def validate_foreign_keys(table, frame: pd.DataFrame, *, exclude=()):
+    """Check in memory that rows of `frame` reference existing parent entries.
+
+    Each parent of `table` is read once, as its primary keys only, and the
+    foreign-key columns of `frame` are matched against it in one vectorized
+    operation. Rows with a null foreign key are not checked.
+
+    Args:
+        table (dj.Table): Table that `frame` will be inserted into.
+        frame (pd.DataFrame): Rows to validate.
+        exclude (iterable, optional): Full names of parent tables to skip, e.g.
+            masters inserted in the same transaction.
+
+    Raises:
+        dj.DataJointError: If a row references a missing parent entry.
+    """
+    for parent, props in table.parents(as_objects=True, foreign_key_info=True):
+        if parent.full_table_name in exclude:
+            continue
+        attr_map = props["attr_map"]
+        child_attrs = [attr for attr in attr_map if attr in frame]
+        if len(child_attrs) < len(attr_map):
+            continue
+        fk_values = frame[child_attrs].dropna().drop_duplicates()
+        parent_keys = _parent_primary_keys(parent)[[attr_map[a] for a in child_attrs]]
+        is_valid = pd.MultiIndex.from_frame(fk_values).isin(
+            pd.MultiIndex.from_frame(parent_keys)
+        )
+        if not is_valid.all():
+            missing = fk_values[~is_valid].head(5).to_dict("records")
+            raise dj.DataJointError(
+                f"{(~is_valid).sum()} value(s) of {child_attrs} in "
+                f"{table.full_table_name} are missing from "
+                f"{parent.full_table_name}, e.g. {missing}"
+            )
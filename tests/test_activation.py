@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import datajoint as dj
+import pytest
+
+from element_animal import activation
+
+
+def table(name):
+    return type(name, (dj.Manual,), {"definition": "id : int"})
+
+
+LINKED = {"Lab": table("Lab"), "__name__": "linking_module"}
+
+
+class Schema:
+    """Records the activations that reach DataJoint."""
+
+    def __init__(self):
+        self.connection = SimpleNamespace(
+            conn_info={"host": "localhost", "port": 3306, "user": "root"}
+        )
+        self.database = None
+        self.calls = 0
+
+    def activate(self, schema_name, **kwargs):
+        self.database = schema_name
+        self.calls += 1
+
+
+@pytest.fixture
+def schema():
+    activation.reset_activation_registry()
+    yield Schema()
+    activation.reset_activation_registry()
+
+
+def activate(schema, schema_name="lab_subject", **kwargs):
+    arguments = dict(create_schema=True, create_tables=True, add_objects=LINKED)
+    activation.activate_schema(
+        "subject", schema, schema_name, **{**arguments, **kwargs}
+    )
+
+
+def test_second_activation_is_skipped(schema):
+    activate(schema)
+    activate(schema)
+    activate(schema, None)
+    activate(schema, create_tables=False)
+    assert schema.calls == 1
+    timings = activation.activation_timings()
+    assert list(timings.skipped) == [False, True, True, True]
+
+
+def test_create_tables_after_activation_without_tables(schema):
+    activate(schema, create_tables=False)
+    with pytest.warns(UserWarning, match="create_tables"):
+        activate(schema, create_tables=True)
+    assert schema.calls == 1
+
+
+def test_other_linked_objects(schema, recwarn):
+    activate(schema)
+    activate(schema, add_objects=dict(LINKED))
+    activate(schema, add_objects={**LINKED, "__name__": "other", "Source": table("S")})
+    assert not recwarn.list
+    with pytest.warns(UserWarning, match=r"\['Lab'\]"):
+        activate(schema, add_objects={"Lab": table("Lab")})
+    assert schema.calls == 1
+
+
+def test_other_schema_name_is_activated(schema):
+    activate(schema)
+    activate(schema, "other_subject")
+    assert schema.calls == 2
@@ -0,0 +1,103 @@
+import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from element_animal import age
+
+
+class Query:
+    """Records the operations applied to a table."""
+
+    def __init__(self, operations=()):
+        self.operations = list(operations)
+
+    def _with(self, *operation):
+        return Query(self.operations + [operation])
+
+    def __and__(self, restriction):
+        return self._with("&", restriction)
+
+    def __sub__(self, other):
+        return self._with("-", other.operations[0][1])
+
+    def __mul__(self, other):
+        return self._with("*", other.operations[0][1])
+
+    def join(self, other, left=False):
+        return self._with("join", other.operations[0][1], left)
+
+    def proj(self, *attributes, **computed):
+        return self._with("proj", attributes, computed)
+
+
+@pytest.fixture(autouse=True)
+def tables(monkeypatch):
+    def table(name):
+        return Query([("table", name)])
+
+    monkeypatch.setattr(
+        age,
+        "subject",
+        SimpleNamespace(Subject=table("Subject"), SubjectDeath=table("SubjectDeath")),
+    )
+    monkeypatch.setattr(
+        age, "surgery", SimpleNamespace(Implantation=table("Implantation"))
+    )
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2024-03-01",
+        datetime.date(2024, 3, 1),
+        datetime.datetime(2024, 3, 1, 23, 59),
+        pd.Timestamp("2024-03-01T08:00"),
+        np.datetime64("2024-03-01"),
+    ],
+)
+def test_sql_date(value):
+    assert age._sql_date(value) == "2024-03-01"
+
+
+def test_age_at_implantation_restricts_before_joining():
+    query = age.age_at_implantation({"subject": "M1"})
+    assert query.operations == [
+        ("table", "Implantation"),
+        ("&", {"subject": "M1"}),
+        ("*", "Subject"),
+        ("proj", (), {"age_days": "DATEDIFF(implant_date, subject_birth_date)"}),
+    ]
+
+
+def test_age_on_keeps_subjects_alive_on_the_day():
+    query = age.age_on(datetime.datetime(2024, 3, 1, 12))
+    assert query.operations == [
+        ("table", "Subject"),
+        ("join", "SubjectDeath", True),
+        ("&", "subject_birth_date <= '2024-03-01'"),
+        ("&", "death_date IS NULL OR death_date >= '2024-03-01'"),
+        ("proj", (), {"age_days": "DATEDIFF('2024-03-01', subject_birth_date)"}),
+    ]
+
+
+def test_current_age_excludes_deceased_subjects():
+    operations = age.current_age().operations
+    assert operations[1] == ("-", "SubjectDeath")
+    assert operations[2][2] == {"age_days": "DATEDIFF(CURDATE(), subject_birth_date)"}
+
+
+def test_restrict_age():
+    query = Query()
+    assert age.restrict_age(query).operations == []
+    assert age.restrict_age(query, 60, 90.9).operations == [
+        ("&", "age_days >= 60"),
+        ("&", "age_days <= 90"),
+    ]
+    assert age.restrict_age(query, max_days="21").operations == [
+        ("&", "age_days <= 21")
+    ]
+    with pytest.raises(ValueError):
+        age.restrict_age(query, "60; DROP TABLE subject")
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from element_animal.aio import AsyncReader, ReaderOverloaded
+
+
+class Database:
+    """Connections and reads that block until released."""
+
+    def __init__(self):
+        self.connections = []
+        self.reads = []
+        self.release = threading.Event()
+
+    def connect(self):
+        connection = SimpleNamespace(closed=False)
+        connection.close = lambda: setattr(connection, "closed", True)
+        self.connections.append(connection)
+        return connection
+
+    def read(self, session, subject_id):
+        self.reads.append((session.connection, subject_id))
+        self.release.wait(5)
+        return {"subject": subject_id}
+
+
+async def started(database, count):
+    while len(database.reads) < count:
+        await asyncio.sleep(0.001)
+
+
+def test_identical_requests_share_one_read():
+    database = Database()
+
+    async def main():
+        async with AsyncReader(pool_size=2, connect=database.connect) as reader:
+            requests = [
+                asyncio.ensure_future(reader._request(database.read, name))
+                for name in ("M1", "M1", "M2", "M1")
+            ]
+            await started(database, 2)
+            assert reader.pending == 2
+            database.release.set()
+            results = await asyncio.gather(*requests)
+            assert reader.pending == 0
+        return results
+
+    results = asyncio.run(main())
+    assert results[0] is results[1] is results[3]
+    assert results[2] == {"subject": "M2"}
+    assert sorted(subject_id for _, subject_id in database.reads) == ["M1", "M2"]
+    assert len(database.connections) == 2
+    assert all(connection.closed for connection in database.connections)
+
+
+def test_requests_beyond_the_limit_are_rejected():
+    database = Database()
+
+    async def main():
+        async with AsyncReader(max_pending=1, connect=database.connect) as reader:
+            first = asyncio.ensure_future(reader._request(database.read, "M1"))
+            await started(database, 1)
+            shared = asyncio.ensure_future(reader._request(database.read, "M1"))
+            with pytest.raises(ReaderOverloaded):
+                await reader._request(database.read, "M2")
+            database.release.set()
+            await asyncio.gather(first, shared)
+            # accepted again once the pending request completed
+            return await reader._request(database.read, "M2")
+
+    assert asyncio.run(main()) == {"subject": "M2"}
+
+
+def test_cancelled_caller_does_not_cancel_shared_read():
+    database = Database()
+
+    async def main():
+        async with AsyncReader(connect=database.connect) as reader:
+            first = asyncio.ensure_future(reader._request(database.read, "M1"))
+            second = asyncio.ensure_future(reader._request(database.read, "M1"))
+            await started(database, 1)
+            first.cancel()
+            database.release.set()
+            return await second, first.cancelled()
+
+    assert asyncio.run(main()) == ({"subject": "M1"}, True)
+
+
+def test_connections_are_reused():
+    database = Database()
+    database.release.set()
+
+    async def main():
+        async with AsyncReader(pool_size=2, connect=database.connect) as reader:
+            for name in ("M1", "M2", "M3", "M4"):
+                await reader._request(database.read, name)
+
+    asyncio.run(main())
+    assert len(database.connections) == 1
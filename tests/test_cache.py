@@ -0,0 +1,86 @@
+import pytest
+
+from element_animal import cache
+from element_animal.cache import LookupCache
+
+
+def make_table(name, values):
+    """A stand-in for a Lookup table that counts its fetches."""
+
+    class Table:
+        primary_key = ["name"]
+        full_table_name = f"`lab`.`#{name.lower()}`"
+        fetches = 0
+        inserted = []
+
+        @classmethod
+        def fetch(cls, as_dict):
+            cls.fetches += 1
+            return [{"name": value, "size": len(value)} for value in values]
+
+        @classmethod
+        def insert(cls, rows, **kwargs):
+            cls.inserted.extend(rows)
+
+    Table.__name__ = name
+    return Table
+
+
+@pytest.fixture
+def species():
+    return make_table("Species", ["Mus musculus", "Rattus norvegicus"])
+
+
+def test_rows_are_loaded_once(species):
+    lookup_cache = LookupCache([species])
+    assert lookup_cache.get(species, "Mus musculus")["size"] == 12
+    assert lookup_cache.get(species, {"name": "Rattus norvegicus"}) is not None
+    assert lookup_cache.get(species, ("Danio rerio",), default="none") == "none"
+    assert lookup_cache.contains(species(), "Mus musculus")
+    assert lookup_cache.primary_keys(species) == {
+        ("Mus musculus",),
+        ("Rattus norvegicus",),
+    }
+    assert species.fetches == 1
+    stats = lookup_cache.stats()[species.full_table_name]
+    assert (stats.misses, stats.hits) == (1, 4)
+
+
+def test_uncacheable_table(species):
+    with pytest.raises(KeyError):
+        LookupCache([species]).get(make_table("Subject", []), "M1")
+
+
+def test_ttl(species, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lookup_cache = LookupCache([species], ttl=10)
+    lookup_cache.fetch(species)
+    now[0] += 5
+    lookup_cache.fetch(species)
+    assert species.fetches == 1
+    now[0] += 10
+    lookup_cache.fetch(species)
+    assert species.fetches == 2
+    assert lookup_cache.stats()[species.full_table_name].evictions == 1
+
+
+def test_least_recently_used_table_is_evicted(species):
+    strain, line = make_table("Strain", ["C57BL/6"]), make_table("Line", ["Ai14"])
+    lookup_cache = LookupCache([species, strain, line], maxsize=2)
+    lookup_cache.fetch(species)
+    lookup_cache.fetch(strain)
+    lookup_cache.fetch(species)
+    lookup_cache.fetch(line)  # evicts strain
+    lookup_cache.fetch(species)
+    lookup_cache.fetch(strain)
+    assert (species.fetches, strain.fetches, line.fetches) == (1, 2, 1)
+
+
+def test_insert_invalidates(species):
+    lookup_cache = LookupCache([species])
+    lookup_cache.fetch(species)
+    lookup_cache.insert(species, [{"name": "Danio rerio"}], skip_duplicates=True)
+    lookup_cache.fetch(species)
+    assert species.inserted == [{"name": "Danio rerio"}]
+    assert species.fetches == 2
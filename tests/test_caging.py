@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from element_animal.caging import CageOccupancy
+
+
+@pytest.fixture
+def occupancy():
+    caging = pd.DataFrame(
+        [
+            ("M1", "C1", "2024-01-01 00:00"),
+            ("M1", "C2", "2024-01-10 00:00"),
+            ("M2", "C1", "2024-01-05 00:00"),
+            ("M3", "C2", "2024-01-02 00:00"),
+        ],
+        columns=["subject", "cage", "caging_datetime"],
+    )
+    deaths = pd.DataFrame({"subject": ["M2"], "death_date": ["2024-01-20"]})
+    return CageOccupancy(caging, deaths)
+
+
+def test_intervals(occupancy):
+    intervals = occupancy.intervals.set_index(["subject", "cage"])
+    assert intervals.loc[("M1", "C1"), "end"] == pd.Timestamp("2024-01-10")
+    assert intervals.loc[("M2", "C1"), "end"] == pd.Timestamp("2024-01-20")
+    assert pd.isna(intervals.loc[("M3", "C2"), "end"])
+
+
+@pytest.mark.parametrize(
+    "cage, at, expected",
+    [
+        ("C1", "2023-12-31", []),
+        ("C1", "2024-01-03", ["M1"]),
+        ("C1", "2024-01-07", ["M1", "M2"]),
+        ("C1", "2024-01-10 00:00", ["M2"]),
+        ("C1", "2024-01-21", []),
+        ("C2", "2024-01-12", ["M1", "M3"]),
+        ("C2", "2030-01-01", ["M1", "M3"]),
+        ("C9", "2024-01-12", []),
+    ],
+)
+def test_occupants(occupancy, cage, at, expected):
+    assert occupancy.occupants(cage, at) == expected
+
+
+def test_occupants_between(occupancy):
+    assert occupancy.occupants_between("C1", "2024-01-01", "2024-01-06") == [
+        "M1",
+        "M2",
+    ]
+    assert occupancy.occupants_between("C1", "2024-01-11", "2024-01-12") == ["M2"]
+    assert occupancy.occupants_between("C2", "2024-01-01", "2024-01-02") == []
+    assert occupancy.occupants_between("C1", "2024-01-06", "2024-01-06") == []
+
+
+def test_queries_match_brute_force():
+    rng = np.random.default_rng(1)
+    events = pd.DataFrame(
+        {
+            "subject": rng.choice([f"M{i}" for i in range(30)], 200),
+            "cage": rng.choice([f"C{i}" for i in range(8)], 200),
+            "caging_datetime": pd.Timestamp("2024-01-01")
+            + pd.to_timedelta(rng.integers(0, 90 * 24, 200), unit="h"),
+        }
+    ).drop_duplicates(["subject", "caging_datetime"])
+    occupancy = CageOccupancy(events)
+    timestamps = pd.date_range("2023-12-25", periods=20, freq="5D")
+
+    intervals = occupancy.intervals
+    counts = occupancy.occupancy_counts(timestamps)
+    occupants = occupancy.occupancy(timestamps)
+    for cage in counts.index:
+        for timestamp in timestamps:
+            is_in = (
+                (intervals.cage == cage)
+                & (intervals.start <= timestamp)
+                & (intervals.end.isna() | (intervals.end > timestamp))
+            )
+            expected = sorted(intervals.subject[is_in])
+            assert occupancy.occupants(cage, timestamp) == expected
+            assert counts.loc[cage, timestamp] == len(expected)
+            listed = occupants[
+                (occupants.cage == cage) & (occupants.timestamp == timestamp)
+            ]
+            assert sorted(listed.subject) == expected
@@ -0,0 +1,59 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+from element_animal import census
+
+CAGES = {"M1": "C1", "M2": "C2", "M3": "C1", "M4": "C3", "M5": "C3"}
+
+
+class Census:
+    """Census entries by subject, standing in for `SubjectCensus`."""
+
+    connection = SimpleNamespace(transaction=nullcontext())
+
+    def __init__(self, entries):
+        self.entries = dict(entries)
+        self.batches = []
+
+    def __and__(self, keys):
+        subjects = [key["subject"] for key in keys]
+        self.batches.append(subjects)
+
+        def delete_quick():
+            for name in subjects:
+                self.entries.pop(name, None)
+
+        return SimpleNamespace(delete_quick=delete_quick)
+
+    def insert(self, rows, allow_direct_insert=False):
+        assert allow_direct_insert
+        self.entries.update((row["subject"], row["cage"]) for row in rows)
+
+
+class Subjects:
+    """Subjects, of which those missing from the census are fetched."""
+
+    def __sub__(self, table):
+        missing = [name for name in CAGES if name not in table.entries]
+        return SimpleNamespace(fetch=lambda attribute: missing)
+
+
+def current_census(keys):
+    rows = [{"subject": key["subject"], "cage": CAGES[key["subject"]]} for key in keys]
+    return SimpleNamespace(fetch=lambda as_dict: rows)
+
+
+def test_refresh_recomputes_stale_and_new_subjects(monkeypatch):
+    table = Census({"M1": "C1", "M2": "C1", "M3": "C9"})
+    monkeypatch.setattr(census, "SubjectCensus", table)
+    monkeypatch.setattr(census, "subject", SimpleNamespace(Subject=Subjects()))
+    monkeypatch.setattr(census, "_stale_subjects", lambda: {"M3", "M2"})
+    monkeypatch.setattr(census, "_current_census", current_census)
+
+    assert census.refresh_census(batch_size=3) == {"added": 2, "updated": 2}
+    assert table.batches == [["M2", "M3", "M4"], ["M5"]]
+    assert table.entries == CAGES
+
+    monkeypatch.setattr(census, "_stale_subjects", set)
+    assert census.refresh_census() == {"added": 0, "updated": 0}
+    assert table.batches[2:] == []
@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from element_animal import coordinates as coordinates_module
+from element_animal.coordinates import Coordinates, ReferenceOffsets
+
+
+@pytest.fixture
+def coordinates(monkeypatch):
+    monkeypatch.setattr(
+        coordinates_module,
+        "surgery",
+        SimpleNamespace(Implantation=SimpleNamespace(primary_key=["subject"])),
+    )
+    return Coordinates(
+        pd.DataFrame(
+            {
+                "subject": ["M1", "M2", "M3"],
+                "ap": [-1.0, 2.0, 0.5],
+                "ap_ref": ["bregma", "lambda", "bregma"],
+                "ml": [1.0, 0.5, -1.0],
+                "ml_ref": ["bregma", "sagittal_suture", "bregma"],
+                "dv": [-2.0, -1.0, -0.5],
+                "dv_ref": ["bregma", "bregma", "dura"],
+                "theta": [0.0, 90.0, None],
+                "phi": [None, 90.0, None],
+                "beta": [None, None, None],
+            }
+        )
+    )
+
+
+def test_default_offsets():
+    offsets = ReferenceOffsets()
+    np.testing.assert_allclose(
+        offsets.lookup(["M1", "M1"], ["bregma", "lambda"]),
+        [[0, 0, 0], [-4.2, 0, 0]],
+    )
+    assert np.isnan(offsets.lookup(["M1"], ["dura"])).all()
+    assert np.isnan(offsets.lookup(["M1"], ["unknown"])).all()
+
+
+def test_subject_offsets_take_precedence():
+    offsets = ReferenceOffsets()
+    offsets.set(
+        pd.DataFrame(
+            {
+                "subject": ["M1"],
+                "reference": ["lambda"],
+                "ap": [-4.5],
+                "ml": [np.nan],
+                "dv": [0.1],
+            }
+        )
+    )
+    np.testing.assert_allclose(
+        offsets.lookup(["M1", "M2"], ["lambda", "lambda"]),
+        [[-4.5, 0, 0.1], [-4.2, 0, 0]],
+    )
+
+
+def test_loader_is_called_once_per_subject():
+    requested = []
+
+    def loader(subjects):
+        requested.append(list(subjects))
+        return pd.DataFrame(
+            {
+                "subject": subjects,
+                "reference": "dura",
+                "ap": np.nan,
+                "ml": np.nan,
+                "dv": -0.3,
+            }
+        )
+
+    offsets = ReferenceOffsets(loader=loader)
+    assert offsets.lookup(["M1", "M1"], ["dura", "dura"])[:, 2].tolist() == [
+        -0.3,
+        -0.3,
+    ]
+    offsets.lookup(["M1", "M2"], ["dura", "dura"])
+    assert requested == [["M1"], ["M2"]]
+
+
+def test_positions(coordinates):
+    positions = coordinates.positions("bregma")
+    np.testing.assert_allclose(positions[0], [-1.0, 1.0, -2.0])
+    np.testing.assert_allclose(positions[1], [2.0 - 4.2, 0.5, -1.0])
+    # the dura has no default position
+    assert np.isnan(positions[2, 2])
+
+    in_lambda = coordinates.positions("lambda")
+    np.testing.assert_allclose(in_lambda[0], [-1.0 + 4.2, 1.0, -2.0])
+
+
+def test_positions_with_measured_offsets(coordinates):
+    offsets = ReferenceOffsets()
+    offsets.set(
+        pd.DataFrame(
+            {"subject": ["M3"], "reference": ["dura"], "ap": 0, "ml": 0, "dv": -0.2}
+        )
+    )
+    assert coordinates.positions("bregma", offsets)[2, 2] == pytest.approx(-0.7)
+
+
+def test_unit_vectors_and_endpoints(coordinates):
+    vectors = coordinates.unit_vectors()
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    np.testing.assert_allclose(vectors[0], [0, 0, 1], atol=1e-12)
+    np.testing.assert_allclose(vectors[1], [1, 0, 0], atol=1e-12)
+
+    tips = coordinates.trajectory_endpoints(depth=[1.0, 2.0, 0.0])
+    np.testing.assert_allclose(tips[0], [-1.0, 1.0, -3.0])
+    np.testing.assert_allclose(tips[1], [2.0 - 4.2 - 2.0, 0.5, -1.0], atol=1e-12)
+
+
+def test_to_dataframe(coordinates):
+    frame = coordinates.to_dataframe("bregma")
+    assert list(frame.columns) == ["subject", "ap", "ml", "dv", "reference"]
+    assert (frame.reference == "bregma").all()
@@ -0,0 +1,59 @@
+import pandas as pd
+
+from element_animal.genotype_calling import REASONS, _call, _pool_tests
+
+ALLELE_SEQUENCES = pd.DataFrame(
+    [("Cre", "cre-1"), ("Cre", "cre-2"), ("GFP", "gfp-1")],
+    columns=["allele", "sequence"],
+)
+
+
+def call(*tests):
+    tests = pd.DataFrame(list(tests), columns=["subject", "sequence", "test_result"])
+    called = _call(_pool_tests(tests), ALLELE_SEQUENCES)
+    return {
+        (row.subject, row.allele): row.zygosity or row.reason
+        for row in called.itertuples()
+    }
+
+
+def test_pool_repeated_tests():
+    tests = pd.DataFrame(
+        [
+            ("M1", "cre-1", "Present"),
+            ("M1", "cre-1", "Present"),
+            ("M1", "cre-2", "Present"),
+            ("M1", "cre-2", "Absent"),
+        ],
+        columns=["subject", "sequence", "test_result"],
+    )
+    pooled = _pool_tests(tests).set_index(["subject", "sequence"])["result"]
+    assert pooled.to_dict() == {
+        ("M1", "cre-1"): "Present",
+        ("M1", "cre-2"): "Conflict",
+    }
+
+
+def test_all_sequences_agree():
+    assert call(
+        ("M1", "cre-1", "Present"),
+        ("M1", "cre-2", "Present"),
+        ("M1", "gfp-1", "Absent"),
+    ) == {("M1", "Cre"): "Present", ("M1", "GFP"): "Absent"}
+
+
+def test_unresolved_reasons():
+    calls = call(
+        ("M1", "cre-1", "Present"),
+        ("M1", "cre-1", "Absent"),
+        ("M1", "cre-2", "Present"),
+        ("M2", "cre-1", "Present"),
+        ("M2", "cre-2", "Absent"),
+        ("M3", "cre-1", "Present"),
+    )
+    assert calls == {
+        ("M1", "Cre"): "repeated_tests",
+        ("M2", "Cre"): "mixed_sequences",
+        ("M3", "Cre"): "missing_sequences",
+    }
+    assert set(calls.values()) <= set(REASONS)
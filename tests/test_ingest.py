@@ -0,0 +1,136 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import datajoint as dj
+import numpy as np
+import pandas as pd
+import pytest
+
+from element_animal.ingest import (
+    _check_angles,
+    _check_required,
+    _unique_rows,
+    _file_chunks,
+    _write_checkpoint,
+    import_colony_file,
+)
+
+
+def attribute(numeric=False, nullable=False, default=None):
+    return SimpleNamespace(numeric=numeric, nullable=nullable, default=default)
+
+
+COORDINATE = SimpleNamespace(
+    full_table_name="`surgery`.`_implantation__coordinate`",
+    heading=SimpleNamespace(
+        attributes={
+            "subject": attribute(),
+            "ap": attribute(numeric=True, nullable=True, default="null"),
+            "ap_ref": attribute(nullable=True, default="null"),
+            "theta": attribute(numeric=True, nullable=True, default="null"),
+        }
+    ),
+)
+
+
+def test_valid_rows_pass():
+    frame = pd.DataFrame(
+        {"subject": ["A", "B"], "ap": [1.5, None], "ap_ref": ["bregma", None]}
+    )
+    _check_required(COORDINATE, frame)
+
+
+def test_missing_column():
+    with pytest.raises(dj.DataJointError, match="required"):
+        _check_required(COORDINATE, pd.DataFrame({"ap": [1.0]}))
+
+
+def test_missing_value():
+    frame = pd.DataFrame({"subject": ["A", None], "ap": [1.0, 2.0]})
+    with pytest.raises(dj.DataJointError, match=r"rows \[1\]"):
+        _check_required(COORDINATE, frame)
+
+
+@pytest.mark.parametrize("bad", ["1.2 mm", np.inf])
+def test_coordinates_must_be_finite_numbers(bad):
+    frame = pd.DataFrame({"subject": ["A", "B", "C"], "ap": [1.0, bad, None]})
+    with pytest.raises(dj.DataJointError, match=r"finite number: rows \[1\]"):
+        _check_required(COORDINATE, frame)
+
+
+def test_angle_ranges():
+    frame = pd.DataFrame(
+        {"theta": [10, 200, None], "phi": [0, 10, 400], "beta": [-190, 0, 0]}
+    )
+    with pytest.raises(dj.DataJointError) as error:
+        _check_angles(frame)
+    message = str(error.value)
+    assert "theta outside [0, 180] in 1 row(s): rows [1]" in message
+    assert "phi outside [0, 360] in 1 row(s): rows [2]" in message
+    assert "beta outside [-180, 180] in 1 row(s): rows [0]" in message
+    _check_angles(frame.iloc[:0])
+
+
+def test_conflicting_rows_are_rejected():
+    table = SimpleNamespace(
+        primary_key=["subject", "implant_date"],
+        full_table_name=COORDINATE.full_table_name,
+    )
+    frame = pd.DataFrame(
+        {
+            "subject": ["A", "A", "B", "B", "C"],
+            "implant_date": ["2024-01-01"] * 5,
+            "ap": [1.0, 1.0, 2.0, 2.5, np.nan],
+        }
+    )
+    with pytest.raises(dj.DataJointError) as error:
+        _unique_rows(table, frame)
+    message = str(error.value)
+    assert "for 1 key(s): rows [2, 3]" in message
+    assert "{'subject': 'B', 'implant_date': '2024-01-01'}" in message
+    unique = _unique_rows(table, frame.drop(index=3))
+    assert list(unique.subject) == ["A", "B", "C"]
+
+
+def write_row_groups(path, sizes):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    start = 0
+    schema = pa.schema([("subject", pa.string()), ("n", pa.int64())])
+    with pq.ParquetWriter(path, schema) as writer:
+        for size in sizes:
+            numbers = list(range(start, start + size))
+            writer.write_table(
+                pa.table({"subject": [f"S{n}" for n in numbers], "n": numbers}),
+                row_group_size=size,
+            )
+            start += size
+
+
+@pytest.mark.parametrize("skip_rows", [0, 50, 100, 150, 205, 210])
+def test_parquet_chunks_resume_across_uneven_row_groups(tmp_path, skip_rows):
+    path = tmp_path / "colony.parquet"
+    write_row_groups(path, [100, 100, 10])
+    chunks = list(_file_chunks(path, "parquet", 30, skip_rows))
+    numbers = [n for chunk in chunks for n in chunk["n"]]
+    assert numbers == list(range(skip_rows, 210))
+
+
+def test_import_resumes_from_checkpoint(tmp_path):
+    path = tmp_path / "colony.parquet"
+    write_row_groups(path, [100, 100, 10])
+    inserted = []
+    table = SimpleNamespace(
+        heading=SimpleNamespace(names=["subject", "n"]),
+        insert=lambda rows, **kwargs: inserted.extend(rows),
+    )
+    stat = path.stat()
+    _write_checkpoint(
+        Path(f"{path}.checkpoint.json"),
+        {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+        50,
+    )
+    assert import_colony_file(path, table, chunk_size=40) == 160
+    assert [row["n"] for row in inserted] == list(range(50, 210))
+    assert import_colony_file(path, table) == 0
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import datajoint as dj
+import numpy as np
+import pandas as pd
+import pytest
+
+from element_animal import injection
+from element_animal.injection import _doses, parse_titer
+
+
+@pytest.mark.parametrize(
+    "titer, expected",
+    [
+        ("1.2e13", 1.2e13),
+        ("1.2E+13", 1.2e13),
+        ("1.2 x 10^13", 1.2e13),
+        ("1.2×10**13", 1.2e13),
+        ("2e12 GC/ml", 2e12),
+        ("5e9 vg/ul", 5e12),
+        (".5e10 gc/µl", 5e12),
+        ("7", 7.0),
+    ],
+)
+def test_parse_titer(titer, expected):
+    assert parse_titer([titer])[0] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("titer", ["", "high", "1e13 per mouse", None])
+def test_unparsable_titer_is_nan(titer):
+    assert np.isnan(parse_titer([titer])[0])
+
+
+@pytest.fixture
+def injections(monkeypatch):
+    monkeypatch.setattr(
+        injection, "Injection", SimpleNamespace(primary_key=["subject"])
+    )
+    monkeypatch.setitem(dj.config, "custom", {"injection_volume_unit": "nl"})
+    return pd.DataFrame(
+        {
+            "subject": ["M1", "M2", "M3"],
+            "titer": ["1e13", "2e12 vg/ml", "unknown"],
+            "total_volume": [500.0, 250.0, 100.0],
+            "volume_per_pulse": [100.0, 0.0, 30.0],
+            "injection_rate": [50.0, 25.0, 0.0],
+            "interpulse_delay": [2.0, 1.0, 5.0],
+        }
+    )
+
+
+def test_doses(injections):
+    doses = _doses(injections).set_index("subject")
+    assert doses.loc["M1", "volume_ml"] == pytest.approx(5e-4)
+    assert doses.loc["M1", "dose_gc"] == pytest.approx(5e9)
+    assert doses.loc["M1", "n_pulses"] == 5
+    assert doses.loc["M1", "duration"] == pytest.approx(500 / 50 + 4 * 2.0)
+    # no pulse volume: no pulse count, the duration is the infusion alone
+    assert doses.loc["M2", "n_pulses"] is None
+    assert doses.loc["M2", "duration"] == pytest.approx(10.0)
+    # unparsable titer and no rate
+    assert doses.loc["M3", "titer_gc_per_ml"] is None
+    assert doses.loc["M3", "dose_gc"] is None
+    assert doses.loc["M3", "n_pulses"] == 4
+    assert doses.loc["M3", "duration"] is None
+
+
+def test_volume_unit(injections):
+    dj.config["custom"] = {"injection_volume_unit": "ul"}
+    doses = _doses(injections).set_index("subject")
+    assert doses.loc["M1", "volume_ml"] == pytest.approx(0.5)
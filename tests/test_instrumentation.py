@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+from element_animal import activation, instrumentation
+from element_animal.instrumentation import QueryInstrumentation
+
+SQL = "SELECT * FROM `lab`.`subject` JOIN `lab`.`surgery` JOIN `lab`.`~log`"
+
+
+def make_connection():
+    return SimpleNamespace(query=lambda sql, args=(): SimpleNamespace(rowcount=2))
+
+
+def test_table_labels_are_collected_after_activation(monkeypatch):
+    calls = []
+    tables = {"subject.Subject": SimpleNamespace(full_table_name="`lab`.`subject`")}
+
+    def element_tables():
+        calls.append(1)
+        return dict(tables)
+
+    monkeypatch.setattr(instrumentation, "element_tables", element_tables)
+    monkeypatch.setattr(activation, "_registry", {})
+    connection = make_connection()
+    stats = QueryInstrumentation(connection)
+    stats.install()
+    for _ in range(3):
+        connection.query(SQL)
+    assert len(calls) == 1
+    assert set(stats.by_table) == {
+        "subject.Subject",
+        "`lab`.`surgery`",
+        "`lab`.`~log`",
+    }
+    assert stats.by_table["subject.Subject"].queries == 3
+    assert stats.total.rows == 6
+
+    tables["surgery.Surgery"] = SimpleNamespace(full_table_name="`lab`.`surgery`")
+    activation._registry["surgery"] = None
+    connection.query(SQL)
+    connection.query(SQL)
+    assert len(calls) == 2
+    assert stats.by_table["surgery.Surgery"].queries == 2
+
+
+def test_installs_share_one_wrapper():
+    connection = make_connection()
+    query = connection.query
+    first, second = QueryInstrumentation(connection), QueryInstrumentation(connection)
+    first.install()
+    first.install()
+    second.install()
+    connection.query("SELECT 1")
+    assert first.total.queries == second.total.queries == 1
+
+    first.uninstall()
+    connection.query("SELECT 1")
+    assert (first.total.queries, second.total.queries) == (1, 2)
+    second.uninstall()
+    assert connection.query is query
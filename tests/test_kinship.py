@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from element_animal.kinship import Kinship
+from element_animal.pedigree import Pedigree
+
+LITTER_COLUMNS = ["subject", "line", "breeding_pair", "father", "mother"]
+
+
+def litters(*rows):
+    return pd.DataFrame(list(rows), columns=LITTER_COLUMNS)
+
+
+@pytest.fixture
+def pedigree():
+    """Founders F1 x F2 with pups A and B, and their inbred pup AB.
+
+    C is an unrelated pup of founders X x Y.
+    """
+    pedigree = Pedigree([], [], [])
+    pedigree._merge(
+        ["F1", "F2", "X", "Y", "A", "B", "AB", "C"],
+        litters(
+            ("A", "line", "P1", "F1", "F2"),
+            ("B", "line", "P1", "F1", "F2"),
+            ("AB", "line", "P2", "A", "B"),
+            ("C", "line", "P3", "X", "Y"),
+        ),
+    )
+    return pedigree
+
+
+def test_kinship_coefficients(pedigree):
+    kinship = Kinship(pedigree)
+    np.testing.assert_allclose(
+        kinship.kinship(
+            ["F1", "F1", "A", "F1", "A", "AB"], ["F1", "F2", "B", "A", "C", "AB"]
+        ),
+        [0.5, 0.0, 0.25, 0.25, 0.0, 0.625],
+    )
+
+
+def test_inbreeding(pedigree):
+    np.testing.assert_allclose(
+        Kinship(pedigree).inbreeding(["F1", "A", "AB"]), [0.0, 0.0, 0.25]
+    )
+
+
+def test_kinship_matrix_is_symmetric(pedigree):
+    subjects = ["F1", "F2", "A", "B", "AB"]
+    matrix = Kinship(pedigree).kinship_matrix(subjects, subjects)
+    np.testing.assert_allclose(matrix.values, matrix.values.T)
+    assert list(matrix.index) == subjects
+
+
+def test_memo_matches_fresh_computation(pedigree):
+    kinship = Kinship(pedigree)
+    kinship.kinship(["AB"], ["AB"])
+    assert len(kinship) > 1
+    np.testing.assert_allclose(
+        kinship.kinship(["A", "F1"], ["B", "AB"]),
+        Kinship(pedigree).kinship(["A", "F1"], ["B", "AB"]),
+    )
+
+
+def test_memo_evicted_after_several_updates(pedigree):
+    kinship = Kinship(pedigree)
+    assert kinship.kinship(["A"], ["C"])[0] == 0.0
+    rows = [
+        ("A", "line", "P1", "F1", "F2"),
+        ("B", "line", "P1", "F1", "F2"),
+        ("AB", "line", "P2", "A", "B"),
+        ("C", "line", "P1", "F1", "F2"),
+    ]
+    pedigree._merge(pedigree.subjects, litters(*rows))
+    pedigree._merge(list(pedigree.subjects) + ["D"])
+    assert kinship.kinship(["A"], ["C"])[0] == 0.25
+    assert Kinship(pedigree).kinship(["A"], ["C"])[0] == 0.25
+
+
+def test_update_without_changes_keeps_version(pedigree):
+    version = pedigree.version
+    pedigree._merge(pedigree.subjects, litters(("A", "line", "P1", "F1", "F2")))
+    assert pedigree.version == version
@@ -0,0 +1,232 @@
+import datetime
+from types import SimpleNamespace
+
+import datajoint as dj
+import pytest
+
+from element_animal import injection, surgery
+from element_animal import subject as subject_module
+from element_animal.export import nwb
+from element_animal.offline import OfflineQuery
+
+
+class Query:
+    """Rows restricted by a list of subject keys."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __mul__(self, other):
+        return self
+
+    def __and__(self, keys):
+        subjects = {key["subject"] for key in keys}
+        return Query([row for row in self.rows if row["subject"] in subjects])
+
+    def fetch(self, *attributes, as_dict=False, order_by=None):
+        if as_dict:
+            return [dict(row) for row in reversed(self.rows)]
+        return tuple([row[name] for row in self.rows] for name in attributes)
+
+
+SUBJECTS = [
+    {
+        "subject": name,
+        "sex": "F",
+        "subject_birth_date": datetime.date(2024, 1, 1),
+        "species": "Mus musculus",
+    }
+    for name in ("M1", "M2", "M3")
+]
+
+
+@pytest.fixture
+def subjects(monkeypatch):
+    alleles = Query([{"subject": "M2", "allele": "Cre"}])
+    monkeypatch.setattr(
+        nwb,
+        "subject",
+        SimpleNamespace(
+            Line=SimpleNamespace(Allele=alleles),
+            Subject=SimpleNamespace(Line=None),
+        ),
+    )
+    monkeypatch.setattr(nwb, "_subject_info_query", lambda keys: Query(SUBJECTS) & keys)
+
+
+def test_subjects_follow_the_keys(subjects):
+    keys = [{"subject": name} for name in ("M3", "M1", "M3", "M2")]
+    exported = list(nwb.subjects_to_nwb(keys, batch_size=3))
+    assert [item.subject_id for item in exported] == ["M3", "M1", "M3", "M2"]
+    assert [item.genotype for item in exported] == ["", "", "", "Cre"]
+
+
+def test_unknown_subjects_are_rejected(subjects):
+    keys = [{"subject": "M1"}, {"subject": "M9"}]
+    with pytest.raises(dj.DataJointError, match="M9"):
+        list(nwb.subjects_to_nwb(keys))
+
+
+def offline_table(primary_key, full_table_name=None, **columns):
+    import pyarrow as pa
+
+    types = {
+        name: pa.float64()
+        if name in nwb._FLOAT_COLUMNS
+        else pa.string()
+        if all(value is None for value in values)
+        else None
+        for name, values in columns.items()
+    }
+    arrays = {name: pa.array(values, types[name]) for name, values in columns.items()}
+    table = OfflineQuery(pa.table(arrays), primary_key)
+    table.full_table_name = full_table_name
+    return table
+
+
+SURGERY = datetime.datetime(2024, 5, 1, 10, 30)
+
+
+@pytest.fixture
+def surgeries(monkeypatch):
+    implantation_key = ["subject", "implant_date", "implant_type", "target_region"]
+    implantations = offline_table(
+        implantation_key + ["target_hemisphere"],
+        subject=["M1", "M1", "M3"],
+        implant_date=[SURGERY] * 3,
+        implant_type=["ephys", "opto", "opto"],
+        target_region=["CA1", "VISp", "VISp"],
+        target_hemisphere=["left", "right", "left"],
+        surgeon="alice bob carol".split(),
+        implant_comment=["", "loose", ""],
+    )
+    implantations.Coordinate = offline_table(
+        implantations.primary_key,
+        subject=["M1"],
+        implant_date=[SURGERY],
+        implant_type=["ephys"],
+        target_region=["CA1"],
+        target_hemisphere=["left"],
+        ap=[-1.5],
+        ap_ref=["bregma"],
+        ml=[2.0],
+        ml_ref=[None],
+        dv=[None],
+        dv_ref=[None],
+        theta=[None],
+        phi=[None],
+        beta=[None],
+    )
+    tables = {
+        (surgery, "Implantation"): implantations,
+        (surgery, "BrainRegion"): offline_table(
+            ["region_acronym"],
+            "`lab_surgery`.`brain_region`",
+            region_acronym=["CA1", "VISp"],
+            region_name=["Field CA1", "Primary visual area"],
+        ),
+        (surgery, "ImplantationType"): offline_table(
+            ["implant_type"],
+            "`lab_surgery`.`#implantation_type`",
+            implant_type=["ephys", "opto"],
+            implant_description=["electophysiology", "optogenetic perturbation"],
+        ),
+        (injection, "Injection"): offline_table(
+            implantation_key + ["target_hemisphere", "virus_name", "protocol_id"],
+            subject=["M3"],
+            implant_date=[SURGERY],
+            implant_type=["opto"],
+            target_region=["VISp"],
+            target_hemisphere=["left"],
+            virus_name=["AAV-ChR2"],
+            protocol_id=[1],
+            titer=["1e12"],
+            total_volume=[500.0],
+            injection_comment=[""],
+        ),
+        (injection, "VirusName"): offline_table(
+            ["virus_name"],
+            "`lab_injection`.`virus_name`",
+            virus_name=["AAV-ChR2"],
+            virus_serotype=["AAV1"],
+        ),
+        (injection, "InjectionProtocol"): offline_table(
+            ["protocol_id"],
+            "`lab_injection`.`injection_protocol`",
+            protocol_id=[1],
+            device=["nanoject"],
+            volume_per_pulse=[10.0],
+            injection_rate=[1.0],
+            interpulse_delay=[5.0],
+        ),
+    }
+    for (module, name), table in tables.items():
+        monkeypatch.setattr(module, name, table)
+    return tables
+
+
+def test_surgeries_follow_the_keys(surgeries):
+    keys = [{"subject": name} for name in ("M3", "M1", "M2")]
+    records = list(nwb.surgeries_to_nwb(keys, batch_size=2))
+    assert [record.subject for record in records] == ["M3", "M1", "M2"]
+    m3, m1, m2 = records
+
+    implantations = m1.implantations.to_dataframe()
+    assert list(implantations.target_region_name) == [
+        "Field CA1",
+        "Primary visual area",
+    ]
+    assert list(implantations.implant_description) == [
+        "electophysiology",
+        "optogenetic perturbation",
+    ]
+    assert m1.surgery.splitlines() == [
+        "2024-05-01 10:30:00: ephys implant (electophysiology) in CA1 (Field CA1), "
+        "left hemisphere; AP -1.5 mm from bregma, ML 2 mm; surgeon alice.",
+        "2024-05-01 10:30:00: opto implant (optogenetic perturbation) in VISp "
+        "(Primary visual area), right hemisphere; surgeon bob. loose",
+    ]
+    assert len(m1.injections) == 0 and m1.virus == ""
+
+    assert m3.injections.to_dataframe().device.tolist() == ["nanoject"]
+    assert m3.virus == (
+        "AAV-ChR2 (AAV1), titer 1e12, 500 nl into VISp (left) on 2024-05-01 10:30:00."
+    )
+    assert len(m2.implantations) == 0 and m2.surgery == ""
+
+
+def test_lookups_are_fetched_once(surgeries, monkeypatch):
+    lookups = nwb.SurgeryLookups()
+    list(nwb.surgeries_to_nwb([{"subject": "M1"}], lookups=lookups))
+    changed = offline_table(
+        ["region_acronym"],
+        surgeries[(surgery, "BrainRegion")].full_table_name,
+        region_acronym=["VISp"],
+        region_name=["changed"],
+    )
+    monkeypatch.setattr(surgery, "BrainRegion", changed)
+    (record,) = nwb.surgeries_to_nwb([{"subject": "M1"}], lookups=lookups)
+    assert "Field CA1" in record.surgery and "changed" not in record.surgery
+
+
+def test_surgery_added_to_nwb_file(surgeries, monkeypatch):
+    import pynwb
+
+    monkeypatch.setattr(
+        subject_module, "Subject", offline_table(["subject"], subject=["M1", "M3"])
+    )
+    with pytest.raises(dj.DataJointError, match="No subject"):
+        nwb.surgery_to_nwb({"subject": "M9"})
+
+    record = nwb.surgery_to_nwb({"subject": "M3"})
+    nwbfile = pynwb.NWBFile(
+        session_description="test",
+        identifier="M3",
+        session_start_time=datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc),
+    )
+    record.add_to(nwbfile)
+    assert set(nwbfile.processing["surgery"].data_interfaces) == {
+        "implantations",
+        "injections",
+    }
+    assert nwbfile.virus == record.virus
@@ -0,0 +1,31 @@
+import datajoint as dj
+import pytest
+
+from element_animal.export import subjects_to_nwb_parallel
+
+KEYS = [{"subject": "M001"}, {"subject": "M002"}]
+
+
+def test_unimportable_linking_module_is_rejected():
+    with pytest.raises(dj.DataJointError, match="cannot be imported"):
+        subjects_to_nwb_parallel(
+            KEYS, subject_schema_name="animal_subject", linking_module="__main__"
+        )
+
+
+def test_worker_start_failure_is_raised(monkeypatch):
+    # nothing listens on port 1, so every worker fails to connect
+    for name, value in (
+        ("database.host", "127.0.0.1"),
+        ("database.port", 1),
+        ("database.user", "nobody"),
+        ("database.password", "none"),
+    ):
+        monkeypatch.setitem(dj.config, name, value)
+    with pytest.raises(dj.DataJointError, match="failed to start"):
+        subjects_to_nwb_parallel(
+            KEYS,
+            processes=1,
+            subject_schema_name="animal_subject",
+            linking_module="element_animal.subject",
+        )
@@ -0,0 +1,93 @@
+import json
+
+import datajoint as dj
+import pytest
+
+from element_animal import offline, subject, surgery
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+TABLES = {
+    "subject.Subject": (
+        ["subject"],
+        {
+            "subject": ["M1", "M2", "M3"],
+            "sex": ["F", "M", "F"],
+            "subject_birth_date": ["2024-01-01", "2024-02-01", "2024-03-01"],
+        },
+    ),
+    "subject.Subject.Line": (
+        ["subject"],
+        {"subject": ["M1", "M3"], "line": ["A", "B"]},
+    ),
+    "subject.Line": (["line"], {"line": ["A", "B"], "line_description": ["a", "b"]}),
+}
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    manifest = {"snapshots": [], "tables": {}, "views": {}}
+    for name, (primary_key, columns) in TABLES.items():
+        table = pa.table(columns)
+        for kind, rows in (
+            ("tables", table),
+            ("deleted", table.select(primary_key).slice(0, 0)),
+        ):
+            path = tmp_path / kind / name / "snapshot=0"
+            path.mkdir(parents=True)
+            pq.write_table(rows, path / "part-00000.parquet")
+        manifest["tables"][name] = {
+            "name": name,
+            "full_table_name": f"`lab`.`{name}`",
+            "primary_key": primary_key,
+            "columns": list(columns),
+            "since": 0,
+            "snapshot": 0,
+        }
+    manifest["snapshots"].append({"snapshot": 0, "tables": dict.fromkeys(TABLES)})
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+    yield tmp_path
+    offline.disable_offline()
+
+
+def test_tables_are_replaced_and_restored(snapshot):
+    original_subject, original_line = subject.Subject, subject.Line
+    original_implantation = surgery.Implantation
+    served = offline.enable_offline(snapshot)
+    assert offline.get_offline_snapshot() is served
+    assert isinstance(subject.Subject, offline.OfflineTable)
+    assert subject.Subject.Line is served.get("subject.Subject.Line")
+    assert surgery.Implantation is original_implantation  # not in the snapshot
+
+    offline.enable_offline(snapshot, modules=("surgery",))
+    assert subject.Subject is original_subject
+
+    offline.enable_offline(snapshot)
+    offline.disable_offline()
+    assert (subject.Subject, subject.Line) == (original_subject, original_line)
+    assert offline.get_offline_snapshot() is None
+
+
+def test_queries_are_served_from_the_snapshot(snapshot):
+    offline.enable_offline(snapshot)
+    assert (subject.Subject & {"subject": "M2"}).fetch1("sex") == "M"
+    assert list(
+        (subject.Subject & [{"subject": "M1"}, {"subject": "M3"}]).fetch(
+            "subject", order_by="subject desc"
+        )
+    ) == ["M3", "M1"]
+    lines = subject.Subject.join(subject.Subject.Line, left=True).fetch(
+        "line", order_by="subject"
+    )
+    assert list(lines) == ["A", None, "B"]
+    described = subject.Subject * subject.Subject.Line * subject.Line
+    assert list(described.fetch("line_description", order_by="KEY")) == ["a", "b"]
+    assert list((subject.Subject - subject.Subject.Line).fetch("subject")) == ["M2"]
+    renamed = subject.Subject.proj(birth="subject_birth_date")
+    assert renamed.heading.names == ["subject", "birth"]
+
+    with pytest.raises(dj.DataJointError, match="SQL restrictions"):
+        subject.Subject & "sex = 'F'"
+    with pytest.raises(dj.DataJointError, match="read-only"):
+        subject.Subject.insert1({"subject": "M4"})
@@ -0,0 +1,89 @@
+import json
+
+import datajoint as dj
+import pandas as pd
+import pytest
+
+from element_animal.ontology import closure, read_ontology
+
+STRUCTURE_GRAPH = {
+    "msg": [
+        {
+            "id": 1,
+            "acronym": "root",
+            "name": "root",
+            "parent_structure_id": None,
+            "children": [
+                {
+                    "id": 2,
+                    "acronym": "HPF",
+                    "name": "Hippocampal formation",
+                    "parent_structure_id": 1,
+                    "children": [
+                        {
+                            "id": 3,
+                            "acronym": "CA1",
+                            "name": "Field CA1",
+                            "parent_structure_id": 2,
+                            "children": [],
+                        }
+                    ],
+                },
+                {
+                    "id": 4,
+                    "acronym": "VISp",
+                    "name": "Primary visual area",
+                    "parent_structure_id": 1,
+                },
+            ],
+        }
+    ]
+}
+
+
+def regions(*rows):
+    return pd.DataFrame(list(rows), columns=["region_acronym", "parent_acronym"])
+
+
+def test_read_structure_graph(tmp_path):
+    path = tmp_path / "structure_graph.json"
+    path.write_text(json.dumps(STRUCTURE_GRAPH))
+    ontology = read_ontology(path)
+    assert list(ontology.region_acronym) == ["root", "HPF", "CA1", "VISp"]
+    assert list(ontology.parent_acronym) == [None, "root", "HPF", "root"]
+    assert ontology.region_name[2] == "Field CA1"
+
+
+def test_read_csv(tmp_path):
+    path = tmp_path / "regions.csv"
+    path.write_text(
+        "region_acronym,region_name,parent_acronym\nroot,root,\nHPF,Hippocampus,root\n"
+    )
+    assert list(read_ontology(path).parent_acronym) == [None, "root"]
+
+
+def test_closure():
+    ancestry = closure(
+        regions(("root", None), ("HPF", "root"), ("CA1", "HPF"), ("VISp", "root"))
+    )
+    pairs = {(r.ancestor, r.descendant): r.depth for r in ancestry.itertuples()}
+    assert pairs == {
+        ("root", "root"): 0,
+        ("HPF", "HPF"): 0,
+        ("CA1", "CA1"): 0,
+        ("VISp", "VISp"): 0,
+        ("root", "HPF"): 1,
+        ("HPF", "CA1"): 1,
+        ("root", "VISp"): 1,
+        ("root", "CA1"): 2,
+    }
+
+
+def test_closure_missing_parent():
+    with pytest.raises(dj.DataJointError, match="not in the ontology"):
+        closure(regions(("CA1", "HPF")))
+
+
+def test_closure_cycle():
+    with pytest.raises(dj.DataJointError, match="cycle"):
+        closure(regions(("A", "B"), ("B", "A")))
@@ -0,0 +1,132 @@
+import re
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import datajoint as dj
+import pytest
+
+from element_animal.export import parquet
+from element_animal.export.parquet import export_snapshot, read_snapshot
+
+pytest.importorskip("pyarrow")
+
+
+def attribute(name, type, in_key=False):
+    return SimpleNamespace(
+        name=name,
+        type=type,
+        in_key=in_key,
+        uuid=False,
+        json=False,
+        is_blob=False,
+        is_attachment=False,
+        is_filepath=False,
+    )
+
+
+class Table:
+    """Rows of one table in memory, answering the queries of the export."""
+
+    primary_key = ["subject"]
+    full_table_name = "`lab_subject`.`subject`"
+    connection = SimpleNamespace(transaction=nullcontext())
+    heading = SimpleNamespace(
+        attributes={
+            "subject": attribute("subject", "varchar(8)", in_key=True),
+            "sex": attribute("sex", "enum('M','F','U')"),
+            "weight": attribute("weight", "float"),
+        }
+    )
+
+    def __init__(self, rows, hashed=False):
+        self.rows = rows
+        self.hashed = hashed
+
+    def proj(self, *attributes, row_hash):
+        return Table(self.rows, hashed=True)
+
+    def __and__(self, restriction):
+        if isinstance(restriction, str):  # rows after a key, from `_after`
+            (last,) = re.findall(r"'([^']*)'", restriction)
+            rows = {k: v for k, v in self.rows.items() if k > last}
+        else:
+            rows = {key["subject"]: self.rows[key["subject"]] for key in restriction}
+        return Table(rows, self.hashed)
+
+    def fetch(self, *attributes, as_dict, order_by, limit=None):
+        rows = [
+            {"subject": name, **values, "row_hash": repr(sorted(values.items()))}
+            for name, values in sorted(self.rows.items())
+        ][:limit]
+        return [{name: row[name] for name in attributes} for row in rows]
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = Table({f"M{i}": {"sex": "F", "weight": 20.0 + i} for i in range(5)})
+    monkeypatch.setattr(parquet, "element_tables", lambda: {"subject.Subject": table})
+    return table
+
+
+def current(root):
+    rows = read_snapshot(root, "subject.Subject").to_pylist()
+    return {row.pop("subject"): row for row in rows}
+
+
+def test_first_snapshot_exports_every_row_in_chunks(tmp_path, table):
+    entry = export_snapshot(tmp_path, views=False, chunk_size=2)
+    assert entry["tables"] == {"subject.Subject": {"rows": 5, "deleted": 0}}
+    assert current(tmp_path) == table.rows
+    assert len(list((tmp_path / "tables/subject.Subject/snapshot=0").iterdir())) == 3
+
+
+def test_later_snapshots_write_changed_rows_only(tmp_path, table):
+    export_snapshot(tmp_path, views=False)
+    table.rows["M1"] = {"sex": "M", "weight": 21.0}
+    table.rows["M9"] = {"sex": "U", "weight": 29.0}
+    del table.rows["M3"]
+
+    entry = export_snapshot(tmp_path, views=False)
+    assert entry["tables"] == {"subject.Subject": {"rows": 2, "deleted": 1}}
+    assert current(tmp_path) == table.rows
+
+    manifest = parquet._read_manifest(tmp_path)
+    assert [e["snapshot"] for e in manifest["snapshots"]] == [0, 1]
+    assert manifest["tables"]["subject.Subject"]["since"] == 0
+    # only the latest hashes are kept; both row partitions are still needed
+    assert [p.name for p in (tmp_path / "hashes/subject.Subject").iterdir()] == [
+        "snapshot=1.parquet"
+    ]
+    assert sorted(p.name for p in (tmp_path / "tables/subject.Subject").iterdir()) == [
+        "snapshot=0",
+        "snapshot=1",
+    ]
+
+    assert export_snapshot(tmp_path, views=False)["tables"] == {
+        "subject.Subject": {"rows": 0, "deleted": 0}
+    }
+    assert current(tmp_path) == table.rows
+
+
+def test_full_snapshot_compacts_the_table(tmp_path, table):
+    export_snapshot(tmp_path, views=False)
+    del table.rows["M0"]
+    export_snapshot(tmp_path, views=False)
+    entry = export_snapshot(tmp_path, views=False, full=True)
+    assert entry["tables"] == {"subject.Subject": {"rows": 4, "deleted": 0}}
+    assert parquet._read_manifest(tmp_path)["tables"]["subject.Subject"]["since"] == 2
+    for kind in ("tables", "deleted"):
+        assert [p.name for p in (tmp_path / kind / "subject.Subject").iterdir()] == [
+            "snapshot=2"
+        ]
+    assert current(tmp_path) == table.rows
+    assert (
+        read_snapshot(tmp_path, "subject.Subject", columns=["weight"]).num_columns == 1
+    )
+
+
+def test_unknown_tables_are_rejected(tmp_path, table):
+    with pytest.raises(dj.DataJointError, match="not activated"):
+        export_snapshot(tmp_path, tables=["subject.Unknown"])
+    with pytest.raises(dj.DataJointError, match="not in the snapshot"):
+        read_snapshot(tmp_path, "subject.Subject")
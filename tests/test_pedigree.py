@@ -0,0 +1,202 @@
+import zlib
+
+import datajoint as dj
+import numpy as np
+import pandas as pd
+import pytest
+
+from element_animal.pedigree import Pedigree
+
+LITTER_COLUMNS = ["subject", "line", "breeding_pair", "father", "mother"]
+
+
+def bucket(name):
+    return zlib.crc32(name.encode()) % 1024
+
+
+class Colony:
+    """Subjects and litters standing in for the database."""
+
+    def __init__(self):
+        self.subjects = ["F1", "F2", "M3", "A", "B", "AB"]
+        self.litters = {"A": ("P1", "F1", "F2"), "B": ("P1", "F1", "F2")}
+        self.litters["AB"] = ("P2", "A", "B")
+        self.fetched = []
+
+    def rows(self):
+        return [
+            (name, "line", *self.litters[name])
+            if name in self.litters
+            else (name, None, None, None, None)
+            for name in self.subjects
+        ]
+
+    def fetch_digests(self):
+        digests = {}
+        for row in self.rows():
+            n, checksum = digests.get(bucket(row[0]), (0, 0))
+            digests[bucket(row[0])] = (n + 1, checksum + zlib.crc32(repr(row).encode()))
+        return digests
+
+    def fetch_litters(self, buckets=None):
+        rows = [
+            row for row in self.rows() if buckets is None or bucket(row[0]) in buckets
+        ]
+        self.fetched.extend(row[0] for row in rows)
+        return pd.DataFrame(
+            rows, columns=["subject", "line", "breeding_pair", "father", "mother"]
+        )
+
+
+@pytest.fixture
+def colony(monkeypatch):
+    colony = Colony()
+    monkeypatch.setattr(Pedigree, "_fetch_digests", staticmethod(colony.fetch_digests))
+    monkeypatch.setattr(Pedigree, "_fetch_litters", staticmethod(colony.fetch_litters))
+    return colony
+
+
+def assert_derived_arrays_match_rebuild(pedigree):
+    rebuilt = Pedigree(pedigree.subjects, pedigree.father, pedigree.mother)
+    np.testing.assert_array_equal(pedigree.depth, rebuilt.depth)
+    np.testing.assert_array_equal(pedigree.component, rebuilt.component)
+    for i in range(len(pedigree.subjects)):
+        assert sorted(pedigree._children(np.array([i]))) == sorted(
+            rebuilt._children(np.array([i]))
+        )
+
+
+def test_load(colony):
+    pedigree = Pedigree.load()
+    assert pedigree.version == 0
+    assert pedigree.parents("AB") == ("A", "B")
+    assert pedigree.parents("F1") == (None, None)
+    assert list(pedigree.generation_depth(["F1", "A", "AB"])) == [0, 1, 2]
+    component = dict(zip(pedigree.subjects, pedigree.component))
+    assert component["F1"] == component["AB"] != component["M3"]
+
+
+def test_walks(colony):
+    pedigree = Pedigree.load()
+    assert pedigree.ancestors("AB") == {"A": 1, "B": 1, "F1": 2, "F2": 2}
+    assert pedigree.ancestors("AB", max_generations=1) == {"A": 1, "B": 1}
+    assert pedigree.descendants("F1") == {"A": 1, "B": 1, "AB": 2}
+    assert pedigree.descendants(breeding_pair=("line", "P1")) == {
+        "A": 1,
+        "B": 1,
+        "AB": 2,
+    }
+    assert pedigree.common_ancestors("A", "AB") == {"F1": (1, 2), "F2": (1, 2)}
+    with pytest.raises(KeyError):
+        pedigree.ids(["unknown"])
+
+
+def test_update_adds_new_litters(colony):
+    pedigree = Pedigree.load()
+    colony.subjects.append("C")
+    colony.litters["C"] = ("P1", "F1", "F2")
+    assert pedigree.update() == 1
+    assert pedigree.parents("C") == ("F1", "F2")
+    assert pedigree.version == 1
+    assert len(pedigree.reparented) == 0
+
+
+def test_update_reparents_corrected_records(colony):
+    pedigree = Pedigree.load()
+    colony.litters["A"] = ("P1", "M3", "F2")  # corrected breeding pair
+    colony.litters["B"] = ("P1", "M3", "F2")
+    del colony.litters["AB"]  # litter record removed
+    assert pedigree.update() == 3
+    assert pedigree.parents("A") == ("M3", "F2")
+    assert pedigree.parents("AB") == (None, None)
+    assert set(pedigree.subjects[pedigree.reparented]) == {"A", "B", "AB"}
+    assert pedigree.descendants("M3") == {"A": 1, "B": 1}
+
+
+def test_update_without_changes(colony):
+    pedigree = Pedigree.load()
+    colony.fetched.clear()
+    assert pedigree.update() == 0
+    assert pedigree.version == 0
+    assert colony.fetched == []
+
+
+def test_update_fetches_changed_buckets_only(colony):
+    pedigree = Pedigree.load()
+    colony.fetched.clear()
+    colony.subjects.append("C")
+    colony.litters["C"] = ("P1", "F1", "F2")
+    pedigree.update()
+    assert "C" in colony.fetched
+    assert {bucket(name) for name in colony.fetched} == {bucket("C")}
+
+
+def test_update_patches_derived_arrays(colony):
+    pedigree = Pedigree.load()
+    colony.subjects += ["C", "D", "ABC"]
+    colony.litters["C"] = ("P3", "M3", "F2")
+    colony.litters["ABC"] = ("P4", "AB", "C")
+    colony.litters["B"] = ("P3", "M3", "F2")
+    pedigree.update()
+    assert pedigree.generation_depth(["ABC"])[0] == 3
+    assert_derived_arrays_match_rebuild(pedigree)
+
+    del colony.litters["AB"]
+    pedigree.update()
+    assert pedigree.generation_depth(["ABC"])[0] == 2
+    assert_derived_arrays_match_rebuild(pedigree)
+
+
+def test_random_updates_match_rebuild():
+    rng = np.random.default_rng(0)
+    names = [f"S{i}" for i in range(200)]
+    pedigree = Pedigree([], [], [])
+    for stop in range(40, 201, 40):
+        rows = []
+        for child in rng.choice(stop, size=30, replace=False):
+            if child >= 2 and rng.random() < 0.8:
+                father, mother = rng.choice(child, size=2, replace=False)
+                rows.append((names[child], "line", "P", names[father], names[mother]))
+            else:
+                rows.append((names[child], None, None, None, None))
+        pedigree._merge(names[:stop], pd.DataFrame(rows, columns=LITTER_COLUMNS))
+        assert_derived_arrays_match_rebuild(pedigree)
+
+
+def test_litters_of_unknown_subjects_are_rejected():
+    pedigree = Pedigree([], [], [])
+    with pytest.raises(dj.DataJointError, match="missing from the pedigree"):
+        pedigree._merge(
+            ["A"],
+            pd.DataFrame([("A", "line", "P1", "F1", "F2")], columns=LITTER_COLUMNS),
+        )
+
+
+def test_cycle_is_rejected():
+    with pytest.raises(dj.DataJointError):
+        Pedigree(["A", "B"], [1, 0], [-1, -1])
+    n = 10000
+    father = np.arange(-1, n - 1)
+    assert Pedigree(np.arange(n), father, np.full(n, -1)).depth[-1] == n - 1
+    father[0] = n - 1
+    with pytest.raises(dj.DataJointError, match="cycle"):
+        Pedigree(np.arange(n), father, np.full(n, -1))
+
+
+def test_update_introducing_a_cycle_is_rejected(colony):
+    pedigree = Pedigree.load()
+    colony.litters["F1"] = ("P9", "AB", "F2")
+    with pytest.raises(dj.DataJointError, match="cycle"):
+        pedigree.update()
+
+
+def test_reparented_since_collects_all_updates(colony):
+    pedigree = Pedigree.load()
+    colony.litters["A"] = ("P1", "M3", "F2")
+    pedigree.update()
+    colony.litters["B"] = ("P1", "M3", "F2")
+    pedigree.update()
+    np.testing.assert_array_equal(
+        pedigree.subjects[pedigree.reparented_since(0)], ["A", "B"]
+    )
+    np.testing.assert_array_equal(pedigree.subjects[pedigree.reparented], ["B"])
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from element_animal import spatial
+from element_animal.spatial import ImplantIndex
+
+PRIMARY_KEY = [
+    "subject",
+    "implant_date",
+    "implant_type",
+    "target_region",
+    "target_hemisphere",
+]
+
+
+def make_sites(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "subject": [f"S{i}" for i in range(n)],
+            "implant_date": "2024-01-01 10:00:00",
+            "implant_type": rng.choice(["ephys", "opto"], n),
+            "target_region": rng.choice(["CA1", "VISp"], n),
+            "target_hemisphere": rng.choice(["left", "right"], n),
+            "ap": rng.uniform(-4, 2, n),
+            "ml": rng.uniform(-3, 3, n),
+            "dv": rng.uniform(-5, 0, n),
+        }
+    )
+
+
+@pytest.fixture
+def sites():
+    return make_sites(500)
+
+
+@pytest.fixture
+def index(sites):
+    return ImplantIndex(sites, cell_size=0.3)
+
+
+def distances(sites, point):
+    return np.linalg.norm(sites[["ap", "ml", "dv"]].to_numpy() - point, axis=1)
+
+
+def test_within_matches_brute_force(sites, index):
+    point = np.array([-1.0, 0.5, -2.0])
+    result = index.within(point, radius=0.8)
+    expected = sites.subject[distances(sites, point) <= 0.8]
+    assert set(result.subject) == set(expected)
+    assert result.distance.is_monotonic_increasing
+
+
+def test_within_filters(sites, index):
+    point = np.array([-1.0, 0.5, -2.0])
+    result = index.within(point, radius=1.5, implant_type="opto", hemisphere="left")
+    is_match = (
+        (distances(sites, point) <= 1.5)
+        & (sites.implant_type == "opto")
+        & (sites.target_hemisphere == "left")
+    )
+    assert set(result.subject) == set(sites.subject[is_match])
+
+
+def test_nearest_matches_brute_force(sites, index):
+    point = np.array([0.0, 0.0, -1.0])
+    result = index.nearest(point, k=7)
+    expected = sites.subject.to_numpy()[np.argsort(distances(sites, point))[:7]]
+    assert list(result.subject) == list(expected)
+
+
+def test_nearest_far_from_all_sites(sites, index):
+    assert len(index.nearest((50.0, 50.0, 50.0), k=3)) == 3
+
+
+def test_nearest_after_adding_sites_outside_the_bounds(sites, index):
+    far = make_sites(3, seed=1).assign(ap=40.0, subject=["F1", "F2", "F3"])
+    index.add(far)
+    assert set(index.nearest((60.0, 0.0, -2.0), k=3).subject) == {"F1", "F2", "F3"}
+    assert index.nearest((0.0, 0.0, 0.0), k=2, implant_type="unknown").empty
+
+
+def test_in_box(sites, index):
+    lower, upper = np.array([-2, -1, -3]), np.array([0, 1, -1])
+    positions = sites[["ap", "ml", "dv"]].to_numpy()
+    is_inside = ((positions >= lower) & (positions <= upper)).all(axis=1)
+    assert set(index.in_box(lower, upper).subject) == set(sites.subject[is_inside])
+
+
+def test_region_density(sites, index):
+    density = index.region_density(by_hemisphere=True)
+    assert density.n_sites.sum() == len(sites)
+    assert (density.spread > 0).all()
+
+
+def test_unplaced_sites_are_not_fetched_again(monkeypatch):
+    sites = make_sites(4)
+    sites.loc[1, "dv"] = np.nan
+    index = ImplantIndex(sites)
+    assert len(index) == 3
+    assert list(index.unplaced.subject) == ["S1"]
+
+    keys = sites[PRIMARY_KEY].to_dict("records")
+    monkeypatch.setattr(
+        spatial,
+        "surgery",
+        SimpleNamespace(
+            Implantation=SimpleNamespace(
+                primary_key=PRIMARY_KEY,
+                Coordinate=SimpleNamespace(fetch=lambda _: keys),
+            )
+        ),
+    )
+
+    def load(restriction):
+        raise AssertionError(f"fetched {restriction}")
+
+    monkeypatch.setattr(spatial.Coordinates, "load", load)
+    assert index.update() == 0
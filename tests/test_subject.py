@@ -0,0 +1,107 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from element_animal import subject as subject_module
+from element_animal.subject import Subject
+
+TRANSACTION = SimpleNamespace(transaction=nullcontext())
+
+
+def attribute(default=None, nullable=False):
+    return SimpleNamespace(default=default, nullable=nullable)
+
+
+def table_class(name, primary_key, secondary=None):
+    attributes = {key: attribute() for key in primary_key}
+    attributes.update(secondary or {})
+    inserted = []
+    return type(
+        name,
+        (),
+        {
+            "primary_key": primary_key,
+            "full_table_name": f"`lab_subject`.`{name.lower()}`",
+            "heading": SimpleNamespace(names=list(attributes), attributes=attributes),
+            "connection": TRANSACTION,
+            "inserted": inserted,
+            "insert": lambda self, rows, **kwargs: inserted.extend(rows),
+        },
+    )
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    master = table_class(
+        "Subject",
+        ["subject"],
+        {
+            "sex": attribute(),
+            "subject_birth_date": attribute(),
+            "subject_description": attribute(default="''"),
+        },
+    )
+    for name, column in (
+        ("Protocol", "protocol"),
+        ("User", "user"),
+        ("Species", "species"),
+        ("Line", "line"),
+        ("Strain", "strain"),
+        ("Source", "source"),
+    ):
+        setattr(master, name, table_class(name, ["subject", column]))
+    master.Lab = table_class(
+        "Lab", ["subject", "lab"], {"subject_alias": attribute(default="''")}
+    )
+    validated = []
+    monkeypatch.setattr(
+        subject_module,
+        "validate_foreign_keys",
+        lambda table, rows, exclude: validated.append((type(table).__name__, exclude)),
+    )
+    return master, validated
+
+
+def test_insert_bulk_fills_master_and_parts(tables):
+    master, validated = tables
+    frame = pd.DataFrame(
+        {
+            "subject": ["M1", "M2", "M3"],
+            "sex": ["F", "M", "U"],
+            "subject_birth_date": ["2024-01-01"] * 3,
+            "line": ["Ai14", None, "Ai14"],
+            "protocol": [["P1", "P2"], "P1", None],
+            "lab": ["LabA", "LabB", None],
+        }
+    )
+    counts = Subject.insert_bulk.__func__(master, frame, batch_size=2)
+
+    assert counts == {"Subject": 3, "Protocol": 3, "Line": 2, "Lab": 2}
+    assert [row["subject"] for row in master.inserted] == ["M1", "M2", "M3"]
+    assert [(row["subject"], row["protocol"]) for row in master.Protocol.inserted] == [
+        ("M1", "P1"),
+        ("M1", "P2"),
+        ("M2", "P1"),
+    ]
+    assert [row["line"] for row in master.Line.inserted] == ["Ai14", "Ai14"]
+    assert master.Lab.inserted[1] == {"subject": "M2", "lab": "LabB"}
+    assert {name for name, _ in validated} == {"Protocol", "Line", "Lab"}
+    assert all(exclude == (master.full_table_name,) for _, exclude in validated)
+    assert master.User.inserted == master.Species.inserted == []
+
+
+def test_insert_bulk_validates_before_writing(tables, monkeypatch):
+    master, _ = tables
+
+    def reject(table, rows, exclude):
+        raise ValueError(type(table).__name__)
+
+    monkeypatch.setattr(subject_module, "validate_foreign_keys", reject)
+    frame = pd.DataFrame(
+        {"subject": ["M1"], "sex": ["F"], "subject_birth_date": ["2024-01-01"]}
+    ).assign(species="Mus musculus")
+    with pytest.raises(ValueError, match="Species"):
+        Subject.insert_bulk.__func__(master, frame)
+    assert master.inserted == []
@@ -0,0 +1,84 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+import synthetic  # noqa: E402
+
+from element_animal.kinship import Kinship  # noqa: E402
+from element_animal.pedigree import Pedigree  # noqa: E402
+
+PRIMARY_KEYS = {
+    "subject.Subject": ["subject"],
+    "genotyping.BreedingPair": ["line", "breeding_pair"],
+    "genotyping.SubjectLitter": ["subject"],
+    "genotyping.SubjectCaging": ["subject", "caging_datetime"],
+    "subject.SubjectDeath": ["subject"],
+    "surgery.Implantation": [
+        "subject",
+        "implant_date",
+        "implant_type",
+        "target_region",
+        "target_hemisphere",
+    ],
+}
+
+
+@pytest.fixture(scope="module")
+def colony():
+    return synthetic.synthetic_colony(2000, line_size=10, generations=5)
+
+
+def test_is_reproducible(colony):
+    again = synthetic.synthetic_colony(2000, line_size=10, generations=5)
+    for name, rows in colony.items():
+        assert rows.equals(again[name]), name
+
+
+def test_primary_keys_are_unique(colony):
+    assert len(colony["subject.Subject"]) == 2000
+    for name, primary_key in PRIMARY_KEYS.items():
+        assert not colony[name].duplicated(primary_key).any(), name
+
+
+def test_references(colony):
+    subjects = colony["subject.Subject"].set_index("subject")
+    for name, column in (
+        ("genotyping.SubjectLitter", "subject"),
+        ("genotyping.SubjectCaging", "subject"),
+        ("surgery.Implantation", "subject"),
+        ("genotyping.BreedingPair.Father", "father"),
+        ("genotyping.BreedingPair.Mother", "mother"),
+    ):
+        assert colony[name][column].isin(subjects.index).all(), name
+    assert (subjects.sex[colony["genotyping.BreedingPair.Father"].father] == "M").all()
+    assert (subjects.sex[colony["genotyping.BreedingPair.Mother"].mother] == "F").all()
+    assert (
+        colony["injection.Injection"]
+        .virus_name.isin(colony["injection.VirusName"].virus_name)
+        .all()
+    )
+
+
+def test_pedigree_of_colony(colony):
+    litters = colony["genotyping.SubjectLitter"]
+    for parent in ("father", "mother"):
+        litters = litters.merge(
+            colony[f"genotyping.BreedingPair.{parent.title()}"],
+            on=["line", "breeding_pair"],
+        )
+    pedigree = Pedigree([], [], [])
+    pedigree._merge(colony["subject.Subject"].subject, litters)
+
+    births = colony["subject.Subject"].set_index("subject").subject_birth_date
+    generation = (births - births.min()).dt.days // 90
+    np.testing.assert_array_equal(
+        pedigree.generation_depth(generation.index), generation.to_numpy()
+    )
+
+    latest = generation.index[generation == generation.max()][:20]
+    inbreeding = Kinship(pedigree).inbreeding(latest)
+    assert ((inbreeding >= 0) & (inbreeding < 1)).all()